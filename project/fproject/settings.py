@@ -42,8 +42,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'letslearn.middleware.QueryStatsMiddleware',
+    'letslearn.middleware.DataVersionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'letslearn.middleware.PrecompressedStaticMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'letslearn.middleware.ReplicaRoutingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -64,6 +68,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'letslearn.context_processors.category_summary',
             ],
         },
     },
@@ -83,6 +88,72 @@ WSGI_APPLICATION = 'fproject.wsgi.application'
 # }
 
 
+# Logging
+# https://docs.djangoproject.com/en/3.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'letslearn.requests': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Maximum number of SQL queries per GET request of a view (keyed by URL name), checked in tests.
+# Pages with the category sidebar or a versioned ETag read data versions (one query, see letslearn.cache).
+QUERY_BUDGETS = {
+    'material_list': 6,
+    'material_details': 7,
+    'material_search': 6,
+    'material_list_by_category': 6,
+    'statistics': 5,
+    'progress_timeline': 6,
+    'category_list': 5,
+    'platform_list': 5,
+    'platform_details': 5,
+    'author_list': 5,
+    'author_details': 5,
+    'api_materials': 5,
+    'api_authors': 4,
+    'api_platforms': 4,
+    'api_categories': 4,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'letslearn',
+    }
+}
+
+# Seconds after which cached material lists expire even if nothing has changed.
+MATERIAL_LIST_CACHE_TIMEOUT = 300
+
+# Identical training materials (same normalized www, author and platform) are stored once and shared by users.
+SHARED_MATERIAL_CATALOG = True
+
+# Progress events are buffered in the process and written when the buffer holds this many events
+# or when the oldest one is this number of seconds old (None: only on size and process exit).
+PROGRESS_EVENT_BUFFER_SIZE = 100
+PROGRESS_EVENT_FLUSH_SECONDS = 5
+
+# Number of similar materials stored by build_similar_materials command and shown on material details.
+SIMILAR_MATERIALS_TOP_K = 10
+
+
+# Email
+# https://docs.djangoproject.com/en/3.2/topics/email/
+
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -121,6 +192,15 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Build step: ``python manage.py collectstatic`` hashes names of static files and writes their gzip and brotli
+# (if ``brotli`` is installed) variants here, PrecompressedStaticMiddleware serves them.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'letslearn.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -132,3 +212,43 @@ except ModuleNotFoundError:
     print("Brak konfiguracji bazy danych w pliku local_settings.py!")
     print("Uzupełnij dane i spróbuj ponownie!")
     exit(0)
+
+# Read replicas
+# Aliases from DATABASES which replicate 'default', defined in local_settings.py as DATABASE_REPLICAS.
+try:
+    from fproject.local_settings import DATABASE_REPLICAS
+except ImportError:
+    DATABASE_REPLICAS = []
+
+DATABASE_ROUTERS = ['letslearn.replicas.ReplicaRouter']
+
+# URL names of views whose GET requests read from replicas. Views with versioned ETags (HTML lists, API) and
+# the material list, which is cached under data versions read on the primary, are left out: a page rendered
+# from a lagging replica would be stored or revalidated under the new version.
+REPLICA_READ_VIEWS = (
+    'material_details', 'material_search', 'material_list_by_category', 'platform_details', 'author_details',
+    'async_material_list', 'async_material_details', 'async_platform_list', 'async_platform_details',
+    'async_author_list', 'async_author_details',
+)
+
+# Seconds after a write during which the user's requests read from the primary database.
+REPLICA_STICKY_SECONDS = 10
+
+# Replica whose heartbeat is older than this number of seconds is taken out of rotation by check_replicas.
+REPLICA_MAX_LAG = 30
+
+# Seconds for which a replica stays out of rotation after a failed check.
+REPLICA_HEALTH_TTL = 60
+
+# Seconds for which a web process keeps replica health read from the database.
+REPLICA_HEALTH_REFRESH = 5
+
+# Archive tier
+# Materials archived more than this number of days ago are moved to archive tables by archive_materials command.
+ARCHIVE_AFTER_DAYS = 180
+
+# Alias from DATABASES which stores archive tables, defined in local_settings.py as ARCHIVE_DATABASE.
+try:
+    from fproject.local_settings import ARCHIVE_DATABASE
+except ImportError:
+    ARCHIVE_DATABASE = 'default'
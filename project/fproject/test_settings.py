@@ -0,0 +1,25 @@
+"""
+Settings used by tests: ``default`` database from local_settings.py with two replicas.
+``replica`` mirrors ``default`` (sees the same data), ``stale_replica`` is a separate database which never
+receives writes and stands for a lagging replica. Replicas are enabled per test with DATABASE_REPLICAS.
+Static files are not collected for tests, so templates use unhashed names.
+Progress events are flushed without a timer thread, which would write outside of the test's transaction.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, STORAGES
+
+DATABASES = {
+    **DATABASES,
+    'replica': {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}},
+    'stale_replica': {
+        **DATABASES['default'],
+        'TEST': ({} if DATABASES['default']['ENGINE'].endswith('sqlite3')
+                 else {'NAME': f"test_{DATABASES['default']['NAME']}_stale_replica"}),
+    },
+}
+
+DATABASE_REPLICAS = []
+
+STORAGES = {**STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+
+PROGRESS_EVENT_FLUSH_SECONDS = None
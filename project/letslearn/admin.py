@@ -1,10 +1,42 @@
 from django.contrib import admin
-from .models import Author, Category, MaterialType, Platform, TrainingMaterials, UserMaterial
+from django.db.models import Count
+from .deletion import MATERIAL_FIELDS, mark_for_deletion
+from .models import Author, Category, MaterialType, Platform, TrainingMaterials, UserMaterial, Notification, StudyStatistics, LinkCheck
 
 
-admin.site.register(Author)
+class BackgroundDeleteAdmin(admin.ModelAdmin):
+    """
+    Deleting an object only marks it for deletion and hides it, its training materials are deleted in batches
+    by ``delete_pending`` command. Confirmation page counts the materials instead of collecting all of them.
+    """
+    def get_deleted_objects(self, objs, request):
+        field = MATERIAL_FIELDS[self.model]
+        objs = list(objs)
+        counts = dict(TrainingMaterials.objects
+                      .filter(**{f'{field}__in': objs})
+                      .values(field)
+                      .order_by()
+                      .annotate(count=Count('id'))
+                      .values_list(field, 'count'))
+        deleted = [f'{obj} with {counts.get(obj.pk, 0)} training materials, deleted in the background'
+                   for obj in objs]
+        # Materials are deleted by the command, only permission to delete the object itself is needed.
+        perms_needed = set() if self.has_delete_permission(request) else {self.model._meta.verbose_name}
+        return deleted, {self.model._meta.verbose_name_plural: len(deleted)}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        mark_for_deletion(self.model.all_objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        mark_for_deletion(queryset)
+
+
+admin.site.register(Author, BackgroundDeleteAdmin)
 admin.site.register(Category)
 admin.site.register(MaterialType)
-admin.site.register(Platform)
+admin.site.register(Platform, BackgroundDeleteAdmin)
 admin.site.register(TrainingMaterials)
 admin.site.register(UserMaterial)
+admin.site.register(Notification)
+admin.site.register(StudyStatistics)
+admin.site.register(LinkCheck)
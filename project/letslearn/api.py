@@ -0,0 +1,167 @@
+"""
+Read-only JSON API for training materials, authors, platforms and categories.
+
+Responses carry ETag and Last-Modified computed from data versions (see :mod:`letslearn.cache`), read with one
+query, so conditional requests of unchanged data are answered with 304 before any material query runs.
+"""
+import hashlib
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.http import condition
+
+from . import cache
+from .models import TrainingMaterials, Author, Platform, Category
+from .views import get_page_size, get_cursor
+
+
+def _versions(request):
+    """
+    Reads data versions once per request, ETag and Last-Modified are computed from the same versions.
+    :param request: get request handled by an ApiListView.
+    :return: Versions tuple of letslearn.cache, user's version is 0 for views of reference data.
+    """
+    if not hasattr(request, '_letslearn_versions'):
+        view = request.resolver_match.func.view_class
+        request._letslearn_versions = cache.get_versions(request.user.id if view.per_user else None)
+    return request._letslearn_versions
+
+
+def api_etag(request, *args, **kwargs):
+    """
+    Computes ETag of API response from data versions, requested resource and query string.
+    :param request: get request handled by an ApiListView.
+    :return: ETag value.
+    """
+    view = request.resolver_match.func.view_class
+    versions = _versions(request)
+    key = f'{view.resource}:{request.user.id}:{versions.user}:{versions.reference}:{request.GET.urlencode()}'
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def api_last_modified(request, *args, **kwargs):
+    """
+    Returns time of the last change of data served by the API view.
+    :param request: get request handled by an ApiListView.
+    :return: datetime of the latest user or global data change.
+    """
+    return _versions(request).changed_at.replace(microsecond=0)
+
+
+class ApiListView(LoginRequiredMixin, View):
+    """
+    Base view returning paginated JSON list of model instances.
+    ``fields`` maps names of returned fields to lookups passed to ``values()``.
+    Query parameters:
+        - ``fields`` - comma separated names of returned fields (default: all),
+        - ``after`` - id of the last object from the previous page,
+        - ``page_size`` - one of MATERIAL_PAGE_SIZES.
+    """
+    raise_exception = True
+    resource = None
+    model = None
+    fields = {}  # lookup None means the field is added in add_related
+    per_user = False
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def get_fields(self):
+        """
+        Reads requested fields from GET parameters.
+        :return: list of field names, None if unknown field was requested.
+        """
+        requested = [name for name in self.request.GET.get('fields', '').split(',') if name]
+        if not requested:
+            return list(self.fields)
+        if any(name not in self.fields for name in requested):
+            return None
+        return requested
+
+    def add_related(self, rows, fields):
+        """ Hook for data which can't be selected with ``values()``, e.g. many-to-many fields. """
+        return rows
+
+    @method_decorator(condition(etag_func=api_etag, last_modified_func=api_last_modified))
+    def get(self, request):
+        fields = self.get_fields()
+        if fields is None:
+            return JsonResponse({'error': f'Allowed fields: {", ".join(self.fields)}.'}, status=400)
+        page_size = get_page_size(request)
+        after = get_cursor(request)
+        queryset = self.get_queryset().order_by('id')
+        if after is not None:
+            queryset = queryset.filter(id__gt=after)
+        lookups = {name: self.fields[name] for name in fields if self.fields[name]}
+        lookups.setdefault('id', 'id')
+        rows = list(queryset.values(*lookups.values())[:page_size + 1])
+        next_cursor = rows[page_size - 1]['id'] if len(rows) > page_size else None
+        rows = self.add_related([{name: row[lookup] for name, lookup in lookups.items()}
+                                 for row in rows[:page_size]], fields)
+        if 'id' not in fields:
+            for row in rows:
+                del row['id']
+        return JsonResponse({'results': rows, 'next_cursor': next_cursor})
+
+
+class MaterialApiView(ApiListView):
+    """ JSON list of training materials of logged user, archived ones included. """
+    resource = 'materials'
+    model = TrainingMaterials
+    per_user = True
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'description': 'description',
+        'www': 'www',
+        'author': 'author__name',
+        'platform': 'platform__name',
+        'material_type': 'material_type__name',
+        'categories': None,
+        'is_time_limited': 'is_time_limited',
+        'expiration_date': 'expiration_date',
+        'is_finished': 'is_finished',
+        'is_archived': 'is_archived',
+        'comment': 'comment',
+        'expected_study_time': 'expected_study_time',
+    }
+
+    def get_queryset(self):
+        return TrainingMaterials.objects.for_user(self.request.user)
+
+    def add_related(self, rows, fields):
+        """ Adds category names to materials with one query for the whole page. """
+        if 'categories' not in fields:
+            return rows
+        links = (TrainingMaterials.category.through.objects
+                 .filter(trainingmaterials_id__in=[row['id'] for row in rows])
+                 .values_list('trainingmaterials_id', 'category__name'))
+        categories = {}
+        for material_id, name in links:
+            categories.setdefault(material_id, []).append(name)
+        for row in rows:
+            row['categories'] = sorted(categories.get(row['id'], []))
+        return rows
+
+
+class AuthorApiView(ApiListView):
+    """ JSON list of authors. """
+    resource = 'authors'
+    model = Author
+    fields = {'id': 'id', 'name': 'name', 'www': 'www', 'comment': 'comment'}
+
+
+class PlatformApiView(ApiListView):
+    """ JSON list of platforms. """
+    resource = 'platforms'
+    model = Platform
+    fields = {'id': 'id', 'name': 'name', 'www': 'www', 'comment': 'comment'}
+
+
+class CategoryApiView(ApiListView):
+    """ JSON list of categories. """
+    resource = 'categories'
+    model = Category
+    fields = {'id': 'id', 'name': 'name'}
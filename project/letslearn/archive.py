@@ -0,0 +1,291 @@
+"""
+Archive tier of training materials.
+
+Links archived longer than ``ARCHIVE_AFTER_DAYS`` are moved by ``archive_materials`` command from
+:model:`letslearn.UserMaterial` to :model:`letslearn.ArchivedLink`. A material whose every link has been moved
+goes to :model:`letslearn.ArchivedMaterial` together with ids of its categories, so hot tables and their indexes
+grow with materials in use only. Archive tables have no foreign keys and live in ``ARCHIVE_DATABASE``
+(``default`` unless set), which can be a separate database. Ids of materials are kept, links to them stay valid:
+the detail page shows a material in the archive tier read-only (:func:`archived_material`), :func:`restore` brings
+user's link and the material back when the user restores it. A material in the archive tier added to the catalog
+again is brought back by :func:`restore_entries` instead of being inserted twice.
+
+Study statistics are kept for hot tables, links in the archive tier are counted only in the number of archived
+materials of the user's total: moving links in or out of the archive tier updates it with one delta per user.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import stats
+from .models import (ArchivedLink, ArchivedMaterial, Author, Category, MaterialType, Platform, TrainingMaterials,
+                     UserMaterial)
+from .replicas import reading_from
+
+EXPORT_CHUNK_SIZE = 500
+
+
+def archive_alias():
+    """
+    :return: alias of the database with archive tables, ARCHIVE_DATABASE setting.
+    """
+    return getattr(settings, 'ARCHIVE_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def archive_cutoff(days=None):
+    """
+    :param days: age of archived links, ARCHIVE_AFTER_DAYS setting by default.
+    :return: links archived before this moment belong to the archive tier.
+    """
+    if days is None:
+        days = getattr(settings, 'ARCHIVE_AFTER_DAYS', 180)
+    return timezone.now() - timedelta(days=days)
+
+
+def _material_fields():
+    return {field.attname: field for field in TrainingMaterials._meta.concrete_fields if not field.primary_key}
+
+
+def _link_state(state):
+    """ Converts state of an archived link from JSON to values of UserMaterial.STATE_FIELDS. """
+    return {name: UserMaterial._meta.get_field(name).to_python(state.get(name))
+            for name in UserMaterial.STATE_FIELDS}
+
+
+def _count_archived(user_ids, sign):
+    """
+    Adds (sign=1) or removes (sign=-1) links in the archive tier to/from archived materials in users' totals.
+    :param user_ids: list of user ids, one for every link.
+    """
+    stats.apply_deltas({(user_id, None, None): Counter(archived=sign * count)
+                        for user_id, count in Counter(user_ids).items()})
+
+
+def delete_links(links):
+    """
+    Deletes links in the archive tier, they stop being counted in statistics of their users.
+    :param links: queryset of ArchivedLink on the archive database.
+    :return: number of deleted links.
+    """
+    user_ids = list(links.values_list('user_id', flat=True))
+    links.delete()
+    _count_archived(user_ids, -1)
+    return len(user_ids)
+
+
+def archived_counts(user_ids=None):
+    """
+    :param user_ids: ids of users, all users if None.
+    :return: dictionary of user id -> number of user's links in the archive tier.
+    """
+    links = ArchivedLink.objects.using(archive_alias()).all()
+    if user_ids is not None:
+        links = links.filter(user_id__in=user_ids)
+    return dict(links.values('user_id').order_by().annotate(count=Count('id')).values_list('user_id', 'count'))
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    Moves links archived before ``cutoff`` to the archive tier, oldest first, materials left without links
+    in hot tables go with them. Links are locked, so a link restored meanwhile is never moved.
+    Archive rows are written before hot rows are deleted, a batch interrupted in between is copied again.
+    :param cutoff: datetime from archive_cutoff.
+    :param batch_size: number of links moved in one transaction.
+    :return: tuple of (number of moved links, number of moved materials), zero links when nothing was left.
+    """
+    alias = archive_alias()
+    fields = list(_material_fields())
+    with transaction.atomic():
+        links = list(UserMaterial.objects
+                     .filter(is_archived=True, archived_at__lt=cutoff)
+                     .order_by('archived_at', 'id')
+                     .select_for_update()
+                     .values('id', 'user_id', 'material_id', 'archived_at', *UserMaterial.STATE_FIELDS)[:batch_size])
+        if not links:
+            return 0, 0
+        link_ids = [link['id'] for link in links]
+        material_ids = {link['material_id'] for link in links}
+        kept = set(UserMaterial.objects
+                   .filter(material_id__in=material_ids)
+                   .exclude(id__in=link_ids)
+                   .values_list('material_id', flat=True))
+        moved_ids = sorted(material_ids - kept)
+        categories = defaultdict(list)
+        for material_id, category_id in (TrainingMaterials.category.through.objects
+                                         .filter(trainingmaterials_id__in=moved_ids)
+                                         .values_list('trainingmaterials_id', 'category_id')):
+            categories[material_id].append(category_id)
+        now = timezone.now()
+        materials = []
+        for row in TrainingMaterials.objects.filter(id__in=moved_ids).values('id', *fields):
+            material_id = row.pop('id')
+            materials.append(ArchivedMaterial(id=material_id, data=row, category_ids=categories[material_id],
+                                              archived_at=now))
+        pairs = Q()
+        for link in links:
+            pairs |= Q(user_id=link['user_id'], material_id=link['material_id'])
+        with transaction.atomic(using=alias):
+            # The user may have added the material again after the previous move, the newer link wins.
+            delete_links(ArchivedLink.objects.using(alias).filter(pairs))
+            ArchivedLink.objects.using(alias).bulk_create([
+                ArchivedLink(id=link['id'], user_id=link['user_id'], material_id=link['material_id'],
+                             state={name: link[name] for name in UserMaterial.STATE_FIELDS},
+                             archived_at=link['archived_at'])
+                for link in links])
+            ArchivedMaterial.objects.using(alias).bulk_create(materials, ignore_conflicts=True)
+        # Signals remove the links from study statistics and invalidate cached pages of their users,
+        # deleted materials take their category links with them and leave the search index.
+        UserMaterial.objects.filter(id__in=link_ids).delete()
+        _count_archived([link['user_id'] for link in links], 1)
+        TrainingMaterials.objects.filter(id__in=moved_ids).delete()
+    return len(links), len(moved_ids)
+
+
+def _restore_material(archived):
+    """
+    Saves archived material back to hot tables under its id, with categories which still exist.
+    :param archived: ArchivedMaterial instance.
+    :return: saved TrainingMaterials instance.
+    """
+    fields = _material_fields()
+    material = TrainingMaterials(id=archived.id, **{name: fields[name].to_python(value)
+                                                    for name, value in archived.data.items() if name in fields})
+    if material.catalog_key and TrainingMaterials.objects.filter(catalog_key=material.catalog_key).exists():
+        # Identical material was added to the catalog meanwhile, deduplicate_materials merges them.
+        material.catalog_key = None
+    material.save(force_insert=True)
+    material.category.set(Category.objects.filter(id__in=archived.category_ids))
+    return material
+
+
+def restore(user, material_id):
+    """
+    Brings user's link with the material back from the archive tier, with the material if it's archived too.
+    The material stays archived for the user, the link gets current archived_at, so it isn't moved again soon.
+    Hot tables are read from the primary database, the restored rows aren't on replicas yet.
+    :param user: logged user.
+    :param material_id: id of TrainingMaterials instance.
+    :return: True if the link was restored, False if the user has no such material in the archive tier.
+    """
+    alias = archive_alias()
+    link = ArchivedLink.objects.using(alias).filter(user_id=user.id, material_id=material_id).first()
+    if link is None:
+        return False
+    with reading_from(None), transaction.atomic(), transaction.atomic(using=alias):
+        if not TrainingMaterials.objects.filter(id=material_id).exists():
+            archived = ArchivedMaterial.objects.using(alias).filter(id=material_id).first()
+            if archived is None:
+                return False
+            _restore_material(archived)
+        UserMaterial.objects.get_or_create(user_id=user, material_id_id=material_id,
+                                           defaults={**_link_state(link.state), 'archived_at': timezone.now()})
+        delete_links(ArchivedLink.objects.using(alias).filter(id=link.id))
+        ArchivedMaterial.objects.using(alias).filter(id=material_id).delete()
+    return True
+
+
+def restore_entries(keys):
+    """
+    Brings catalog entries with given keys back from the archive tier, without links of users, so a material added
+    to the catalog again is linked with its entry. Links of other users stay in the archive tier.
+    :param keys: catalog keys of materials which aren't in hot tables.
+    :return: dictionary of catalog key -> restored TrainingMaterials instance.
+    """
+    keys = set(keys) - {None}
+    if not keys:
+        return {}
+    alias = archive_alias()
+    restored = {}
+    with reading_from(None), transaction.atomic(), transaction.atomic(using=alias):
+        for archived in ArchivedMaterial.objects.using(alias).filter(data__catalog_key__in=keys):
+            restored[archived.data['catalog_key']] = _restore_material(archived)
+        ArchivedMaterial.objects.using(alias).filter(id__in=[material.id for material in restored.values()]).delete()
+    return restored
+
+
+def archived_material(user, material_id):
+    """
+    Reads user's material from the archive tier without moving it, nothing is written.
+    :param user: logged user.
+    :param material_id: id of TrainingMaterials instance.
+    :return: tuple of (TrainingMaterials instance with user's state and related objects, names of categories),
+        None if the user has no such material in the archive tier.
+    """
+    alias = archive_alias()
+    link = ArchivedLink.objects.using(alias).filter(user_id=user.id, material_id=material_id).first()
+    if link is None:
+        return None
+    material = (TrainingMaterials.objects
+                .filter(id=material_id)
+                .select_related('author', 'platform', 'material_type')
+                .prefetch_related('category')
+                .first())
+    if material is not None:
+        category_names = [category.name for category in material.category.all()]
+    else:
+        cold = _cold_materials(ArchivedMaterial.objects.using(alias).filter(id=material_id))
+        if material_id not in cold:
+            return None
+        material, category_names = cold[material_id]
+    for name, value in _link_state(link.state).items():
+        setattr(material, name, value)
+    return material, category_names
+
+
+def archived_materials(user):
+    """
+    Reads user's materials from the archive tier for export, in chunks.
+    :param user: logged user.
+    :return: iterator of (TrainingMaterials instance with user's state and related objects, names of categories),
+        materials which are still in hot tables are loaded from there.
+    """
+    alias = archive_alias()
+    links = ArchivedLink.objects.using(alias).filter(user_id=user.id).order_by('id')
+    last_id = 0
+    while True:
+        chunk = {link.material_id: link for link in links.filter(id__gt=last_id)[:EXPORT_CHUNK_SIZE]}
+        if not chunk:
+            return
+        last_id = max(link.id for link in chunk.values())
+        materials = {material.id: (material, [category.name for category in material.category.all()])
+                     for material in (TrainingMaterials.objects
+                                      .filter(id__in=list(chunk))
+                                      .select_related('author', 'platform', 'material_type')
+                                      .prefetch_related('category'))}
+        materials.update(_cold_materials(ArchivedMaterial.objects.using(alias)
+                                         .filter(id__in=[key for key in chunk if key not in materials])))
+        for material_id, link in chunk.items():
+            if material_id not in materials:
+                continue
+            material, category_names = materials[material_id]
+            for name, value in _link_state(link.state).items():
+                setattr(material, name, value)
+            yield material, category_names
+
+
+def _cold_materials(archived):
+    """
+    :param archived: queryset of ArchivedMaterial.
+    :return: dictionary of id -> (unsaved TrainingMaterials instance with related objects, names of categories).
+    """
+    archived = list(archived)
+    fields = _material_fields()
+    related = {}
+    for model, attname in ((Author, 'author_id'), (Platform, 'platform_id'), (MaterialType, 'material_type_id')):
+        # Base manager, authors and platforms marked for deletion still have their materials.
+        related[attname] = model._base_manager.in_bulk({row.data[attname] for row in archived})
+    categories = Category.objects.in_bulk({category_id for row in archived for category_id in row.category_ids})
+    materials = {}
+    for row in archived:
+        material = TrainingMaterials(id=row.id, **{name: fields[name].to_python(value)
+                                                   for name, value in row.data.items() if name in fields})
+        material.author = related['author_id'].get(material.author_id)
+        material.platform = related['platform_id'].get(material.platform_id)
+        material.material_type = related['material_type_id'].get(material.material_type_id)
+        materials[row.id] = (material, [categories[category_id].name for category_id in row.category_ids
+                                        if category_id in categories])
+    return materials
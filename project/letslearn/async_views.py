@@ -0,0 +1,126 @@
+"""
+Asynchronous versions of list and detail views, served without a worker thread per request under ASGI
+(``fproject.asgi``). Database access uses Django's async ORM methods, templates are rendered only with
+data which has already been loaded.
+"""
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.views import View
+
+from . import similar
+from .models import UserMaterial, TrainingMaterials, Platform, Author
+from .views import category_summary, get_page_size, get_cursor, MATERIAL_PAGE_SIZES, EXPIRATION_WARNING_DAYS
+
+
+class AsyncLoginRequiredMixin:
+    """
+    Async counterpart of LoginRequiredMixin, loads the user and the sidebar category summary once
+    before the view runs, so templates don't touch the database.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await sync_to_async(get_user)(request)
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        self.category_summary = await sync_to_async(category_summary)(request.user)
+        return await super().dispatch(request, *args, **kwargs)
+
+    def render_page(self, request, template_name, context):
+        return render(request, template_name, {'category_summary': self.category_summary, **context})
+
+
+class AsyncMaterialListView(AsyncLoginRequiredMixin, View):
+    """
+    Async version of MaterialListView (without the per-user cache).
+
+    **Template:**
+
+    :template: 'material_list.html'
+    """
+    async def get(self, request):
+        page_size = get_page_size(request)
+        after = get_cursor(request)
+        exp_date = date.today() + timedelta(days=EXPIRATION_WARNING_DAYS)
+        active_materials = (UserMaterial.objects
+                            .filter(user_id=request.user, is_archived=False)
+                            .select_related('material_id')
+                            .order_by('id'))
+        materials_near_end = [material async for material in
+                              active_materials.filter(material_id__is_time_limited=True,
+                                                      expiration_date__lte=exp_date)]
+        page = active_materials if after is None else active_materials.filter(id__gt=after)
+        materials = [material async for material in page[:page_size + 1]]
+        next_cursor = None
+        if len(materials) > page_size:
+            materials = materials[:page_size]
+            next_cursor = materials[-1].id
+        context = {'materials': materials,
+                   'materials_near_end': materials_near_end,
+                   'exp_date': exp_date,
+                   'page_size': page_size,
+                   'page_sizes': MATERIAL_PAGE_SIZES,
+                   'is_first_page': after is None,
+                   'next_cursor': next_cursor}
+        context['fragment'] = render_to_string('material_list_fragment.html', context)
+        return self.render_page(request, 'material_list.html', context)
+
+
+class AsyncMaterialDetailView(AsyncLoginRequiredMixin, View):
+    """
+    Async, read-only version of MaterialDetailView.
+
+    **Template:**
+
+    :template: 'material_details.html' if instance is connected to logged user
+                and  'page_404.html' if it's another user's material.
+    """
+    async def get(self, request, pk):
+        material = await (TrainingMaterials.objects
+                          .for_user(request.user)
+                          .filter(id=pk)
+                          .select_related('author', 'platform', 'material_type')
+                          .prefetch_related('category')
+                          .afirst())
+        if material is None:
+            return self.render_page(request, 'page_404.html', {'material': ''})
+        similar_materials = [item async for item in similar.similar_materials(pk)]
+        return self.render_page(request, 'material_details.html', {'material': material, 'similar': similar_materials})
+
+
+class AsyncPlatformListView(AsyncLoginRequiredMixin, View):
+    """ Async version of PlatformListView. """
+    async def get(self, request):
+        platforms = [platform async for platform in Platform.objects.all()]
+        return self.render_page(request, 'platform_list.html', {'object_list': platforms})
+
+
+class AsyncPlatformDetailView(AsyncLoginRequiredMixin, View):
+    """ Async version of PlatformDetailView. """
+    async def get(self, request, pk):
+        try:
+            platform = await Platform.objects.aget(id=pk)
+        except Platform.DoesNotExist:
+            raise Http404('No Platform matches the given query.')
+        return self.render_page(request, 'platform_details.html', {'platform': platform})
+
+
+class AsyncAuthorListView(AsyncLoginRequiredMixin, View):
+    """ Async version of AuthorListView. """
+    async def get(self, request):
+        authors = [author async for author in Author.objects.all()]
+        return self.render_page(request, 'author_list.html', {'object_list': authors})
+
+
+class AsyncAuthorDetailView(AsyncLoginRequiredMixin, View):
+    """ Async version of AuthorDetailView. """
+    async def get(self, request, pk):
+        try:
+            author = await Author.objects.aget(id=pk)
+        except Author.DoesNotExist:
+            raise Http404('No Author matches the given query.')
+        return self.render_page(request, 'author_details.html', {'author': author})
@@ -0,0 +1,116 @@
+"""
+In-process prefix indexes of author, platform, material type and category names used by autocomplete.
+
+Every index is a sorted list of (case-folded name, id) searched with bisect. Signals update the index
+of the current process incrementally. Other processes notice the change through a version number kept in
+cache and reload their index before the next search.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+
+from .models import Author, Platform, MaterialType, Category
+
+KEY_PREFIX = 'letslearn:autocomplete'
+MAX_RESULTS = 20
+
+
+class PrefixIndex:
+    """ Sorted array of names of one model with prefix search. """
+    def __init__(self, model):
+        self.model = model
+        self.version_key = f'{KEY_PREFIX}:{model._meta.model_name}:version'
+        self.keys = []
+        self.names = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+    def shared_version(self):
+        """
+        Returns version of the index shared by all processes. If it was evicted from cache, a new unique
+        version is stored, so that every process reloads its index.
+        """
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def reload(self):
+        """ Loads all names from the database. """
+        version = self.shared_version()
+        rows = list(self.model.objects.values_list('id', 'name'))
+        with self.lock:
+            self.names = dict(rows)
+            self.keys = sorted((name.casefold(), pk) for pk, name in rows)
+            self.version = version
+
+    def ensure_fresh(self):
+        if self.version != self.shared_version():
+            self.reload()
+
+    def _bump(self):
+        """ Publishes a change to other processes, index stays fresh only if no other process changed it too. """
+        try:
+            version = cache.incr(self.version_key)
+        except ValueError:
+            version = None
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+        else:
+            self.version = None
+
+    def _discard(self, pk):
+        name = self.names.pop(pk, None)
+        if name is not None:
+            index = bisect_left(self.keys, (name.casefold(), pk))
+            if index < len(self.keys) and self.keys[index] == (name.casefold(), pk):
+                del self.keys[index]
+
+    def add(self, pk, name):
+        """ Adds new or renamed object to the index. """
+        with self.lock:
+            self._discard(pk)
+            self.names[pk] = name
+            insort(self.keys, (name.casefold(), pk))
+            self._bump()
+
+    def remove(self, pk):
+        """ Removes deleted object from the index. """
+        with self.lock:
+            self._discard(pk)
+            self._bump()
+
+    def search(self, prefix, limit=MAX_RESULTS):
+        """
+        Finds objects whose names start with prefix, case insensitive.
+        :param prefix: typed text.
+        :param limit: maximum number of results.
+        :return: list of (id, name) tuples ordered by name.
+        """
+        self.ensure_fresh()
+        key = prefix.casefold()
+        with self.lock:
+            index = bisect_left(self.keys, (key,))
+            results = []
+            while index < len(self.keys) and len(results) < limit and self.keys[index][0].startswith(key):
+                pk = self.keys[index][1]
+                results.append((pk, self.names[pk]))
+                index += 1
+        return results
+
+    def name_of(self, pk):
+        """ Returns name of the object with given id, None if it doesn't exist. """
+        self.ensure_fresh()
+        return self.names.get(pk)
+
+
+INDEXES = {
+    'author': PrefixIndex(Author),
+    'platform': PrefixIndex(Platform),
+    'material_type': PrefixIndex(MaterialType),
+    'category': PrefixIndex(Category),
+}
+INDEXES_BY_MODEL = {index.model: index for index in INDEXES.values()}
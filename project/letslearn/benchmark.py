@@ -0,0 +1,122 @@
+"""
+Helpers for in-process load benchmarks. Requests are sent through Django test clients, so the numbers
+measure the application (views, ORM, templates) without network and web server overhead.
+Test clients always use 'testserver' host, which is allowed only while benchmark runs.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from django.test import Client, AsyncClient
+from django.test.utils import override_settings
+
+
+def percentile(values, fraction):
+    """
+    Returns percentile of sorted values using nearest-rank method.
+    :param values: sorted list of numbers.
+    :param fraction: percentile as a fraction, e.g. 0.95.
+    """
+    if not values:
+        return 0.0
+    rank = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(latencies, elapsed, statuses=None):
+    """
+    Computes throughput and latency percentiles of a benchmark run.
+    :param latencies: latency of every request in seconds.
+    :param elapsed: wall time of the whole run in seconds.
+    :param statuses: optional list of HTTP status codes.
+    :return: dictionary with results, latencies in milliseconds.
+    """
+    latencies = sorted(latencies)
+    summary = {
+        'requests': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+    }
+    if statuses is not None:
+        summary['errors'] = sum(1 for status in statuses if status >= 400)
+        summary['not_modified'] = statuses.count(304)
+        summary['rendered'] = sum(1 for status in statuses if 200 <= status < 300)
+    return summary
+
+
+def login_cookies(user):
+    """ Creates session of the user and returns its cookies, shared by all benchmark clients. """
+    client = Client()
+    client.force_login(user)
+    return client.cookies
+
+
+def _revalidation(etags, path):
+    """ Returns headers of a conditional request for the path, empty if no ETag of it was received yet. """
+    return {'If-None-Match': etags[path]} if path in etags else {}
+
+
+def run_wsgi(paths, cookies, total, concurrency, headers=None, conditional=False):
+    """
+    Sends requests through the WSGI handler from a pool of threads.
+    :param paths: list of paths, requested in round-robin order.
+    :param cookies: session cookies from login_cookies.
+    :param total: number of requests.
+    :param concurrency: number of threads.
+    :param headers: optional extra request headers, e.g. {'Accept-Encoding': 'gzip'}.
+    :param conditional: revalidate pages like a browser, with If-None-Match of the last ETag the client got.
+    :return: tuple of (latencies, statuses, elapsed).
+    """
+    def worker(indexes):
+        client = Client(headers=headers)
+        client.cookies = SimpleCookie(cookies.output(header='', sep=';'))
+        results = []
+        etags = {}
+        for index in indexes:
+            path = paths[index % len(paths)]
+            started = time.perf_counter()
+            response = client.get(path, headers=_revalidation(etags, path))
+            if conditional and response.has_header('ETag'):
+                etags[path] = response['ETag']
+            results.append((time.perf_counter() - started, response.status_code))
+        return results
+
+    started = time.perf_counter()
+    with override_settings(ALLOWED_HOSTS=['testserver']), ThreadPoolExecutor(max_workers=concurrency) as executor:
+        chunks = executor.map(worker, [range(i, total, concurrency) for i in range(concurrency)])
+        results = [result for chunk in chunks for result in chunk]
+    elapsed = time.perf_counter() - started
+    return [latency for latency, _ in results], [status for _, status in results], elapsed
+
+
+def run_asgi(paths, cookies, total, concurrency, headers=None, conditional=False):
+    """
+    Sends requests through the ASGI handler from concurrent asyncio tasks.
+    Arguments and result are the same as in run_wsgi.
+    """
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        client = AsyncClient(headers=headers)
+        client.cookies = SimpleCookie(cookies.output(header='', sep=';'))
+        etags = {}
+
+        async def request(index):
+            path = paths[index % len(paths)]
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path, headers=_revalidation(etags, path))
+                if conditional and response.has_header('ETag'):
+                    etags[path] = response['ETag']
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(request(index) for index in range(total)))
+        return results, time.perf_counter() - started
+
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        results, elapsed = asyncio.run(run())
+    return [latency for latency, _ in results], [status for _, status in results], elapsed
@@ -0,0 +1,172 @@
+"""
+Per-user cache of training materials' list.
+
+Cached entries are never deleted one by one. Every key contains the user's data version and the global
+reference data version, so bumping a version (see :mod:`letslearn.signals`) makes old entries unreachable
+and they expire on their own. Versions are rows of :model:`letslearn.DataVersion` on the primary database, not
+cache entries: a cache which is cleared, evicts keys or is local to the process (LocMemCache) would start
+versions again and serve old entries and ETags, and would miss bumps made by other processes and commands.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.utils import timezone as django_timezone
+
+from .models import DataVersion
+from .replicas import reading_from
+
+KEY_PREFIX = 'letslearn'
+STATS_KEYS = ('hits', 'misses')
+CACHED_DATA = ('material_list', 'category_summary')
+# Change time of versions which have never been bumped.
+NEVER_CHANGED = datetime.fromtimestamp(0, tz=timezone.utc)
+
+# Version of the user's data (0 without a user), of reference data and time of the latest change of both.
+Versions = namedtuple('Versions', ['user', 'reference', 'changed_at'])
+
+_request_versions = ContextVar('letslearn_request_versions', default=None)
+
+
+def _version_key(user_id=None):
+    if user_id is None:
+        return f'{KEY_PREFIX}:version:global'
+    return f'{KEY_PREFIX}:version:user:{user_id}'
+
+
+@contextmanager
+def request_versions():
+    """
+    Versions read inside the block (a request, see :class:`letslearn.middleware.DataVersionMiddleware`) are read
+    from the database once, versions bumped inside the block are read again.
+    """
+    token = _request_versions.set({})
+    try:
+        yield
+    finally:
+        _request_versions.reset(token)
+
+
+def get_versions(user_id=None):
+    """
+    Reads data version of the user and global reference data version with one query on the primary database.
+    :param user_id: id of the user, None for reference data only.
+    :return: Versions tuple, versions which haven't been bumped yet are 1 and changed at NEVER_CHANGED.
+    """
+    keys = [_version_key(user_id), _version_key()] if user_id is not None else [_version_key()]
+    memo = _request_versions.get()
+    rows = {key: memo[key] for key in keys if key in memo} if memo is not None else {}
+    missing = [key for key in keys if key not in rows]
+    if missing:
+        loaded = {key: (1, NEVER_CHANGED) for key in missing}
+        loaded.update((key, (version, changed_at)) for key, version, changed_at in (DataVersion.objects
+                                                                                     .using(DEFAULT_DB_ALIAS)
+                                                                                     .filter(key__in=missing)
+                                                                                     .values_list('key', 'version',
+                                                                                                  'changed_at')))
+        rows.update(loaded)
+        if memo is not None:
+            memo.update(loaded)
+    reference, changed_at = rows[_version_key()]
+    user = 0
+    if user_id is not None:
+        user, user_changed_at = rows[_version_key(user_id)]
+        changed_at = max(changed_at, user_changed_at)
+    return Versions(user, reference, changed_at)
+
+
+def get_version(user_id=None):
+    """
+    Returns data version of the user or global reference data version if user_id is None.
+    :param user_id: id of the user.
+    :return: version number, 1 if it hasn't been bumped yet.
+    """
+    versions = get_versions(user_id)
+    return versions.reference if user_id is None else versions.user
+
+
+def _bump(keys):
+    now = django_timezone.now()
+    updated = DataVersion.objects.filter(key__in=keys).update(version=F('version') + 1, changed_at=now)
+    if updated < len(keys):
+        # Missing rows are versions 1, they are created and bumped like the others.
+        existing = set(DataVersion.objects.using(DEFAULT_DB_ALIAS).filter(key__in=keys).values_list('key', flat=True))
+        missing = [key for key in keys if key not in existing]
+        DataVersion.objects.bulk_create([DataVersion(key=key, changed_at=now) for key in missing],
+                                        ignore_conflicts=True)
+        DataVersion.objects.filter(key__in=missing).update(version=F('version') + 1, changed_at=now)
+    memo = _request_versions.get()
+    if memo is not None:
+        for key in keys:
+            memo.pop(key, None)
+
+
+def bump_version(user_id=None):
+    """
+    Increments data version of the user or global reference data version if user_id is None.
+    :param user_id: id of the user.
+    """
+    _bump([_version_key(user_id)])
+
+
+def bump_versions(user_ids):
+    """ Increments data versions of many users with one UPDATE. """
+    keys = sorted({_version_key(user_id) for user_id in user_ids})
+    if keys:
+        _bump(keys)
+
+
+def _stats_key(name, counter):
+    return f'{KEY_PREFIX}:stats:{name}:{counter}'
+
+
+def _count(name, counter):
+    key = _stats_key(name, counter)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def get_stats(name):
+    """
+    Returns cache hit and miss counters of cached data.
+    :param name: name of cached data, one of CACHED_DATA.
+    :return: dictionary with ``hits`` and ``misses`` keys.
+    """
+    values = cache.get_many([_stats_key(name, counter) for counter in STATS_KEYS])
+    return {counter: values.get(_stats_key(name, counter), 0) for counter in STATS_KEYS}
+
+
+def reset_stats(name):
+    """ Sets cache hit and miss counters of cached data to zero. """
+    cache.delete_many([_stats_key(name, counter) for counter in STATS_KEYS])
+
+
+def get_or_build(name, user_id, key_parts, build):
+    """
+    Returns cached value built for the user or builds and caches a new one.
+    :param name: name of cached data, e.g. ``material_list``.
+    :param user_id: id of the user who owns cached data.
+    :param key_parts: other values the data depends on (page, page size...).
+    :param build: function without arguments that computes the value on cache miss.
+    :return: tuple of (value, True if value was taken from cache).
+    """
+    versions = get_versions(user_id)
+    key = ':'.join(str(part) for part in (KEY_PREFIX, name, user_id, versions.user, versions.reference,
+                                           *key_parts))
+    value = cache.get(key)
+    if value is not None:
+        _count(name, 'hits')
+        return value, True
+    _count(name, 'misses')
+    # Versions are read on the primary, data stored under them must not come from a lagging replica.
+    with reading_from(None):
+        value = build()
+    cache.set(key, value, getattr(settings, 'MATERIAL_LIST_CACHE_TIMEOUT', 300))
+    return value, False
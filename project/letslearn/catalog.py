@@ -0,0 +1,166 @@
+"""
+Shared catalog of training materials.
+
+Identical materials (same normalized ``www``, author and platform) are stored once, users are linked with them
+through :model:`letslearn.UserMaterial` which holds user's state of the material. Identity of a material is
+its ``catalog_key``, a hash protected by a unique constraint. Catalog mode is switched with
+``SHARED_MATERIAL_CATALOG`` setting, when it's off every created material gets its own row without a key.
+Materials created before the catalog existed are merged by ``deduplicate_materials`` command.
+"""
+import hashlib
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import archive, cache, search, stats
+from .models import TrainingMaterials, UserMaterial
+
+
+def is_shared():
+    """
+    :return: True if identical materials should be stored once, SHARED_MATERIAL_CATALOG setting.
+    """
+    return getattr(settings, 'SHARED_MATERIAL_CATALOG', True)
+
+
+def normalize_www(www):
+    """
+    Normalizes address of a material, so different spellings of the same page are equal:
+    scheme, ``www.`` prefix, fragment, trailing slash and letter case of the host are ignored.
+    :param www: address as typed by the user.
+    :return: normalized address.
+    """
+    www = (www or '').strip()
+    if not www:
+        return ''
+    parts = urlsplit(www if '://' in www else f'//{www}')
+    host = (parts.netloc or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    normalized = host + parts.path.rstrip('/')
+    if parts.query:
+        normalized += '?' + parts.query
+    return normalized
+
+
+def catalog_key(www, author_id, platform_id):
+    """
+    :return: key identifying identical materials, None for materials without address which can't be matched.
+    """
+    www = normalize_www(www)
+    if not www:
+        return None
+    return hashlib.sha256(f'{www}\n{author_id}\n{platform_id}'.encode()).hexdigest()
+
+
+def add_material(user, material, categories=(), **state):
+    """
+    Gives the material to the user. In catalog mode identical material is taken from the catalog if it's there
+    (an entry in the archive tier is brought back), otherwise ``material`` is saved (with categories) and becomes
+    a catalog entry.
+    :param user: user who adds the material.
+    :param material: unsaved TrainingMaterials instance.
+    :param categories: categories of a newly saved material, ignored if the catalog already has the material.
+    :param state: values of UserMaterial.STATE_FIELDS.
+    :return: tuple of (UserMaterial instance, True if the link was created, False if the user already had it).
+    """
+    with transaction.atomic():
+        key = catalog_key(material.www, material.author_id, material.platform_id) if is_shared() else None
+        if key is not None:
+            existing = (TrainingMaterials.objects.filter(catalog_key=key).first()
+                        or archive.restore_entries([key]).get(key))
+            if existing is None:
+                material.catalog_key = key
+                try:
+                    # Savepoint, another request may have added the same material meanwhile.
+                    with transaction.atomic():
+                        material.save()
+                        material.category.set(categories)
+                except IntegrityError:
+                    existing = TrainingMaterials.objects.get(catalog_key=key)
+            material = existing or material
+        else:
+            material.save()
+            material.category.set(categories)
+        return UserMaterial.objects.get_or_create(user_id=user, material_id=material, defaults=state)
+
+
+def deduplicate_batch(after, batch_size):
+    """
+    Sets catalog keys of materials which don't have one and merges duplicates into the catalog entry
+    (the oldest identical material). Links of users are moved to the entry, categories are merged,
+    duplicates are deleted. The batch runs in its own transaction, so locks are held only for one batch.
+    :param after: id of the last material processed by the previous batch.
+    :param batch_size: number of materials in the batch.
+    :return: tuple of (id of the last processed material or None when nothing was left, number of merged
+        duplicates).
+    """
+    rows = list(TrainingMaterials.objects
+                .filter(id__gt=after, catalog_key__isnull=True)
+                .order_by('id')
+                .values_list('id', 'www', 'author_id', 'platform_id')[:batch_size])
+    if not rows:
+        return None, 0
+    keys = {}
+    for material_id, www, author_id, platform_id in rows:
+        key = catalog_key(www, author_id, platform_id)
+        if key is not None:
+            keys[material_id] = key
+    with transaction.atomic():
+        entries = dict(TrainingMaterials.objects
+                       .filter(catalog_key__in=set(keys.values()))
+                       .select_for_update()
+                       .values_list('catalog_key', 'id'))
+        duplicates = {}
+        new_entries = []
+        for material_id, key in keys.items():
+            if key in entries:
+                duplicates[material_id] = entries[key]
+            else:
+                entries[key] = material_id
+                new_entries.append(TrainingMaterials(id=material_id, catalog_key=key))
+        TrainingMaterials.objects.bulk_update(new_entries, ['catalog_key'])
+        if duplicates:
+            _merge(duplicates)
+    return rows[-1][0], len(duplicates)
+
+
+def _merge(duplicates):
+    """
+    Moves links and categories of duplicated materials to catalog entries and deletes the duplicates.
+    :param duplicates: dictionary of duplicate id -> catalog entry id.
+    """
+    links = list(UserMaterial.objects
+                 .filter(material_id__in=list(duplicates))
+                 .order_by('id')
+                 .values_list('id', 'user_id', 'material_id'))
+    taken = set(UserMaterial.objects
+                .filter(material_id__in=set(duplicates.values()))
+                .values_list('user_id', 'material_id'))
+    moved, redundant = defaultdict(list), []
+    for link_id, user_id, material_id in links:
+        entry_id = duplicates[material_id]
+        if (user_id, entry_id) in taken:
+            # The user already has the catalog entry, its state wins.
+            redundant.append(link_id)
+        else:
+            taken.add((user_id, entry_id))
+            moved[entry_id].append(link_id)
+    for entry_id, link_ids in moved.items():
+        UserMaterial.objects.filter(id__in=link_ids).update(material_id=entry_id)
+    UserMaterial.objects.filter(id__in=redundant).delete()
+    through = TrainingMaterials.category.through
+    through.objects.bulk_create(
+        [through(trainingmaterials_id=duplicates[material_id], category_id=category_id)
+         for material_id, category_id in (through.objects
+                                          .filter(trainingmaterials_id__in=list(duplicates))
+                                          .values_list('trainingmaterials_id', 'category_id'))],
+        ignore_conflicts=True)
+    TrainingMaterials.objects.filter(id__in=list(duplicates)).delete()
+    # Links were moved with queryset updates, without signals.
+    user_ids = sorted({user_id for _, user_id, _ in links})
+    stats.rebuild(user_ids)
+    cache.bump_versions(user_ids)
+    search.index_materials(set(duplicates.values()))
@@ -0,0 +1,13 @@
+from django.utils.functional import SimpleLazyObject
+
+from .views import category_summary as get_category_summary
+
+
+def category_summary(request):
+    """
+    Adds numbers of user's materials in categories to context of every template.
+    Summary is read from cache only when a template uses it.
+    """
+    if not request.user.is_authenticated:
+        return {'category_summary': ()}
+    return {'category_summary': SimpleLazyObject(lambda: get_category_summary(request.user))}
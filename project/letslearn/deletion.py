@@ -0,0 +1,100 @@
+"""
+Background deletion of authors and platforms.
+
+Deleting an author or platform cascades to all its training materials, their category links and users' links,
+one request would delete them in one long transaction. :func:`mark_for_deletion` only sets ``deleting_at``:
+the object disappears from lists, forms, API and autocomplete right away, its materials stay until
+``delete_pending`` command deletes them in small batches, every batch in its own transaction, and finally
+deletes the object. Marks are kept in the database, an interrupted run continues with the next batch.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import archive, autocomplete, cache, signals, stats
+from .models import ArchivedLink, ArchivedMaterial, Author, Platform, TrainingMaterials, UserMaterial
+
+# Model -> name of TrainingMaterials field pointing to it.
+MATERIAL_FIELDS = {Author: 'author', Platform: 'platform'}
+
+
+def mark_for_deletion(queryset):
+    """
+    Marks authors or platforms for deletion and hides them.
+    :param queryset: queryset of Author or Platform.
+    :return: number of newly marked objects.
+    """
+    model = queryset.model
+    pks = list(queryset.values_list('pk', flat=True))
+    # Queryset update, post_save would put the objects back to autocomplete.
+    marked = model.all_objects.filter(pk__in=pks, deleting_at__isnull=True).update(deleting_at=timezone.now())
+    index = autocomplete.INDEXES_BY_MODEL[model]
+    transaction.on_commit(lambda: [index.remove(pk) for pk in pks])
+    cache.bump_version()
+    return marked
+
+
+def pending():
+    """
+    :return: list of authors and platforms marked for deletion, oldest marks first.
+    """
+    return sorted((obj for model in MATERIAL_FIELDS for obj in model.all_objects.filter(deleting_at__isnull=False)),
+                  key=lambda obj: obj.deleting_at)
+
+
+def remaining(obj):
+    """
+    :param obj: Author or Platform instance.
+    :return: number of its materials left to delete, archived ones included.
+    """
+    field = MATERIAL_FIELDS[type(obj)]
+    return (TrainingMaterials.objects.filter(**{field: obj}).count()
+            + ArchivedMaterial.objects.using(archive.archive_alias()).filter(**{f'data__{field}_id': obj.pk}).count())
+
+
+def _delete_materials(material_ids):
+    """
+    Deletes materials with their links in one transaction of the primary database. Study statistics and data
+    versions of their owners are updated once for the batch, not by signals of every deleted link.
+    :param material_ids: ids of TrainingMaterials instances.
+    """
+    with transaction.atomic():
+        owner_ids = set(UserMaterial.objects.filter(material_id__in=material_ids).values_list('user_id', flat=True))
+        stats.materials_deleted(material_ids)
+        with signals.batch_deletion():
+            TrainingMaterials.objects.filter(id__in=material_ids).delete()
+        cache.bump_versions(owner_ids)
+
+
+def delete_batch(obj, batch_size):
+    """
+    Deletes one batch of materials of an object marked for deletion, materials in the archive tier go after
+    the others. When no material is left, the object itself is deleted.
+    Users' links of a batch moved to the archive tier are deleted and committed first, then the materials in
+    their own transaction: a batch interrupted in between is selected and deleted again by the next run.
+    :param obj: Author or Platform instance marked for deletion.
+    :param batch_size: number of materials deleted in one transaction.
+    :return: number of deleted materials, None when the object was deleted.
+    """
+    field = MATERIAL_FIELDS[type(obj)]
+    alias = archive.archive_alias()
+    material_ids = list(TrainingMaterials.objects
+                        .filter(**{field: obj})
+                        .order_by('id')
+                        .values_list('id', flat=True)[:batch_size])
+    if material_ids:
+        with transaction.atomic(using=alias):
+            archive.delete_links(ArchivedLink.objects.using(alias).filter(material_id__in=material_ids))
+        _delete_materials(material_ids)
+        return len(material_ids)
+    with transaction.atomic(using=alias):
+        material_ids = list(ArchivedMaterial.objects.using(alias)
+                            .filter(**{f'data__{field}_id': obj.pk})
+                            .order_by('id')
+                            .values_list('id', flat=True)[:batch_size])
+        if material_ids:
+            archive.delete_links(ArchivedLink.objects.using(alias).filter(material_id__in=material_ids))
+            ArchivedMaterial.objects.using(alias).filter(id__in=material_ids).delete()
+            return len(material_ids)
+    # Nothing depends on the object anymore, the cascade is empty.
+    obj.delete()
+    return None
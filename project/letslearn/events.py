@@ -0,0 +1,130 @@
+"""
+Buffered log of progress events (materials finished, archived, restored).
+
+Changes of state are recorded after their transaction commits, into an in-process buffer instead of the database.
+The buffer is written with one ``bulk_create`` when it holds ``PROGRESS_EVENT_BUFFER_SIZE`` events, when its
+oldest event is ``PROGRESS_EVENT_FLUSH_SECONDS`` old (a timer thread flushes a buffer nobody adds to) and when
+the process exits. A failed write is logged and its events stay buffered, recording a change never fails
+the request that made it. Events keep the time of the change, so late writes don't reorder the timeline. Events of other
+processes become visible with at most the flush delay, the timeline view flushes its own process first.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import ProgressEvent
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    """ Thread-safe list of unsaved ProgressEvent instances flushed on size or age. """
+    def __init__(self):
+        self.events = []
+        self.first_at = None
+        self.timer = None
+        self.lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'PROGRESS_EVENT_BUFFER_SIZE', 100)
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'PROGRESS_EVENT_FLUSH_SECONDS', 5)
+
+    def add(self, events):
+        """
+        Adds events to the buffer and flushes it if it's full or old enough.
+        :param events: list of unsaved ProgressEvent instances.
+        """
+        if not events:
+            return
+        with self.lock:
+            if not self.events:
+                self.first_at = time.monotonic()
+            self.events.extend(events)
+            max_age = self.max_age
+            due = (len(self.events) >= self.max_size
+                   or (max_age is not None and time.monotonic() - self.first_at >= max_age))
+            if not due and max_age and self.timer is None:
+                self.timer = threading.Timer(max_age, self._flush_from_timer)
+                self.timer.daemon = True
+                self.timer.start()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes buffered events with one bulk_create. It's called after commits of requests, from the timer
+        and at exit, so a failed write doesn't raise: it's logged and the events are put back to the front
+        of the buffer for the next flush.
+        :return: number of written events.
+        """
+        with self.lock:
+            events, self.events = self.events, []
+            first_at = self.first_at
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not events:
+            return 0
+        try:
+            ProgressEvent.objects.bulk_create(events)
+        except Exception:
+            logger.exception('%s progress events could not be written, they are kept for the next flush.',
+                             len(events))
+            with self.lock:
+                self.events[:0] = events
+                self.first_at = first_at
+            return 0
+        return len(events)
+
+    def clear(self):
+        """ Drops buffered events without writing them. """
+        with self.lock:
+            self.events = []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread has its own database connection.
+            connections.close_all()
+
+
+buffer = EventBuffer()
+atexit.register(buffer.flush)
+
+
+def record(user_id, material_ids, field, value):
+    """
+    Records progress events of a state change after the current transaction commits.
+    :param user_id: id of the user whose state of materials changed.
+    :param material_ids: ids of changed materials.
+    :param field: changed field of UserMaterial.
+    :param value: new value of the field.
+    """
+    kind = ProgressEvent.KINDS.get((field, value))
+    if kind is None:
+        return
+    now = timezone.now()
+    events = [ProgressEvent(user_id=user_id, material_id=material_id, kind=kind, created_at=now)
+              for material_id in material_ids]
+    transaction.on_commit(lambda: buffer.add(events))
+
+
+def flush():
+    """
+    Writes events buffered in this process.
+    :return: number of written events.
+    """
+    return buffer.flush()
@@ -1,6 +1,10 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from django.urls import reverse
+
+from .autocomplete import INDEXES
+from .models import TrainingMaterials
 
 
 # Create your forms here.
@@ -23,3 +27,69 @@ from django.contrib.auth.models import User
 # 	name = forms.CharField(label='Name', max_length=128, unique=True)
 # 	www = forms.CharField(max_length=256)
 # 	comment = forms.CharField(null=True)
+
+
+class AutocompleteWidget(forms.Widget):
+    """
+    Text input with suggestions loaded from autocomplete endpoint, replaces <select> with all objects.
+    Chosen objects are sent as hidden inputs with their ids, so the form field validates them as usual.
+    """
+    template_name = 'letslearn/widgets/autocomplete.html'
+
+    def __init__(self, kind, multiple=False, attrs=None):
+        super().__init__(attrs)
+        self.kind = kind
+        self.multiple = multiple
+
+    def format_value(self, value):
+        if value is None or value == '':
+            return []
+        values = value if isinstance(value, (list, tuple)) else [value]
+        return [int(pk) for pk in values if str(pk).isdigit()]
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        index = INDEXES[self.kind]
+        context['widget'].update({
+            'url': reverse('autocomplete', args=[self.kind]),
+            'multiple': self.multiple,
+            'selected': [(pk, index.name_of(pk)) for pk in context['widget']['value']],
+        })
+        return context
+
+    def value_from_datadict(self, data, files, name):
+        if self.multiple:
+            return data.getlist(name)
+        return data.get(name)
+
+    def value_omitted_from_data(self, data, files, name):
+        return not self.multiple and name not in data
+
+
+class TrainingMaterialsForm(forms.ModelForm):
+    """
+    Form of training material with autocomplete inputs for author, platform, type and categories.
+    Fields of user's state of the material are saved in UserMaterial, see ``get_state``.
+    """
+    expiration_date = forms.DateField(required=False, help_text='Used only for time limited materials.')
+    is_finished = forms.BooleanField(required=False)
+    comment = forms.CharField(required=False, widget=forms.Textarea)
+
+    class Meta:
+        model = TrainingMaterials
+        fields = '__all__'
+        widgets = {
+            'author': AutocompleteWidget('author'),
+            'platform': AutocompleteWidget('platform'),
+            'material_type': AutocompleteWidget('material_type'),
+            'category': AutocompleteWidget('category', multiple=True),
+        }
+
+    def get_state(self):
+        """
+        :return: dictionary of user's state of the material, passed to UserMaterial.
+        """
+        state = {'is_finished': self.cleaned_data['is_finished'], 'comment': self.cleaned_data['comment'] or None}
+        if self.cleaned_data['expiration_date']:
+            state['expiration_date'] = self.cleaned_data['expiration_date']
+        return state
@@ -0,0 +1,156 @@
+"""
+Asynchronous health checker of URLs stored in ``www`` fields.
+
+Requests are sent with asyncio streams: HEAD first and GET when the server rejects HEAD. Only the status
+line is read, bodies are never downloaded. Number of open connections is limited globally and per host,
+every connection is closed after one request.
+"""
+import asyncio
+import ssl
+import time
+from urllib.parse import quote, urlsplit, urlunsplit
+
+USER_AGENT = 'letslearn-link-checker/1.0'
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# Characters left as they are when path and query are percent-encoded, RFC 3986 delimiters and '%' of escapes.
+PATH_SAFE = "/%:@!$&'()*+,;=~"
+QUERY_SAFE = PATH_SAFE + '?'
+# Statuses for which HEAD is retried with GET, some servers don't implement HEAD correctly.
+HEAD_FALLBACK_STATUSES = {400, 403, 404, 405, 500, 501}
+
+
+class LinkCheckResult:
+    """ Result of one URL check. """
+    def __init__(self, url, status_code=None, error='', latency_ms=None):
+        self.url = url
+        self.status_code = status_code
+        self.error = error
+        self.latency_ms = latency_ms
+
+    def __repr__(self):
+        return f'LinkCheckResult({self.url!r}, {self.status_code!r}, {self.error!r})'
+
+
+async def request_status(method, url, timeout):
+    """
+    Sends one request and reads the status line of the response.
+    :param method: HEAD or GET.
+    :param url: absolute http(s) URL returned by normalize_url.
+    :param timeout: seconds for connecting and reading the status line.
+    :return: HTTP status code.
+    """
+    parts = urlsplit(url)
+    secure = parts.scheme == 'https'
+    port = parts.port or DEFAULT_PORTS[parts.scheme]
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    # Encoded before connecting, an URL which isn't normalized fails without opening a connection.
+    request = (f'{method} {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: {USER_AGENT}\r\n'
+               f'Accept: */*\r\nConnection: close\r\n\r\n').encode('ascii')
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port, ssl=ssl.create_default_context() if secure else None),
+        timeout)
+    try:
+        writer.write(request)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (OSError, ssl.SSLError):
+            pass
+    fields = status_line.decode('latin-1').split()
+    if len(fields) < 2 or not fields[0].startswith('HTTP/') or not fields[1].isdigit():
+        raise ValueError(f'invalid status line {status_line[:50]!r}')
+    return int(fields[1])
+
+
+def normalize_url(url):
+    """
+    Converts URL to the form sent to the server: http:// is added to URLs without scheme, host is IDNA-encoded,
+    path and query are percent-encoded (existing escapes are kept), default port, credentials and fragment
+    are dropped. Spellings of the same address give the same URL.
+    :param url: URL as stored in www field.
+    :return: ASCII URL, None for values which can't be checked.
+    """
+    url = (url or '').strip()
+    if not url:
+        return None
+    if '://' not in url:
+        url = 'http://' + url
+    try:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.hostname:
+            return None
+        host = parts.hostname.encode('idna').decode('ascii')
+        port = parts.port
+    except ValueError:
+        # Invalid port or host which can't be IDNA-encoded, UnicodeError is a ValueError.
+        return None
+    netloc = f'[{host}]' if ':' in host else host
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc += f':{port}'
+    return urlunsplit((scheme, netloc, quote(parts.path, safe=PATH_SAFE), quote(parts.query, safe=QUERY_SAFE), ''))
+
+
+class LinkChecker:
+    """
+    Checks many URLs concurrently.
+    :param max_connections: limit of all open connections.
+    :param per_host: limit of open connections to one host.
+    :param timeout: seconds for connecting and reading the status line.
+    """
+    def __init__(self, max_connections=50, per_host=2, timeout=10.0):
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.timeout = timeout
+
+    async def check(self, url, pool, hosts):
+        """
+        Checks one URL within global and per host connection limits.
+        :param url: URL as stored in www field.
+        :param pool: semaphore limiting all connections.
+        :param hosts: dictionary of host -> semaphore limiting connections to the host.
+        :return: LinkCheckResult.
+        """
+        target = normalize_url(url)
+        if target is None:
+            return LinkCheckResult(url, error='invalid url')
+        host = urlsplit(target).hostname
+        host_limit = hosts.setdefault(host, asyncio.Semaphore(self.per_host))
+        # Host slot first: URLs waiting for a busy host must not hold global slots other hosts could use.
+        async with host_limit, pool:
+            started = time.perf_counter()
+            try:
+                status = await request_status('HEAD', target, self.timeout)
+                if status in HEAD_FALLBACK_STATUSES:
+                    status = await request_status('GET', target, self.timeout)
+            except asyncio.TimeoutError:
+                return LinkCheckResult(url, error='timeout', latency_ms=(time.perf_counter() - started) * 1000)
+            except (OSError, ssl.SSLError, ValueError) as error:
+                return LinkCheckResult(url, error=str(error)[:256] or error.__class__.__name__,
+                                       latency_ms=(time.perf_counter() - started) * 1000)
+        return LinkCheckResult(url, status_code=status, latency_ms=(time.perf_counter() - started) * 1000)
+
+    async def check_all(self, urls):
+        """
+        Checks URLs concurrently, URLs normalized to the same address are checked once.
+        :param urls: iterable of URLs.
+        :return: list of LinkCheckResult in order of the first occurrence of every URL, one for every distinct URL.
+        """
+        pool = asyncio.Semaphore(self.max_connections)
+        hosts = {}
+        targets = {url: normalize_url(url) for url in dict.fromkeys(urls)}
+        checked = list(dict.fromkeys(target for target in targets.values() if target is not None))
+        results = dict(zip(checked, await asyncio.gather(*(self.check(target, pool, hosts) for target in checked))))
+        return [LinkCheckResult(url, error='invalid url') if target is None
+                else LinkCheckResult(url, results[target].status_code, results[target].error,
+                                     results[target].latency_ms)
+                for url, target in targets.items()]
+
+    def run(self, urls):
+        """ Synchronous entry point of check_all. """
+        return asyncio.run(self.check_all(urls))
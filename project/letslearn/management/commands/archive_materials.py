@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from letslearn import archive
+
+
+class Command(BaseCommand):
+    """
+    Moves materials archived longer than ARCHIVE_AFTER_DAYS (or --days) from hot tables to the archive tier.
+    Links are moved oldest first in small batches, every batch is a separate short transaction. Moved rows leave
+    hot tables, so an interrupted run continues where it stopped when started again.
+    """
+    help = 'Moves long archived training materials to the archive tier in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Move materials archived more than this number of days ago '
+                                 '(default: ARCHIVE_AFTER_DAYS setting).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of links in one transaction.')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches, leaves room for other writers.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days must not be negative.')
+        cutoff = archive.archive_cutoff(options['days'])
+        batches = links = materials = 0
+        started = time.monotonic()
+        while True:
+            batch_links, batch_materials = archive.archive_batch(cutoff, options['batch_size'])
+            if not batch_links:
+                break
+            batches += 1
+            links += batch_links
+            materials += batch_materials
+            self.stdout.write(f'Batch {batches}: {links} links and {materials} materials moved '
+                              f'({time.monotonic() - started:.1f}s)')
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Done, {links} links and {materials} materials moved to the archive.'))
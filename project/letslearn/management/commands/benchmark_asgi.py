@@ -0,0 +1,61 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from letslearn.benchmark import login_cookies, run_wsgi, run_asgi, summarize
+from letslearn.models import UserMaterial, Platform, Author
+
+
+class Command(BaseCommand):
+    """
+    Compares sync views under WSGI, sync views under ASGI and async views under ASGI
+    on the same data of one user.
+    """
+    help = 'Benchmarks WSGI and ASGI throughput and tail latency of list and detail views.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Username whose materials are requested.')
+        parser.add_argument('--requests', type=int, default=1000, help='Number of requests per mode.')
+        parser.add_argument('--concurrency', type=int, default=50, help='Number of concurrent requests.')
+        parser.add_argument('--output', help='Path of JSON file with results.')
+
+    def paths(self, user, prefix):
+        """ Returns list and detail paths of sync views (prefix '') or async views (prefix 'async_'). """
+        material_id = UserMaterial.objects.filter(user_id=user).values_list('material_id', flat=True).first()
+        platform_id = Platform.objects.values_list('id', flat=True).first()
+        author_id = Author.objects.values_list('id', flat=True).first()
+        paths = [reverse(f'{prefix}material_list'), reverse(f'{prefix}platform_list'),
+                 reverse(f'{prefix}author_list')]
+        if material_id:
+            paths.append(reverse(f'{prefix}material_details', args=[material_id]))
+        if platform_id:
+            paths.append(reverse(f'{prefix}platform_details', args=[platform_id]))
+        if author_id:
+            paths.append(reverse(f'{prefix}author_details', args=[author_id]))
+        return paths
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f"User {options['user']} doesn't exist.")
+        cookies = login_cookies(user)
+        sync_paths = self.paths(user, '')
+        async_paths = self.paths(user, 'async_')
+        modes = {
+            'wsgi_sync_views': (run_wsgi, sync_paths),
+            'asgi_sync_views': (run_asgi, sync_paths),
+            'asgi_async_views': (run_asgi, async_paths),
+        }
+        results = {}
+        for name, (runner, paths) in modes.items():
+            latencies, statuses, elapsed = runner(paths, cookies, options['requests'], options['concurrency'])
+            results[name] = summarize(latencies, elapsed, statuses)
+            result = results[name]
+            self.stdout.write(f"{name}: {result['throughput']:.1f} req/s, p50 {result['p50_ms']:.1f} ms, "
+                              f"p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+                              f"errors {result['errors']}")
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'concurrency': options['concurrency'], 'results': results}, output, indent=2)
@@ -0,0 +1,110 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.urls import reverse
+
+from letslearn import urls
+from letslearn.benchmark import login_cookies, run_wsgi, run_asgi, summarize
+from letslearn.models import UserMaterial, Platform, Author
+
+# Requests to these views change state of the session, so they can't be repeated.
+SKIPPED_URLS = {'account_logout', 'account_signup', 'account_login', 'login_profile'}
+
+
+class Command(BaseCommand):
+    """
+    Requests every named URL of letslearn with GET and reports throughput and latency percentiles.
+    Results are saved as JSON and can be compared with results of a previous run. With ``--conditional`` clients
+    revalidate pages with ETags they received, so pages with unchanged data are answered with 304.
+    """
+    help = 'Benchmarks all named views and reports throughput and p50/p95/p99 latency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username used for requests (default: user with most materials).')
+        parser.add_argument('--requests', type=int, default=200, help='Number of requests per URL.')
+        parser.add_argument('--concurrency', type=int, default=10, help='Number of concurrent requests.')
+        parser.add_argument('--asgi', action='store_true', help='Send requests through the ASGI handler.')
+        parser.add_argument('--conditional', action='store_true',
+                            help='Revalidate pages with If-None-Match like a browser and report rendered vs 304.')
+        parser.add_argument('--only', nargs='*', default=None, help='Benchmark only these URL names.')
+        parser.add_argument('--output', help='Path of JSON file with results.')
+        parser.add_argument('--compare', help='Path of JSON results of a previous run to compare with.')
+
+    def get_user(self, username):
+        user_model = get_user_model()
+        if username:
+            return user_model.objects.filter(username=username).first()
+        busiest = (UserMaterial.objects.values('user_id').order_by().annotate(count=Count('id'))
+                   .order_by('-count').values_list('user_id', flat=True).first())
+        return user_model.objects.filter(id=busiest).first() if busiest else user_model.objects.first()
+
+    def get_paths(self, user, only):
+        """
+        Builds path of every named URL of a view handling GET, ``pk`` arguments are taken from data of the benchmarked user.
+        :return: dictionary of URL name -> path.
+        """
+        pks = {
+            'material': UserMaterial.objects.filter(user_id=user).values_list('material_id', flat=True).first(),
+            'platform': Platform.objects.values_list('id', flat=True).first(),
+            'author': Author.objects.values_list('id', flat=True).first(),
+        }
+        paths = {}
+        for pattern in urls.urlpatterns:
+            name = pattern.name
+            if not name or name in SKIPPED_URLS or (only is not None and name not in only):
+                continue
+            if not hasattr(pattern.callback.view_class, 'get'):
+                continue
+            if set(pattern.pattern.converters) - {'pk'}:
+                continue
+            if 'pk' in pattern.pattern.converters:
+                pk = next((value for key, value in pks.items() if key in name), None)
+                if pk is None:
+                    continue
+                paths[name] = reverse(name, kwargs={'pk': pk})
+            else:
+                paths[name] = reverse(name)
+        return paths
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        if user is None:
+            raise CommandError('No user found, generate data with generate_data command first.')
+        cookies = login_cookies(user)
+        runner = run_asgi if options['asgi'] else run_wsgi
+        previous = {}
+        if options['compare']:
+            with open(options['compare']) as previous_file:
+                previous = json.load(previous_file)['results']
+        results = {}
+        for name, path in self.get_paths(user, options['only']).items():
+            latencies, statuses, elapsed = runner([path], cookies, options['requests'], options['concurrency'],
+                                                 conditional=options['conditional'])
+            results[name] = {'path': path, **summarize(latencies, elapsed, statuses)}
+            result = results[name]
+            line = (f"{name:30} {result['throughput']:8.1f} req/s  p50 {result['p50_ms']:7.1f} ms  "
+                    f"p95 {result['p95_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  errors {result['errors']}")
+            if options['conditional']:
+                line += f"  rendered {result['rendered']} / 304 {result['not_modified']}"
+            if name in previous and previous[name]['p95_ms']:
+                change = result['p95_ms'] / previous[name]['p95_ms'] - 1
+                line += f'  p95 change {change:+.0%}'
+            self.stdout.write(line)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({
+                    'created': datetime.now(timezone.utc).isoformat(),
+                    'python': platform.python_version(),
+                    'database': connection.vendor,
+                    'handler': 'asgi' if options['asgi'] else 'wsgi',
+                    'user': user.username,
+                    'requests': options['requests'],
+                    'concurrency': options['concurrency'],
+                    'conditional': options['conditional'],
+                    'results': results,
+                }, output, indent=2)
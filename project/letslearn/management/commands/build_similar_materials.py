@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from letslearn import similar
+
+
+class Command(BaseCommand):
+    """
+    Precomputes "similar materials" of training materials from TF-IDF vectors of their names, descriptions,
+    categories and authors. By default only materials added since the previous build are processed and merged
+    into existing lists, ``--full`` recomputes all lists. Every batch is written in its own transaction.
+    Needs NumPy and SciPy.
+    """
+    help = 'Computes top-k similar materials of every training material and stores them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute neighbours of all materials.')
+        parser.add_argument('--top-k', type=int, default=None,
+                            help='Number of similar materials of a material (default: SIMILAR_MATERIALS_TOP_K).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of materials compared with all others in one matrix product.')
+
+    def handle(self, *args, **options):
+        if not similar.is_available():
+            raise CommandError('NumPy and SciPy are required, install them with: pip install numpy scipy')
+        top_k = options['top_k'] or getattr(settings, 'SIMILAR_MATERIALS_TOP_K', 10)
+        if top_k < 1 or options['batch_size'] < 1:
+            raise CommandError('--top-k and --batch-size must be positive.')
+        started = time.monotonic()
+
+        def progress(processed, total):
+            self.stdout.write(f'{processed}/{total} materials processed ({time.monotonic() - started:.1f}s)')
+
+        full, processed = similar.build(top_k, options['batch_size'], full=options['full'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Done, {"full" if full else "incremental"} build, {processed} materials processed.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from letslearn import cache
+
+
+class Command(BaseCommand):
+    """ Reports hit and miss counters of cached material list and category summary. """
+    help = 'Shows cache hit and miss counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Set counters to zero after reporting.')
+
+    def handle(self, *args, **options):
+        for name in cache.CACHED_DATA:
+            stats = cache.get_stats(name)
+            total = stats['hits'] + stats['misses']
+            ratio = stats['hits'] / total if total else 0
+            self.stdout.write(f"{name} - hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {ratio:.1%}")
+            if options['reset']:
+                cache.reset_stats(name)
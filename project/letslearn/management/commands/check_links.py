@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from letslearn.linkcheck import LinkChecker
+from letslearn.models import Author, LinkCheck, Platform, TrainingMaterials
+
+
+class Command(BaseCommand):
+    """
+    Checks ``www`` links of training materials, authors and platforms. Every distinct URL is requested once
+    per run, URLs checked within ``--max-age`` hours are skipped, so the command can run often, e.g. from cron.
+    Results are stored in LinkCheck, one row per URL.
+    """
+    help = 'Checks health of www links of training materials, authors and platforms.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=float, default=24,
+                            help='URLs checked within this number of hours are skipped.')
+        parser.add_argument('--connections', type=int, default=50, help='Maximum number of open connections.')
+        parser.add_argument('--per-host', type=int, default=2, help='Maximum number of connections to one host.')
+        parser.add_argument('--timeout', type=float, default=10, help='Timeout of one request in seconds.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of URLs checked in one batch.')
+
+    def handle(self, *args, **options):
+        for name in ('connections', 'per_host', 'timeout', 'batch_size'):
+            if options[name] <= 0:
+                raise CommandError(f'--{name.replace("_", "-")} must be positive.')
+        now = timezone.now()
+        urls = self.collect_urls()
+        recent = set(LinkCheck.objects
+                     .filter(checked_at__gte=now - timedelta(hours=options['max_age']))
+                     .values_list('url', flat=True))
+        urls = [url for url in urls if url not in recent]
+        checker = LinkChecker(options['connections'], options['per_host'], options['timeout'])
+        broken = 0
+        for start in range(0, len(urls), options['batch_size']):
+            results = checker.run(urls[start:start + options['batch_size']])
+            checked_at = timezone.now()
+            LinkCheck.objects.bulk_create(
+                [LinkCheck(url=result.url, status_code=result.status_code, error=result.error,
+                           latency_ms=result.latency_ms, checked_at=checked_at) for result in results],
+                update_conflicts=True, unique_fields=['url'],
+                update_fields=['status_code', 'error', 'latency_ms', 'checked_at'])
+            broken += sum(1 for result in results if result.status_code is None or result.status_code >= 400)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(urls)} links checked, {broken} broken, {len(recent)} skipped as recently checked.'))
+
+    @staticmethod
+    def collect_urls():
+        """
+        :return: sorted distinct non empty www values of all materials, authors and platforms.
+        """
+        urls = set()
+        for model in (TrainingMaterials, Author, Platform):
+            urls.update(model.objects.exclude(www='').values_list('www', flat=True).distinct())
+        return sorted({url.strip() for url in urls if url and url.strip()})
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from letslearn import replicas
+
+
+class Command(BaseCommand):
+    """
+    Checks lag of read replicas and takes lagging or unreachable ones out of rotation, see :mod:`letslearn.replicas`.
+    Run it once (e.g. from cron) or with ``--interval`` as a long running process.
+    """
+    help = 'Writes replication heartbeat and checks lag of read replicas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-lag', type=float, default=None,
+                            help='Allowed lag in seconds, REPLICA_MAX_LAG setting by default.')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Repeat the check every this number of seconds until interrupted.')
+
+    def handle(self, *args, **options):
+        if options['interval'] is not None and options['interval'] <= 0:
+            raise CommandError('--interval must be positive.')
+        while True:
+            self.check(options['max_lag'])
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
+
+    def check(self, max_lag):
+        results = replicas.check_replicas(max_lag)
+        if not results:
+            self.stdout.write('No replicas configured in DATABASE_REPLICAS.')
+        for alias, (healthy, lag, error) in results.items():
+            lag_text = 'unknown' if lag is None else f'{lag:.1f}s'
+            if healthy:
+                self.stdout.write(self.style.SUCCESS(f'{alias}: healthy, lag {lag_text}'))
+            else:
+                self.stdout.write(self.style.ERROR(f'{alias}: out of rotation, lag {lag_text}, {error}'))
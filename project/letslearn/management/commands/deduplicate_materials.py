@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from letslearn import catalog
+
+
+class Command(BaseCommand):
+    """
+    Merges identical training materials (same normalized www, author and platform) into one catalog entry.
+    Materials are processed in id order in small batches, every batch is a separate short transaction,
+    so the tables are never locked for the whole run. Processed materials get a catalog key, so an interrupted
+    run continues where it stopped when started again.
+    """
+    help = 'Merges duplicated training materials into the shared catalog in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of materials in one transaction.')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches, leaves room for other writers.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        last_id = 0
+        processed = merged = 0
+        started = time.monotonic()
+        while True:
+            batch_last_id, batch_merged = catalog.deduplicate_batch(last_id, options['batch_size'])
+            if batch_last_id is None:
+                break
+            processed += 1
+            merged += batch_merged
+            last_id = batch_last_id
+            self.stdout.write(f'Batch {processed}: materials up to id {last_id} processed, {merged} duplicates '
+                              f'merged ({time.monotonic() - started:.1f}s)')
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Done, {merged} duplicates merged.'))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from letslearn import deletion
+
+
+class Command(BaseCommand):
+    """
+    Deletes authors and platforms marked for deletion (in the admin) together with their training materials.
+    Materials are deleted in small batches, every batch is a separate short transaction, the author or platform
+    goes last. Marks are stored in the database, so an interrupted run continues where it stopped.
+    """
+    help = 'Deletes materials of authors and platforms marked for deletion in batches, then the objects.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of materials in one transaction.')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches, leaves room for other writers.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        objects = deletion.pending()
+        started = time.monotonic()
+        for obj in objects:
+            label = f'{obj._meta.verbose_name} "{obj}"'
+            total = deletion.remaining(obj)
+            deleted = 0
+            self.stdout.write(f'Deleting {label} with {total} training materials')
+            while True:
+                batch_deleted = deletion.delete_batch(obj, options['batch_size'])
+                if batch_deleted is None:
+                    break
+                deleted += batch_deleted
+                self.stdout.write(f'{label}: {deleted}/{total} materials deleted '
+                                  f'({time.monotonic() - started:.1f}s)')
+                if options['pause']:
+                    time.sleep(options['pause'])
+            self.stdout.write(f'{label} deleted.')
+        self.stdout.write(self.style.SUCCESS(f'Done, {len(objects)} authors and platforms deleted.'))
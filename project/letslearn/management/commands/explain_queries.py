@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from letslearn.models import UserMaterial
+from letslearn.views import EXPIRATION_WARNING_DAYS
+
+
+class Command(BaseCommand):
+    """ Prints database query plans for material list, material detail and expiration queries. """
+    help = 'Runs EXPLAIN on the material list, detail and expiry queries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username whose materials are explained (default: first user).')
+        parser.add_argument('--material', type=int, help='Id of the material used in the detail query.')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Pass ANALYZE to EXPLAIN (PostgreSQL only, executes the queries).')
+
+    def handle(self, *args, **options):
+        """
+        Builds the querysets used by the views and prints their plans.
+        :return: query plan of every query written to stdout.
+        """
+        user_model = get_user_model()
+        if options['user']:
+            user = user_model.objects.filter(username=options['user']).first()
+        else:
+            user = user_model.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('No user found, create one or pass an existing --user.')
+        material_id = options['material']
+        if material_id is None:
+            material_id = (UserMaterial.objects.filter(user_id=user)
+                           .values_list('material_id', flat=True).first() or 0)
+        exp_date = date.today() + timedelta(days=EXPIRATION_WARNING_DAYS)
+
+        active_materials = (UserMaterial.objects
+                            .filter(user_id=user, is_archived=False)
+                            .select_related('material_id')
+                            .order_by('id'))
+        queries = {
+            'material list': active_materials,
+            'materials near expiration': active_materials.filter(material_id__is_time_limited=True,
+                                                                 expiration_date__lte=exp_date),
+            'material detail': UserMaterial.objects.filter(user_id=user, material_id=material_id),
+            'expiring materials': UserMaterial.objects.filter(is_archived=False, material_id__is_time_limited=True,
+                                                              expiration_date__lte=exp_date),
+        }
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
@@ -0,0 +1,155 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from letslearn import cache, catalog, search, stats
+from letslearn.models import Author, Platform, MaterialType, Category, TrainingMaterials, UserMaterial
+
+MATERIAL_TYPES = ('video course', 'book', 'article', 'podcast', 'workshop', 'documentation')
+
+
+class Command(BaseCommand):
+    """
+    Generates synthetic users, reference data and training materials for load tests.
+    Faker is used to build pools of names and texts, rows are combined from the pools and inserted
+    with bulk_create in batches, so millions of materials can be generated in minutes.
+    Distributions:
+        - category popularity follows Zipf's law, every material has 1-3 categories,
+        - 30% of materials are time limited, expiring between 30 days ago and a year from now,
+        - 40% of materials are finished and 15% archived,
+        - materials are spread over users with a long tail (some users have many more materials).
+    In shared catalog mode materials get catalog keys, a generated material identical to a catalog entry
+    is linked with its owner instead of being inserted again.
+    """
+    help = 'Generates synthetic dataset with Faker and bulk_create.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--materials', type=int, default=10000)
+        parser.add_argument('--authors', type=int, default=1000)
+        parser.add_argument('--platforms', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=100)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='benchmark', help='Password of generated users.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of random generators, runs are repeatable.')
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['authors'], options['platforms'], options['categories'],
+               options['batch_size']) < 1:
+            raise CommandError('Numbers of users, authors, platforms, categories and batch size must be positive.')
+        self.random = random.Random(options['seed'])
+        self.faker = Faker()
+        self.faker.seed_instance(options['seed'])
+        self.prefix = f'gen{options["seed"]}-{int(time.time())}'
+        started = time.monotonic()
+
+        user_ids = self.create_users(options['users'], options['password'], options['batch_size'])
+        author_ids = self.create_named(Author, options['authors'], self.faker.name, {'www': ''})
+        platform_ids = self.create_named(Platform, options['platforms'], self.faker.company, {'www': ''})
+        type_ids = self.create_named(MaterialType, len(MATERIAL_TYPES), iter(MATERIAL_TYPES).__next__, {})
+        category_ids = self.create_named(Category, options['categories'], self.faker.word, {})
+        self.create_materials(options['materials'], options['batch_size'], user_ids, author_ids, platform_ids,
+                              type_ids, category_ids)
+        # Rows were inserted without signals.
+        stats.rebuild(user_ids)
+        cache.bump_versions(user_ids)
+        cache.bump_version()
+        self.stdout.write(self.style.SUCCESS(f'Dataset generated in {time.monotonic() - started:.1f} s, '
+                                             f'users are named {self.prefix}-user-<n>.'))
+
+    def create_users(self, count, password, batch_size):
+        """ Creates users sharing one password hash, hashing is too slow to repeat for every user. """
+        user_model = get_user_model()
+        password_hash = make_password(password)
+        for start in range(0, count, batch_size):
+            user_model.objects.bulk_create([
+                user_model(username=f'{self.prefix}-user-{i}', email=f'{self.prefix}-user-{i}@example.com',
+                           password=password_hash)
+                for i in range(start, min(start + batch_size, count))
+            ])
+        return list(user_model.objects.filter(username__startswith=f'{self.prefix}-user-').values_list('id', flat=True))
+
+    def create_named(self, model, count, make_name, defaults):
+        """ Creates reference data with unique names, returns ids of all created rows. """
+        names = set()
+        while len(names) < count:
+            names.add(f'{make_name()} {len(names)}'[:model._meta.get_field('name').max_length])
+        model.objects.bulk_create([model(name=name, **defaults) for name in names], ignore_conflicts=True)
+        return list(model.objects.filter(name__in=names).values_list('id', flat=True))
+
+    def create_materials(self, count, batch_size, user_ids, author_ids, platform_ids, type_ids, category_ids):
+        """ Inserts materials with their categories and owners, one transaction per batch. """
+        titles = [self.faker.catch_phrase() for _ in range(1000)]
+        descriptions = [self.faker.paragraph() for _ in range(1000)]
+        urls = [self.faker.url() for _ in range(1000)]
+        category_weights = [1 / rank for rank in range(1, len(category_ids) + 1)]
+        user_weights = [1 / rank ** 0.5 for rank in range(1, len(user_ids) + 1)]
+        today = date.today()
+        now = timezone.now()
+        created = 0
+        started = time.monotonic()
+        category_link = TrainingMaterials.category.through
+        shared = catalog.is_shared()
+        while created < count:
+            size = min(batch_size, count - created)
+            with transaction.atomic():
+                materials = []
+                for _ in range(size):
+                    is_time_limited = self.random.random() < 0.3
+                    material = TrainingMaterials(
+                        name=self.random.choice(titles)[:128],
+                        description=self.random.choice(descriptions),
+                        www=self.random.choice(urls),
+                        author_id=self.random.choice(author_ids),
+                        platform_id=self.random.choice(platform_ids),
+                        material_type_id=self.random.choice(type_ids),
+                        is_time_limited=is_time_limited,
+                        expected_study_time=self.random.randint(1, 100),
+                    )
+                    if shared:
+                        material.catalog_key = catalog.catalog_key(material.www, material.author_id,
+                                                                   material.platform_id)
+                    materials.append(material)
+                # Identical materials (already in the catalog or repeated in the batch) are inserted once.
+                entries = TrainingMaterials.objects.in_bulk({material.catalog_key for material in materials} - {None},
+                                                            field_name='catalog_key')
+                new_materials = []
+                for index, material in enumerate(materials):
+                    if material.catalog_key is None:
+                        new_materials.append(material)
+                        continue
+                    if material.catalog_key not in entries:
+                        entries[material.catalog_key] = material
+                        new_materials.append(material)
+                    materials[index] = entries[material.catalog_key]
+                TrainingMaterials.objects.bulk_create(new_materials)
+                owners = self.random.choices(user_ids, weights=user_weights, k=size)
+                links = []
+                for owner, material in zip(owners, materials):
+                    is_archived = self.random.random() < 0.15
+                    links.append(UserMaterial(
+                        user_id_id=owner, material_id=material,
+                        expiration_date=(today + timedelta(days=self.random.randint(-30, 365))
+                                         if material.is_time_limited else date(9999, 12, 31)),
+                        is_finished=self.random.random() < 0.4,
+                        is_archived=is_archived,
+                        archived_at=now - timedelta(days=self.random.randint(0, 720)) if is_archived else None))
+                # An owner may draw the same catalog entry twice, the first link is kept.
+                UserMaterial.objects.bulk_create(links, ignore_conflicts=True)
+                category_link.objects.bulk_create([
+                    category_link(trainingmaterials_id=material.id, category_id=category_id)
+                    for material in new_materials
+                    for category_id in set(self.random.choices(category_ids, weights=category_weights,
+                                                               k=self.random.randint(1, 3)))
+                ])
+                search.index_materials([material.id for material in new_materials])
+            created += size
+            self.stdout.write(f'{created}/{count} materials '
+                              f'({created / (time.monotonic() - started):.0f} materials/s)')
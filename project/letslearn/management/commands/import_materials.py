@@ -0,0 +1,220 @@
+import csv
+import itertools
+import json
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+
+from letslearn import archive, cache, catalog, search, stats
+from letslearn.models import Author, Platform, MaterialType, Category, TrainingMaterials, UserMaterial
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+
+
+def parse_bool(value, default=False):
+    """ Converts CSV/NDJSON value to bool, empty values give default. """
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def read_records(stream, file_format):
+    """
+    Yields records from CSV (with header) or NDJSON stream one by one.
+    CSV categories are separated with ``;``, in NDJSON they can be a list.
+    """
+    if file_format == 'csv':
+        for row in csv.DictReader(stream):
+            row['categories'] = [name.strip() for name in (row.get('categories') or '').split(';') if name.strip()]
+            yield row
+    else:
+        for line in stream:
+            if line.strip():
+                record = json.loads(line)
+                categories = record.get('categories') or []
+                if isinstance(categories, str):
+                    categories = [name.strip() for name in categories.split(';') if name.strip()]
+                record['categories'] = categories
+                yield record
+
+
+class BeingDeleted(Exception):
+    """ Record refers to an author or platform marked for deletion. """
+
+
+class NameLookup:
+    """
+    In-memory map from name to id of Author, Platform, MaterialType or Category, missing names are bulk created.
+    Authors and platforms marked for deletion are looked up too, their names are still taken.
+    """
+    def __init__(self, model, defaults=None):
+        self.model = model
+        self.defaults = defaults or {}
+        self.deletable = hasattr(model, 'all_objects')
+        self.manager = model.all_objects if self.deletable else model.objects
+        self.ids = {}
+        self.deleting = set()
+        self.load(self.manager.all())
+
+    def load(self, queryset):
+        if not self.deletable:
+            self.ids.update(queryset.values_list('name', 'id'))
+            return
+        for name, pk, deleting_at in queryset.values_list('name', 'id', 'deleting_at'):
+            self.ids[name] = pk
+            if deleting_at is not None:
+                self.deleting.add(name)
+
+    def resolve(self, names):
+        """
+        Makes sure all names exist in the database.
+        :param names: iterable of names used in current chunk.
+        :raise BeingDeleted: a name belongs to an object marked for deletion.
+        """
+        names = set(names)
+        missing = {name for name in names if name not in self.ids}
+        if missing:
+            self.model.objects.bulk_create([self.model(name=name, **self.defaults) for name in missing],
+                                           ignore_conflicts=True)
+            self.load(self.manager.filter(name__in=missing))
+        deleting = sorted(names & self.deleting)
+        if deleting:
+            raise BeingDeleted(f'{self.model._meta.verbose_name} "{deleting[0]}" is being deleted')
+
+    def __getitem__(self, name):
+        return self.ids[name]
+
+
+class Command(BaseCommand):
+    """
+    Imports training materials of one user from CSV or NDJSON file in batches.
+    In shared catalog mode materials which are already in the catalog are only linked with the user.
+    """
+    help = 'Streams training materials from CSV or NDJSON and inserts them with bulk_create.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or NDJSON file, '-' reads standard input.")
+        parser.add_argument('--user', required=True, help='Username of the owner of imported materials.')
+        parser.add_argument('--format', choices=('csv', 'ndjson'),
+                            help='Input format, guessed from file extension by default.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Records inserted in one transaction.')
+        parser.add_argument('--offset', type=int, default=0,
+                            help='Number of records to skip, used to resume an interrupted import.')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f"User {options['user']} doesn't exist.")
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        file_format = options['format']
+        if file_format is None:
+            file_format = 'csv' if options['path'].lower().endswith('.csv') else 'ndjson'
+
+        self.authors = NameLookup(Author)
+        self.platforms = NameLookup(Platform, {'www': ''})
+        self.material_types = NameLookup(MaterialType)
+        self.categories = NameLookup(Category)
+
+        if options['path'] == '-':
+            self.run(sys.stdin, file_format, user, options)
+        else:
+            with open(options['path'], newline='', encoding='utf-8') as stream:
+                self.run(stream, file_format, user, options)
+
+    def run(self, stream, file_format, user, options):
+        """ Reads records in chunks and imports them, printing progress after every chunk. """
+        offset = options['offset']
+        records = itertools.islice(read_records(stream, file_format), offset, None)
+        imported = 0
+        started = time.monotonic()
+        while True:
+            chunk = list(itertools.islice(records, options['chunk_size']))
+            if not chunk:
+                break
+            try:
+                self.import_chunk(chunk, user)
+            except BeingDeleted as error:
+                raise CommandError(f'Record in chunk starting at offset {offset + imported} can\'t be imported, '
+                                   f'{error}. Remove or change it and resume with --offset {offset + imported}.')
+            except (KeyError, ValueError, ValidationError, DataError, IntegrityError) as error:
+                raise CommandError(f'Invalid record in chunk starting at offset {offset + imported}: {error!r}. '
+                                   f'Fix it and resume with --offset {offset + imported}.')
+            imported += len(chunk)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'Imported {imported} records ({imported / elapsed:.0f} records/s), '
+                              f'resume offset: {offset + imported}')
+        stats.rebuild([user.id])
+        cache.bump_version(user.id)
+        self.stdout.write(self.style.SUCCESS(f'Done, {imported} records imported.'))
+
+    @transaction.atomic
+    def import_chunk(self, chunk, user):
+        """
+        Inserts one chunk of records with their category links and UserMaterial rows.
+        :param chunk: list of records read from input.
+        :param user: owner of imported materials.
+        """
+        self.authors.resolve(record['author'] for record in chunk)
+        self.platforms.resolve(record['platform'] for record in chunk)
+        self.material_types.resolve(record['material_type'] for record in chunk)
+        self.categories.resolve(name for record in chunk for name in record['categories'])
+        now = timezone.now()
+
+        materials = [
+            TrainingMaterials(
+                name=record['name'],
+                description=record.get('description') or '',
+                www=record.get('www') or '',
+                author_id=self.authors[record['author']],
+                platform_id=self.platforms[record['platform']],
+                material_type_id=self.material_types[record['material_type']],
+                is_time_limited=parse_bool(record.get('is_time_limited')),
+                expected_study_time=int(record['expected_study_time']) if record.get('expected_study_time') else None,
+            )
+            for record in chunk
+        ]
+        new_materials = materials
+        if catalog.is_shared():
+            # Materials already in the catalog (or repeated in the chunk) are linked, not inserted again,
+            # entries in the archive tier are brought back first.
+            for material in materials:
+                material.catalog_key = catalog.catalog_key(material.www, material.author_id, material.platform_id)
+            keys = {material.catalog_key for material in materials} - {None}
+            entries = TrainingMaterials.objects.in_bulk(keys, field_name='catalog_key')
+            entries.update(archive.restore_entries(keys - set(entries)))
+            new_materials = []
+            for index, material in enumerate(materials):
+                if material.catalog_key is None:
+                    new_materials.append(material)
+                    continue
+                if material.catalog_key not in entries:
+                    entries[material.catalog_key] = material
+                    new_materials.append(material)
+                materials[index] = entries[material.catalog_key]
+        TrainingMaterials.objects.bulk_create(new_materials)
+        new_ids = {material.id for material in new_materials}
+        category_link = TrainingMaterials.category.through
+        category_link.objects.bulk_create([
+            category_link(trainingmaterials_id=material.id, category_id=self.categories[name])
+            for material, record in zip(materials, chunk) if material.id in new_ids
+            for name in set(record['categories'])
+        ], ignore_conflicts=True)
+        expiration_date = UserMaterial._meta.get_field('expiration_date')
+        UserMaterial.objects.bulk_create([
+            UserMaterial(user_id=user, material_id=material,
+                         expiration_date=expiration_date.to_python(record.get('expiration_date') or '9999-12-31'),
+                         is_finished=parse_bool(record.get('is_finished')),
+                         comment=record.get('comment') or None,
+                         is_archived=parse_bool(record.get('is_archived')),
+                         archived_at=now if parse_bool(record.get('is_archived')) else None)
+            for material, record in zip(materials, chunk)
+        ], ignore_conflicts=True)
+        search.index_materials(new_ids)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from letslearn import search
+
+
+class Command(BaseCommand):
+    """ Rebuilds full-text search index of training materials. """
+    help = 'Rebuilds the full-text search index of training materials.'
+
+    def handle(self, *args, **options):
+        if not search.is_indexed_backend():
+            self.stdout.write('Database backend has no full-text index, nothing to rebuild.')
+            return
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from letslearn import stats
+
+
+class Command(BaseCommand):
+    """ Recomputes study statistics from materials, repairs drift of incremental updates. """
+    help = 'Rebuilds study statistics of all or selected users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', nargs='*', help='Usernames to rebuild (default: all users).')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            user_ids = list(get_user_model().objects.filter(username__in=options['user'])
+                            .values_list('id', flat=True))
+        rows = stats.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'{rows} statistics rows written.'))
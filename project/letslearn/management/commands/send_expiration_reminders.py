@@ -0,0 +1,83 @@
+from datetime import date, timedelta
+from itertools import groupby
+
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mass_mail
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+
+from letslearn.models import UserMaterial, Notification
+from letslearn.views import EXPIRATION_WARNING_DAYS
+
+
+class Command(BaseCommand):
+    """
+    Writes one digest per user listing unfinished, not archived, time limited materials which expire soon.
+    Users are processed in batches ordered by id, with one range query on expiration date per batch,
+    so memory use depends on batch size, not on number of users. Run it daily, e.g. from cron.
+    """
+    help = 'Creates digests of training materials close to expiration date.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=EXPIRATION_WARNING_DAYS,
+                            help='Materials expiring within this number of days are reported.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of users in one batch.')
+        parser.add_argument('--email', action='store_true',
+                            help='Also send digests by email using EMAIL_BACKEND.')
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='Day of the run (YYYY-MM-DD), today by default.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        today = options['date'] or date.today()
+        last_day = today + timedelta(days=options['days'])
+        users = get_user_model().objects.order_by('id')
+        last_user_id = 0
+        digests = 0
+        while True:
+            batch = dict(users.filter(id__gt=last_user_id).values_list('id', 'email')[:options['batch_size']])
+            if not batch:
+                break
+            last_user_id = max(batch)
+            digests += self.process_batch(batch, today, last_day, options['email'])
+        self.stdout.write(self.style.SUCCESS(f'{digests} digests created.'))
+
+    def process_batch(self, batch, today, last_day, send_email):
+        """
+        Creates digests for one batch of users.
+        :param batch: dictionary of user id -> email.
+        :param today: first day of reported range.
+        :param last_day: last day of reported range.
+        :param send_email: True if digests should also be sent by email.
+        :return: number of created digests.
+        """
+        expiring = (UserMaterial.objects
+                    .filter(user_id__in=list(batch),
+                            material_id__is_time_limited=True,
+                            expiration_date__range=(today, last_day),
+                            is_archived=False,
+                            is_finished=False)
+                    .order_by('user_id', 'expiration_date', 'material_id')
+                    .values_list('user_id', 'material_id__name', 'expiration_date'))
+        already_sent = set(Notification.objects
+                           .filter(user_id__in=list(batch), kind=Notification.EXPIRATION_DIGEST, sent_on=today)
+                           .values_list('user_id', flat=True))
+        notifications = []
+        for user_id, rows in groupby(expiring, key=lambda row: row[0]):
+            if user_id in already_sent:
+                continue
+            lines = [f'- {name} (expires {expiration_date})' for _, name, expiration_date in rows]
+            notifications.append(Notification(
+                user_id=user_id,
+                kind=Notification.EXPIRATION_DIGEST,
+                sent_on=today,
+                subject=f'{len(lines)} training materials close to expiration date',
+                body='Finish these training materials before they expire:\n' + '\n'.join(lines),
+            ))
+        Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+        if send_email:
+            send_mass_mail([(notification.subject, notification.body, settings.DEFAULT_FROM_EMAIL,
+                             [batch[notification.user_id]])
+                            for notification in notifications if batch[notification.user_id]])
+        return len(notifications)
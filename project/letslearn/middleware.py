@@ -0,0 +1,260 @@
+import logging
+import mimetypes
+import os
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import Signal
+from django.http import FileResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+
+from . import cache, replicas
+from .staticfiles import ENCODINGS
+
+logger = logging.getLogger('letslearn.requests')
+
+# Sent after every measured request with method, url_name, queries, db_time and duration (seconds) arguments.
+request_measured = Signal()
+
+# Counters of the current request, they follow the request into sync_to_async threads.
+_query_stats = ContextVar('letslearn_query_stats', default=None)
+
+
+class AsyncCapableMiddleware:
+    """
+    Base of middleware which runs in the same mode as the rest of the chain, like Django's own middleware:
+    under ASGI ``__acall__`` awaits async views directly instead of the whole chain being run in a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.call(request)
+
+    def call(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+
+def measure_query(execute, sql, params, many, context):
+    """ Execute wrapper of every connection, counts queries of the request being measured. """
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats['db_time'] += time.perf_counter() - started
+        stats['queries'] += 1
+
+
+def add_query_wrapper(connection, **kwargs):
+    """ Installs measure_query on the connection once. """
+    if measure_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, measure_query)
+
+
+class QueryStatsMiddleware(AsyncCapableMiddleware):
+    """
+    Measures number of SQL queries, total database time and latency of every request.
+    Results are logged, added to ``Server-Timing`` and ``X-Query-Count`` response headers
+    and sent with :data:`request_measured` signal, keyed by URL name from ``letslearn/urls.py``.
+    Queries are counted by a wrapper installed on every connection of every thread, counters are kept
+    in a context variable, so queries of async views run in sync_to_async threads are counted too.
+    Queries run while a streaming response is consumed are not counted.
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        connection_created.connect(add_query_wrapper, dispatch_uid='letslearn_query_stats')
+        for connection in connections.all(initialized_only=True):
+            add_query_wrapper(connection)
+
+    def call(self, request):
+        token = _query_stats.set({'queries': 0, 'db_time': 0.0, 'started': time.perf_counter()})
+        try:
+            response = self.get_response(request)
+            return self.measured(request, response)
+        finally:
+            _query_stats.reset(token)
+
+    async def __acall__(self, request):
+        token = _query_stats.set({'queries': 0, 'db_time': 0.0, 'started': time.perf_counter()})
+        try:
+            response = await self.get_response(request)
+            return self.measured(request, response)
+        finally:
+            _query_stats.reset(token)
+
+    def measured(self, request, response):
+        stats = _query_stats.get()
+        queries, db_time = stats['queries'], stats['db_time']
+        duration = time.perf_counter() - stats['started']
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        response['X-Query-Count'] = str(queries)
+        response['Server-Timing'] = (f'db;dur={db_time * 1000:.1f};desc="{queries} queries", '
+                                     f'view;dur={duration * 1000:.1f}')
+        logger.info('%s %s url_name=%s status=%s queries=%d db_ms=%.1f total_ms=%.1f', request.method,
+                    request.path, url_name, response.status_code, queries, db_time * 1000, duration * 1000)
+        request_measured.send(sender=self.__class__, method=request.method, url_name=url_name, queries=queries,
+                              db_time=db_time, duration=duration)
+        return response
+
+
+class DataVersionMiddleware(AsyncCapableMiddleware):
+    """
+    Data versions (see :mod:`letslearn.cache`) are read from the database at most once per request, however many
+    ETags and cache keys use them.
+    """
+    def call(self, request):
+        with cache.request_versions():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with cache.request_versions():
+            return await self.get_response(request)
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    Chooses the database read by the request, see :mod:`letslearn.replicas`.
+    GET and HEAD requests of views named in ``REPLICA_READ_VIEWS`` read from a healthy replica, other requests
+    read from the primary. After a request which could write (any other method) the user's session reads from
+    the primary for ``REPLICA_STICKY_SECONDS``, so the user sees their own changes before replicas catch up.
+    Must be placed after SessionMiddleware.
+    """
+    SESSION_KEY = '_letslearn_primary_until'
+
+    def call(self, request):
+        with replicas.reading_from(None):
+            response = self.get_response(request)
+        self.stick_to_primary(request)
+        return response
+
+    async def __acall__(self, request):
+        with replicas.reading_from(None):
+            response = await self.get_response(request)
+        if self.could_write(request):
+            # Session is loaded from its backend synchronously.
+            await sync_to_async(self.stick_to_primary)(request)
+        return response
+
+    @staticmethod
+    def could_write(request):
+        return request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and hasattr(request, 'session')
+
+    def stick_to_primary(self, request):
+        if self.could_write(request):
+            request.session[self.SESSION_KEY] = time.time() + getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if request.resolver_match.url_name not in getattr(settings, 'REPLICA_READ_VIEWS', ()):
+            return None
+        if request.session.get(self.SESSION_KEY, 0) > time.time():
+            return None
+        alias = replicas.choose_replica()
+        if alias is not None:
+            replicas.set_read_alias(alias)
+        return None
+
+
+def accepted_encodings(header):
+    """
+    Parses Accept-Encoding request header.
+    :param header: value of the header.
+    :return: set of encodings accepted with non-zero quality.
+    """
+    accepted = set()
+    for item in header.split(','):
+        encoding, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if encoding and quality > 0:
+            accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticMiddleware(AsyncCapableMiddleware):
+    """
+    Serves files collected to STATIC_ROOT by :class:`letslearn.staticfiles.CompressedManifestStaticFilesStorage`,
+    the brotli or gzip variant is chosen according to Accept-Encoding. Names with content hash are cached by
+    browsers for a year as immutable, so repeat visits don't request them at all. Requests of files missing in
+    STATIC_ROOT are passed on, e.g. to ``runserver``. Place it before middleware which touches the session.
+    """
+    IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+    # Unhashed names (e.g. referenced from outside of templates) may change with the next deployment.
+    REVALIDATE_CACHE_CONTROL = 'public, max-age=60'
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.root = settings.STATIC_ROOT
+
+    def is_static(self, request):
+        return self.root and request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix)
+
+    def call(self, request):
+        if self.is_static(request):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.is_static(request):
+            # File system checks and open() block.
+            response = await sync_to_async(self.serve, thread_sensitive=False)(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def serve(self, request, name):
+        """
+        :param request: GET or HEAD request of a static file.
+        :param name: path of the file relative to STATIC_ROOT.
+        :return: FileResponse or None if there is no such file.
+        """
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not name or not os.path.isfile(path):
+            return None
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        encoding = next((encoding for encoding, suffix in ENCODINGS.items()
+                         if encoding in accepted and os.path.isfile(path + suffix)), None)
+        served = path + ENCODINGS[encoding] if encoding else path
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = FileResponse(open(served, 'rb'), content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Vary'] = 'Accept-Encoding'
+        immutable = getattr(staticfiles_storage, 'is_hashed', lambda name: False)(name)
+        response['Cache-Control'] = self.IMMUTABLE_CACHE_CONTROL if immutable else self.REVALIDATE_CACHE_CONTROL
+        response['Last-Modified'] = http_date(os.path.getmtime(path))
+        return response
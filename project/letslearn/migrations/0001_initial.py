@@ -0,0 +1,76 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Author',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256, unique=True)),
+                ('www', models.CharField(max_length=256, null=True)),
+                ('comment', models.TextField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MaterialType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Platform',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True)),
+                ('www', models.CharField(max_length=256)),
+                ('comment', models.TextField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrainingMaterials',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128)),
+                ('description', models.TextField()),
+                ('www', models.CharField(max_length=256)),
+                ('is_time_limited', models.BooleanField()),
+                ('expiration_date', models.DateField(default='9999-12-31')),
+                ('is_finished', models.BooleanField()),
+                ('comment', models.TextField(null=True)),
+                ('expected_study_time', models.IntegerField(null=True)),
+                ('is_archived', models.BooleanField(default=False)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='letslearn.author')),
+                ('category', models.ManyToManyField(to='letslearn.category')),
+                ('material_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='letslearn.materialtype')),
+                ('platform', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='letslearn.platform')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserMaterial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('material_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='letslearn.trainingmaterials')),
+                ('user_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
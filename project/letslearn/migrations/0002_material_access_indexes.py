@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letslearn', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trainingmaterials',
+            index=models.Index(fields=['is_archived', 'is_time_limited', 'expiration_date'], name='material_state_exp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainingmaterials',
+            index=models.Index(condition=models.Q(('is_time_limited', True)), fields=['expiration_date'], name='material_time_limited_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='usermaterial',
+            constraint=models.UniqueConstraint(fields=('user_id', 'material_id'), name='unique_user_material'),
+        ),
+    ]
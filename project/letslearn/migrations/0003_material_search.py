@@ -0,0 +1,48 @@
+from django.db import migrations
+
+SOURCE_SQL = """
+    FROM letslearn_trainingmaterials m
+    JOIN letslearn_author a ON a.id = m.author_id
+    JOIN letslearn_platform p ON p.id = m.platform_id
+"""
+
+FORWARD_SQL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE letslearn_material_search USING fts5(name, description, comment, author, platform)",
+        "INSERT INTO letslearn_material_search (rowid, name, description, comment, author, platform) "
+        "SELECT m.id, m.name, m.description, COALESCE(m.comment, ''), a.name, p.name" + SOURCE_SQL,
+    ],
+    'postgresql': [
+        "CREATE TABLE letslearn_material_search ("
+        "material_id bigint PRIMARY KEY REFERENCES letslearn_trainingmaterials (id) "
+        "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+        "document tsvector NOT NULL)",
+        "CREATE INDEX letslearn_material_search_doc_idx ON letslearn_material_search USING GIN (document)",
+        "INSERT INTO letslearn_material_search (material_id, document) "
+        "SELECT m.id, "
+        "setweight(to_tsvector('simple', m.name), 'A') "
+        "|| setweight(to_tsvector('simple', a.name || ' ' || p.name), 'B') "
+        "|| setweight(to_tsvector('simple', m.description || ' ' || COALESCE(m.comment, '')), 'C')" + SOURCE_SQL,
+    ],
+}
+
+
+def create_search_table(apps, schema_editor):
+    for sql in FORWARD_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in FORWARD_SQL:
+        schema_editor.execute("DROP TABLE letslearn_material_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letslearn', '0002_material_access_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('letslearn', '0003_material_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('expiration_digest', 'Materials close to expiration date')], max_length=32)),
+                ('sent_on', models.DateField()),
+                ('subject', models.CharField(max_length=256)),
+                ('body', models.TextField()),
+                ('is_read', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'sent_on'), name='unique_notification_per_day'),
+        ),
+    ]
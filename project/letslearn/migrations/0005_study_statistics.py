@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('letslearn', '0004_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudyStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('materials', models.IntegerField(default=0)),
+                ('finished', models.IntegerField(default=0)),
+                ('archived', models.IntegerField(default=0)),
+                ('study_time', models.IntegerField(default=0)),
+                ('finished_study_time', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='letslearn.category')),
+                ('platform', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='letslearn.platform')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='studystatistics',
+            constraint=models.UniqueConstraint(condition=models.Q(('category', None), ('platform', None)), fields=('user',), name='unique_total_statistics'),
+        ),
+        migrations.AddConstraint(
+            model_name='studystatistics',
+            constraint=models.UniqueConstraint(condition=models.Q(('platform', None)), fields=('user', 'category'), name='unique_category_statistics'),
+        ),
+        migrations.AddConstraint(
+            model_name='studystatistics',
+            constraint=models.UniqueConstraint(condition=models.Q(('category', None)), fields=('user', 'platform'), name='unique_platform_statistics'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letslearn', '0005_study_statistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkCheck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=256, unique=True)),
+                ('status_code', models.IntegerField(null=True)),
+                ('error', models.CharField(blank=True, default='', max_length=256)),
+                ('latency_ms', models.FloatField(null=True)),
+                ('checked_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,141 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+STATE_FIELDS = ('is_finished', 'is_archived', 'comment', 'expiration_date')
+BATCH_SIZE = 1000
+
+SOURCE_SQL = """
+    FROM letslearn_trainingmaterials m
+    JOIN letslearn_author a ON a.id = m.author_id
+    JOIN letslearn_platform p ON p.id = m.platform_id
+"""
+
+SQLITE_SEARCH_SQL = {
+    'forward': [
+        "DROP TABLE letslearn_material_search",
+        "CREATE VIRTUAL TABLE letslearn_material_search USING fts5(name, description, author, platform)",
+        "INSERT INTO letslearn_material_search (rowid, name, description, author, platform) "
+        "SELECT m.id, m.name, m.description, a.name, p.name" + SOURCE_SQL,
+    ],
+    'backward': [
+        "DROP TABLE letslearn_material_search",
+        "CREATE VIRTUAL TABLE letslearn_material_search USING fts5(name, description, comment, author, platform)",
+        "INSERT INTO letslearn_material_search (rowid, name, description, comment, author, platform) "
+        "SELECT m.id, m.name, m.description, COALESCE(m.comment, ''), a.name, p.name" + SOURCE_SQL,
+    ],
+}
+
+
+def _batches(model):
+    """ Yields lists of ids of model instances, BATCH_SIZE long. """
+    last_id = 0
+    while True:
+        ids = list(model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def copy_state_to_links(apps, schema_editor):
+    """ Copies state of every material to its links, one short UPDATE per batch of links. """
+    TrainingMaterials = apps.get_model('letslearn', 'TrainingMaterials')
+    UserMaterial = apps.get_model('letslearn', 'UserMaterial')
+    material = TrainingMaterials.objects.filter(id=OuterRef('material_id'))
+    for ids in _batches(UserMaterial):
+        UserMaterial.objects.filter(id__in=ids).update(
+            **{name: Subquery(material.values(name)[:1]) for name in STATE_FIELDS})
+
+
+def copy_state_to_materials(apps, schema_editor):
+    """ Reverse: material gets state of its oldest link. """
+    TrainingMaterials = apps.get_model('letslearn', 'TrainingMaterials')
+    UserMaterial = apps.get_model('letslearn', 'UserMaterial')
+    link = UserMaterial.objects.filter(material_id=OuterRef('id')).order_by('id')
+    for ids in _batches(TrainingMaterials):
+        TrainingMaterials.objects.filter(id__in=ids, usermaterial__isnull=False).update(
+            **{name: Subquery(link.values(name)[:1]) for name in STATE_FIELDS})
+
+
+def rebuild_search_table(direction):
+    def rebuild(apps, schema_editor):
+        # PostgreSQL index is a tsvector, comments disappear from it on the next reindex of a material.
+        if schema_editor.connection.vendor == 'sqlite':
+            for sql in SQLITE_SEARCH_SQL[direction]:
+                schema_editor.execute(sql)
+    return rebuild
+
+
+class Migration(migrations.Migration):
+    # Every batch of copied state is committed on its own, so links are not locked for the whole copy.
+    atomic = False
+
+    dependencies = [
+        ('letslearn', '0006_link_check'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingmaterials',
+            name='catalog_key',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='usermaterial',
+            name='comment',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='usermaterial',
+            name='expiration_date',
+            field=models.DateField(default='9999-12-31'),
+        ),
+        migrations.AddField(
+            model_name='usermaterial',
+            name='is_archived',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='usermaterial',
+            name='is_finished',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(rebuild_search_table('forward'), rebuild_search_table('backward')),
+        migrations.RunPython(copy_state_to_links, copy_state_to_materials),
+        migrations.RemoveIndex(
+            model_name='trainingmaterials',
+            name='material_state_exp_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='trainingmaterials',
+            name='material_time_limited_idx',
+        ),
+        # Gives the column a default, so it can be added back to existing rows when the migration is reversed.
+        migrations.AlterField(
+            model_name='trainingmaterials',
+            name='is_finished',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RemoveField(
+            model_name='trainingmaterials',
+            name='comment',
+        ),
+        migrations.RemoveField(
+            model_name='trainingmaterials',
+            name='expiration_date',
+        ),
+        migrations.RemoveField(
+            model_name='trainingmaterials',
+            name='is_archived',
+        ),
+        migrations.RemoveField(
+            model_name='trainingmaterials',
+            name='is_finished',
+        ),
+        migrations.AddIndex(
+            model_name='usermaterial',
+            index=models.Index(fields=['user_id', 'is_archived', 'expiration_date'], name='user_material_state_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:04
+
+import django.core.serializers.json
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def date_archived_links(apps, schema_editor):
+    """ Links archived before the field existed count as archived when the migration runs. """
+    UserMaterial = apps.get_model('letslearn', 'UserMaterial')
+    UserMaterial.objects.filter(is_archived=True, archived_at__isnull=True).update(archived_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letslearn', '0008_replica_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLink',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('user_id', models.BigIntegerField()),
+                ('material_id', models.BigIntegerField()),
+                ('state', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedMaterial',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('category_ids', models.JSONField(default=list)),
+                ('archived_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='usermaterial',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(date_archived_links, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='usermaterial',
+            index=models.Index(condition=models.Q(('is_archived', True)), fields=['archived_at'], name='user_material_archived_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedlink',
+            index=models.Index(fields=['material_id'], name='archived_link_material_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='archivedlink',
+            constraint=models.UniqueConstraint(fields=('user_id', 'material_id'), name='unique_archived_link'),
+        ),
+    ]
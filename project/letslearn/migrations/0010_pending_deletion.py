@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letslearn', '0009_archive_tier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='deleting_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='platform',
+            name='deleting_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('letslearn', '0010_pending_deletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('material_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('finished', 'Finished'), ('unfinished', 'Marked as unfinished'), ('archived', 'Archived'), ('restored', 'Restored')], max_length=16)),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at'], name='progress_event_user_time_idx')],
+            },
+        ),
+    ]
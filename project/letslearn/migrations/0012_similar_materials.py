@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letslearn', '0011_progress_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('built_at', models.DateTimeField()),
+                ('last_material_id', models.BigIntegerField()),
+                ('top_k', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarMaterial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('material', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='similar_materials', to='letslearn.trainingmaterials')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='letslearn.trainingmaterials')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='similarmaterial',
+            constraint=models.UniqueConstraint(fields=('material', 'rank'), name='unique_similar_material_rank'),
+        ),
+    ]
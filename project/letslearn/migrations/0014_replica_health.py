@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letslearn', '0013_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicaHealth',
+            fields=[
+                ('alias', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('down_until', models.DateTimeField(null=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('checked_at', models.DateTimeField()),
+            ],
+        ),
+    ]
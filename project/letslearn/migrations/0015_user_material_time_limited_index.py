@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:59
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letslearn', '0014_replica_health'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usermaterial',
+            index=models.Index(condition=models.Q(('expiration_date', datetime.date(9999, 12, 31)), _negated=True), fields=['expiration_date'], name='user_material_time_limited_idx'),
+        ),
+    ]
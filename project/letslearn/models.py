@@ -1,9 +1,41 @@
+from datetime import date
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import F, Q
 from django.urls import reverse
 
 
-class Author(models.Model):
+class ActiveManager(models.Manager):
+    """Hides objects marked for deletion, see :mod:`letslearn.deletion`."""
+    def get_queryset(self):
+        return super().get_queryset().filter(deleting_at__isnull=True)
+
+
+class DeletableModel(models.Model):
+    """Model whose objects are deleted in the background: ``deleting_at`` marks them, ``objects`` hides them
+    and ``delete_pending`` command deletes them with their materials in batches. ``all_objects`` sees everything."""
+    deleting_at = models.DateTimeField(null=True, editable=False)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        abstract = True
+
+    def validate_unique(self, exclude=None):
+        """Unique checks use ``objects``, the name of an object being deleted is still taken."""
+        super().validate_unique(exclude)
+        if exclude and 'name' in exclude:
+            return
+        if type(self).all_objects.filter(name=self.name, deleting_at__isnull=False).exclude(pk=self.pk).exists():
+            raise ValidationError({'name': f'{self._meta.verbose_name.capitalize()} with this name is being deleted, '
+                                           f'try again later.'})
+
+
+class Author(DeletableModel):
     """Stores information about author of training material."""
     name = models.CharField(max_length=256, unique=True)
     www = models.CharField(max_length=256, null=True)
@@ -18,7 +50,7 @@ class Author(models.Model):
         return reverse('author_details')
 
 
-class Platform(models.Model):
+class Platform(DeletableModel):
     """Stores information about platform with training material."""
     name = models.CharField(max_length=128, unique=True)
     www = models.CharField(max_length=256)
@@ -55,10 +87,23 @@ class MaterialType(models.Model):
         return self.name
 
 
+class TrainingMaterialsQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """
+        Limits materials to the ones linked with the user and annotates them with user's state
+        (is_finished, is_archived, comment, expiration_date) stored in :model:`letslearn.UserMaterial`.
+        Annotations can be filtered and ordered like fields, they come from the same join.
+        """
+        return (self.filter(usermaterial__user_id=user)
+                .annotate(**{name: F(f'usermaterial__{name}') for name in UserMaterial.STATE_FIELDS}))
+
+
 class TrainingMaterials(models.Model):
     """Stores information about training material, related to: :model:`letslearn.Author,
      :model:`letslearn.Platform`, :model:`letslearn.Category`, :model:`letslearn.MaterialType`,
      model:`letslearn.Category`.
+     Materials form a catalog shared by all users, state of a material chosen by the user is stored
+     in :model:`letslearn.UserMaterial`. ``catalog_key`` identifies identical materials, see :mod:`letslearn.catalog`.
      """
     name = models.CharField(max_length=128)
     description = models.TextField()
@@ -68,11 +113,10 @@ class TrainingMaterials(models.Model):
     category = models.ManyToManyField(Category)
     material_type = models.ForeignKey(MaterialType, on_delete=models.CASCADE)
     is_time_limited = models.BooleanField()
-    expiration_date = models.DateField(default='9999-12-31')
-    is_finished = models.BooleanField()
-    comment = models.TextField(null=True)
     expected_study_time = models.IntegerField(null=True)
-    is_archived = models.BooleanField(default=False)
+    catalog_key = models.CharField(max_length=64, null=True, unique=True, editable=False)
+
+    objects = TrainingMaterialsQuerySet.as_manager()
 
     def __str__(self):
         """Shows name of the type of material."""
@@ -84,9 +128,199 @@ class TrainingMaterials(models.Model):
 
 
 class UserMaterial(models.Model):
-    """Model that connects user with material, related to :model:`auth.User and :model:`letslearn.TrainingMaterials."""
+    """Model that connects user with material, related to :model:`auth.User and :model:`letslearn.TrainingMaterials.
+    Holds state of the material chosen by the user."""
+    STATE_FIELDS = ('is_finished', 'is_archived', 'comment', 'expiration_date')
+
     user_id = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     material_id = models.ForeignKey(TrainingMaterials, on_delete=models.CASCADE)
+    is_finished = models.BooleanField(default=False)
+    is_archived = models.BooleanField(default=False)
+    comment = models.TextField(null=True)
+    expiration_date = models.DateField(default='9999-12-31')
+    # Set when the material is archived, old archived links are moved to the archive tier.
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'material_id'], name='unique_user_material'),
+        ]
+        indexes = [
+            models.Index(fields=['user_id', 'is_archived', 'expiration_date'], name='user_material_state_idx'),
+            models.Index(fields=['archived_at'], name='user_material_archived_idx', condition=Q(is_archived=True)),
+            # Only time limited links get an expiration date, expiring queries don't read the others.
+            models.Index(fields=['expiration_date'], name='user_material_time_limited_idx',
+                         condition=~Q(expiration_date=date(9999, 12, 31))),
+        ]
+
+
+class ArchivedLink(models.Model):
+    """Cold copy of user's archived :model:`letslearn.UserMaterial`, see :mod:`letslearn.archive`.
+    Keeps id of the link, user and material are plain ids, so the archive can be stored in another database."""
+    id = models.BigIntegerField(primary_key=True)
+    user_id = models.BigIntegerField()
+    material_id = models.BigIntegerField()
+    state = models.JSONField(encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'material_id'], name='unique_archived_link'),
+        ]
+        indexes = [
+            models.Index(fields=['material_id'], name='archived_link_material_idx'),
+        ]
+
+
+class ArchivedMaterial(models.Model):
+    """Cold copy of :model:`letslearn.TrainingMaterials` whose every link is in the archive tier,
+    with ids of its categories. Keeps id of the material."""
+    id = models.BigIntegerField(primary_key=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    category_ids = models.JSONField(default=list)
+    archived_at = models.DateTimeField()
+
+
+class ProgressEvent(models.Model):
+    """Append-only record of a change of user's state of a training material, related to :model:`auth.User`.
+    Material is a plain id, history stays when the material is moved to the archive tier or deleted.
+    Events are written in batches by :mod:`letslearn.events`."""
+    FINISHED = 'finished'
+    UNFINISHED = 'unfinished'
+    ARCHIVED = 'archived'
+    RESTORED = 'restored'
+    KIND_CHOICES = [(FINISHED, 'Finished'), (UNFINISHED, 'Marked as unfinished'), (ARCHIVED, 'Archived'),
+                    (RESTORED, 'Restored')]
+    # (changed UserMaterial field, new value) -> kind
+    KINDS = {('is_finished', True): FINISHED, ('is_finished', False): UNFINISHED,
+             ('is_archived', True): ARCHIVED, ('is_archived', False): RESTORED}
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    material_id = models.BigIntegerField()
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='progress_event_user_time_idx'),
+        ]
+
+
+class Notification(models.Model):
+    """Stores message for the user, e.g. digest of materials close to expiration date, related to :model:`auth.User."""
+    EXPIRATION_DIGEST = 'expiration_digest'
+    KIND_CHOICES = [(EXPIRATION_DIGEST, 'Materials close to expiration date')]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    sent_on = models.DateField()
+    subject = models.CharField(max_length=256)
+    body = models.TextField()
+    is_read = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind', 'sent_on'], name='unique_notification_per_day'),
+        ]
+
+    def __str__(self):
+        """Shows subject of the notification."""
+        return self.subject
+
+
+class StudyStatistics(models.Model):
+    """Denormalized numbers of user's materials, related to :model:`auth.User, :model:`letslearn.Category
+    and :model:`letslearn.Platform`. Row without category and platform holds totals of the user, other rows
+    hold numbers of one category or one platform. Updated by signals, see :mod:`letslearn.stats`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True)
+    platform = models.ForeignKey(Platform, on_delete=models.CASCADE, null=True)
+    materials = models.IntegerField(default=0)
+    finished = models.IntegerField(default=0)
+    archived = models.IntegerField(default=0)
+    study_time = models.IntegerField(default=0)
+    finished_study_time = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user'], condition=models.Q(category=None, platform=None),
+                                    name='unique_total_statistics'),
+            models.UniqueConstraint(fields=['user', 'category'], condition=models.Q(platform=None),
+                                    name='unique_category_statistics'),
+            models.UniqueConstraint(fields=['user', 'platform'], condition=models.Q(category=None),
+                                    name='unique_platform_statistics'),
+        ]
+
+    @property
+    def unfinished(self):
+        """Number of not archived materials which are not finished."""
+        return self.materials - self.finished
+
+
+class LinkCheck(models.Model):
+    """Stores result of the last health check of an URL used in ``www`` of materials, authors or platforms."""
+    url = models.CharField(max_length=256, unique=True)
+    status_code = models.IntegerField(null=True)
+    error = models.CharField(max_length=256, blank=True, default='')
+    latency_ms = models.FloatField(null=True)
+    checked_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        """Shows checked url with its status."""
+        return f'{self.url} ({self.status_code or self.error})'
+
+    @property
+    def is_alive(self):
+        """True if the server answered without client or server error."""
+        return self.status_code is not None and self.status_code < 400
+
+
+class ReplicaHeartbeat(models.Model):
+    """Single row written on the primary database by ``check_replicas``, its age read on a replica is the replica's lag."""
+    beat_at = models.DateTimeField()
+
+
+class ReplicaHealth(models.Model):
+    """Result of the last check of a read replica written on the primary database by ``check_replicas``,
+    read by web processes, see :mod:`letslearn.replicas`. Replica gets no reads until ``down_until``."""
+    alias = models.CharField(max_length=64, primary_key=True)
+    down_until = models.DateTimeField(null=True)
+    error = models.CharField(max_length=255, blank=True)
+    checked_at = models.DateTimeField()
+
+
+class SimilarMaterial(models.Model):
+    """Precomputed neighbour of a training material, written by ``build_similar_materials``,
+    see :mod:`letslearn.similar`. Rank 0 is the most similar material, ``score`` is cosine similarity."""
+    # Unique (material, rank) constraint is the index of lookups.
+    material = models.ForeignKey(TrainingMaterials, on_delete=models.CASCADE, related_name='similar_materials',
+                                 db_index=False)
+    similar = models.ForeignKey(TrainingMaterials, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['material', 'rank'], name='unique_similar_material_rank'),
+        ]
+
+
+class SimilarityIndex(models.Model):
+    """Single row describing the last build of :model:`letslearn.SimilarMaterial`, materials with higher ids
+    are added by the next incremental build."""
+    built_at = models.DateTimeField()
+    last_material_id = models.BigIntegerField()
+    top_k = models.PositiveSmallIntegerField()
+
+
+class DataVersion(models.Model):
+    """Version counter of cached data (of one user or of reference data shared by all users), see
+    :mod:`letslearn.cache`. Kept on the primary database, so bumps of every process and command are seen by all
+    web processes and survive restarts."""
+    key = models.CharField(max_length=64, primary_key=True)
+    version = models.PositiveBigIntegerField(default=1)
+    changed_at = models.DateTimeField()
 
 
 
@@ -0,0 +1,149 @@
+"""
+Read replicas of the primary (``default``) database.
+
+:class:`ReplicaRouter` sends every write to the primary. Reads go to the database chosen for the current request
+by :class:`letslearn.middleware.ReplicaRoutingMiddleware`: one of healthy ``DATABASE_REPLICAS`` for GET requests
+of views listed in ``REPLICA_READ_VIEWS``, the primary otherwise. The choice is kept in a context variable,
+so it follows the request into ``sync_to_async`` threads.
+
+Replicas are checked by ``check_replicas`` command: it writes a heartbeat on the primary and reads it on every
+replica, a replica which can't be reached or whose heartbeat is older than ``REPLICA_MAX_LAG`` seconds is marked
+as down for ``REPLICA_HEALTH_TTL`` seconds and gets no reads. The command runs in its own process, so marks are
+:model:`letslearn.ReplicaHealth` rows on the primary database (a process-local cache would never reach web
+processes). Every web process reads them at most once per ``REPLICA_HEALTH_REFRESH`` seconds.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.utils import timezone
+
+from .models import ReplicaHealth, ReplicaHeartbeat
+
+_read_alias = ContextVar('letslearn_read_alias', default=None)
+# Aliases marked as down read by this process and monotonic time when they have to be read again.
+_down = {'aliases': frozenset(), 'refresh_at': 0.0}
+
+
+class ReplicaRouter:
+    """ Database router: writes to the primary, reads to the alias chosen for the current request. """
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+
+def set_read_alias(alias):
+    """
+    Sends reads of the rest of the current context (request) to the database alias, None means the primary.
+    :param alias: database alias.
+    """
+    _read_alias.set(alias)
+
+
+@contextmanager
+def reading_from(alias):
+    """
+    Sends reads inside the block to the database alias, None means the primary.
+    :param alias: database alias.
+    """
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def down_replicas():
+    """
+    Reads replicas marked as down from the primary database, at most once per REPLICA_HEALTH_REFRESH seconds.
+    :return: frozenset of aliases.
+    """
+    if time.monotonic() >= _down['refresh_at']:
+        _down['aliases'] = frozenset(ReplicaHealth.objects
+                                     .using(DEFAULT_DB_ALIAS)
+                                     .filter(down_until__gt=timezone.now())
+                                     .values_list('alias', flat=True))
+        _down['refresh_at'] = time.monotonic() + getattr(settings, 'REPLICA_HEALTH_REFRESH', 5)
+    return _down['aliases']
+
+
+def forget_health():
+    """ Makes the next down_replicas call read marks from the database. """
+    _down['refresh_at'] = 0.0
+
+
+def healthy_replicas():
+    """
+    :return: aliases of DATABASE_REPLICAS which are not marked as down.
+    """
+    replicas = list(getattr(settings, 'DATABASE_REPLICAS', []))
+    if not replicas:
+        return []
+    down = down_replicas()
+    return [alias for alias in replicas if alias not in down]
+
+
+def choose_replica():
+    """
+    :return: random healthy replica alias, None if there is none and reads should go to the primary.
+    """
+    replicas = healthy_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+def beat():
+    """ Writes current time to the heartbeat row on the primary database. """
+    ReplicaHeartbeat.objects.using(DEFAULT_DB_ALIAS).update_or_create(id=1, defaults={'beat_at': timezone.now()})
+
+
+def replica_lag(alias):
+    """
+    Reads the heartbeat on the replica.
+    :param alias: database alias of the replica.
+    :return: lag in seconds, None if the replica has no heartbeat yet.
+    :raise DatabaseError: replica can't be queried.
+    """
+    beat_at = ReplicaHeartbeat.objects.using(alias).filter(id=1).values_list('beat_at', flat=True).first()
+    if beat_at is None:
+        return None
+    return max((timezone.now() - beat_at).total_seconds(), 0.0)
+
+
+def check_replicas(max_lag=None):
+    """
+    Writes a heartbeat and checks lag of every replica, marks replicas as down or back up.
+    Lag is measured against the previous heartbeat which has reached the replica, so it includes
+    the interval between checks, REPLICA_MAX_LAG must be longer than that interval.
+    :param max_lag: seconds of allowed lag, REPLICA_MAX_LAG setting by default.
+    :return: dictionary of alias -> (True if healthy, lag in seconds or None, error message).
+    """
+    if max_lag is None:
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG', 30)
+    beat()
+    results = {}
+    for alias in getattr(settings, 'DATABASE_REPLICAS', []):
+        try:
+            lag = replica_lag(alias)
+        except DatabaseError as error:
+            results[alias] = (False, None, str(error))
+        else:
+            healthy = lag is not None and lag <= max_lag
+            error = '' if healthy else 'no heartbeat' if lag is None else f'lag over {max_lag}s'
+            results[alias] = (healthy, lag, error)
+        healthy, _, error = results[alias]
+        now = timezone.now()
+        down_until = None if healthy else now + timedelta(seconds=getattr(settings, 'REPLICA_HEALTH_TTL', 60))
+        ReplicaHealth.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+            alias=alias, defaults={'down_until': down_until, 'error': error[:255], 'checked_at': now})
+    forget_health()
+    return results
@@ -0,0 +1,166 @@
+"""
+Full-text search over training materials.
+
+The index lives in a separate table filled from :model:`letslearn.TrainingMaterials` together with author
+and platform names. Materials are shared by users, so users' comments are not indexed. SQLite uses an FTS5 virtual table, PostgreSQL a tsvector column with GIN index.
+Other database backends fall back to ``icontains`` filtering.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import TrainingMaterials
+
+SEARCH_TABLE = 'letslearn_material_search'
+
+_SOURCE_SQL = """
+    FROM letslearn_trainingmaterials m
+    JOIN letslearn_author a ON a.id = m.author_id
+    JOIN letslearn_platform p ON p.id = m.platform_id
+"""
+
+_SQLITE_INSERT_SQL = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, name, description, author, platform)
+    SELECT m.id, m.name, m.description, a.name, p.name
+    {_SOURCE_SQL}
+"""
+
+_POSTGRES_INSERT_SQL = f"""
+    INSERT INTO {SEARCH_TABLE} (material_id, document)
+    SELECT m.id,
+           setweight(to_tsvector('simple', m.name), 'A')
+           || setweight(to_tsvector('simple', a.name || ' ' || p.name), 'B')
+           || setweight(to_tsvector('simple', m.description), 'C')
+    {_SOURCE_SQL}
+"""
+
+_KEY_COLUMN = {'sqlite': 'rowid', 'postgresql': 'material_id'}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_indexed_backend():
+    """
+    Checks whether current database backend has a full-text index.
+    :return: True for SQLite and PostgreSQL.
+    """
+    return connection.vendor in _KEY_COLUMN
+
+
+def _reindex(where, params):
+    """
+    Replaces index rows of materials selected by the where clause.
+    :param where: SQL condition on ``m`` (letslearn_trainingmaterials) alias.
+    :param params: parameters of the where clause.
+    """
+    if not is_indexed_backend():
+        return
+    key = _KEY_COLUMN[connection.vendor]
+    insert_sql = _SQLITE_INSERT_SQL if connection.vendor == 'sqlite' else _POSTGRES_INSERT_SQL
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE {key} IN (SELECT m.id {_SOURCE_SQL} WHERE {where})',
+                       params)
+        cursor.execute(f'{insert_sql} WHERE {where}', params)
+
+
+def index_material(material_id):
+    """ Adds or refreshes index entry of one training material. """
+    _reindex('m.id = %s', [material_id])
+
+
+def index_materials(material_ids):
+    """ Adds or refreshes index entries of many training materials, e.g. created with bulk_create. """
+    material_ids = [int(material_id) for material_id in material_ids]
+    # Chunks keep number of query parameters below SQLite limit.
+    for start in range(0, len(material_ids), 500):
+        chunk = material_ids[start:start + 500]
+        _reindex('m.id IN ({})'.format(', '.join(['%s'] * len(chunk))), chunk)
+
+
+def index_author_materials(author_id):
+    """ Refreshes index entries of materials written by the author (author name is indexed). """
+    _reindex('m.author_id = %s', [author_id])
+
+
+def index_platform_materials(platform_id):
+    """ Refreshes index entries of materials published on the platform (platform name is indexed). """
+    _reindex('m.platform_id = %s', [platform_id])
+
+
+def remove_material(material_id):
+    """ Removes index entry of deleted training material. """
+    if not is_indexed_backend():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE {_KEY_COLUMN[connection.vendor]} = %s', [material_id])
+
+
+def rebuild_index():
+    """ Drops all index entries and indexes every training material again. """
+    if not is_indexed_backend():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    _reindex('1 = 1', [])
+
+
+def _ranked_ids(user, tokens, limit, offset):
+    """
+    Selects ids of user's materials matching all tokens, best matches first.
+    :return: list of TrainingMaterials ids.
+    """
+    if connection.vendor == 'sqlite':
+        # Every token is quoted, so user input can't break FTS5 query syntax, and matched as a prefix.
+        match = ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+        sql = f"""
+            SELECT s.rowid FROM {SEARCH_TABLE} s
+            JOIN letslearn_usermaterial um ON um.material_id_id = s.rowid
+            WHERE {SEARCH_TABLE} MATCH %s AND um.user_id_id = %s
+            ORDER BY bm25({SEARCH_TABLE}), s.rowid
+            LIMIT %s OFFSET %s
+        """
+    else:
+        match = ' & '.join(f'{token}:*' for token in tokens)
+        sql = f"""
+            SELECT s.material_id FROM {SEARCH_TABLE} s
+            JOIN letslearn_usermaterial um ON um.material_id_id = s.material_id
+            WHERE s.document @@ to_tsquery('simple', %s) AND um.user_id_id = %s
+            ORDER BY ts_rank(s.document, to_tsquery('simple', %s)) DESC, s.material_id
+            LIMIT %s OFFSET %s
+        """
+    params = [match, user.id, limit, offset]
+    if connection.vendor == 'postgresql':
+        params.insert(2, match)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_materials(user, query, page_size, page=1):
+    """
+    Searches user's training materials by name, description, author and platform name
+    (and user's comment when there is no full-text index).
+    :param user: owner of searched materials.
+    :param query: text typed by the user.
+    :param page_size: number of results on a page.
+    :param page: number of the page, starting from 1.
+    :return: tuple of (list of TrainingMaterials ordered by rank, True if there is a next page).
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return [], False
+    offset = (page - 1) * page_size
+    if is_indexed_backend():
+        ids = _ranked_ids(user, tokens, page_size + 1, offset)
+        materials_by_id = TrainingMaterials.objects.select_related('author', 'platform').in_bulk(ids[:page_size])
+        materials = [materials_by_id[pk] for pk in ids[:page_size] if pk in materials_by_id]
+        return materials, len(ids) > page_size
+    queryset = TrainingMaterials.objects.for_user(user)
+    for token in tokens:
+        queryset = queryset.filter(Q(name__icontains=token) | Q(description__icontains=token)
+                                   | Q(comment__icontains=token) | Q(author__name__icontains=token)
+                                   | Q(platform__name__icontains=token))
+    materials = list(queryset.select_related('author', 'platform').order_by('name', 'id')
+                     [offset:offset + page_size + 1])
+    return materials[:page_size], len(materials) > page_size
@@ -0,0 +1,219 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver, Signal
+
+from . import autocomplete, cache, events, search, stats
+from .models import Author, Platform, TrainingMaterials, UserMaterial, Category, MaterialType
+
+# Sent after is_finished or is_archived of user's materials was changed with a queryset update of UserMaterial
+# (no post_save), with user_id, material_ids, field and value arguments.
+material_state_changed = Signal()
+
+_batch_deletion = ContextVar('letslearn_batch_deletion', default=False)
+
+
+@contextmanager
+def batch_deletion():
+    """
+    Materials and links deleted inside the block don't update study statistics and data versions row by row,
+    the caller updates them once for the whole batch.
+    """
+    token = _batch_deletion.set(True)
+    try:
+        yield
+    finally:
+        _batch_deletion.reset(token)
+
+
+@receiver(post_save, sender=TrainingMaterials)
+def index_saved_material(sender, instance, **kwargs):
+    """ Keeps full-text index entry of saved training material up to date. """
+    search.index_material(instance.id)
+
+
+@receiver(post_delete, sender=TrainingMaterials)
+def remove_deleted_material(sender, instance, **kwargs):
+    """ Removes deleted training material from full-text index. """
+    search.remove_material(instance.id)
+
+
+@receiver(post_save, sender=Author)
+def index_author_materials(sender, instance, created, **kwargs):
+    """ Author's name is indexed with his materials, so they are refreshed when it changes. """
+    if not created:
+        search.index_author_materials(instance.id)
+
+
+@receiver(post_save, sender=Platform)
+def index_platform_materials(sender, instance, created, **kwargs):
+    """ Platform's name is indexed with its materials, so they are refreshed when it changes. """
+    if not created:
+        search.index_platform_materials(instance.id)
+
+
+def _material_owners(material_ids):
+    return UserMaterial.objects.filter(material_id__in=material_ids).values_list('user_id', flat=True)
+
+
+@receiver(post_save, sender=TrainingMaterials)
+@receiver(post_delete, sender=TrainingMaterials)
+def invalidate_material_owners(sender, instance, **kwargs):
+    """ Bumps data version of every user connected to changed training material. """
+    if _batch_deletion.get():
+        return
+    cache.bump_versions(_material_owners([instance.id]))
+
+
+@receiver(material_state_changed)
+def invalidate_changed_materials(sender, user_id, **kwargs):
+    """ Bumps data version of user whose materials were finished, archived or restored with a queryset update. """
+    cache.bump_version(user_id)
+
+
+@receiver(post_save, sender=UserMaterial)
+@receiver(post_delete, sender=UserMaterial)
+def invalidate_user_materials(sender, instance, **kwargs):
+    """ Bumps data version of user who gained or lost a training material. """
+    if _batch_deletion.get():
+        return
+    cache.bump_version(instance.user_id_id)
+
+
+@receiver(m2m_changed, sender=TrainingMaterials.category.through)
+def invalidate_material_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Bumps data version of owners of materials whose categories changed. """
+    if not action.startswith('post_'):
+        return
+    if reverse and pk_set:
+        cache.bump_versions(_material_owners(pk_set))
+    elif reverse:
+        # Category's materials were cleared and pk_set isn't known.
+        cache.bump_version()
+    else:
+        cache.bump_versions(_material_owners([instance.id]))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Platform)
+@receiver(post_delete, sender=Platform)
+@receiver(post_save, sender=MaterialType)
+@receiver(post_delete, sender=MaterialType)
+def invalidate_reference_data(sender, instance, **kwargs):
+    """ Categories, authors, platforms and types are shared by all users, so global version is bumped. """
+    cache.bump_version()
+
+
+@receiver(pre_save, sender=TrainingMaterials)
+def remember_material_state(sender, instance, **kwargs):
+    """ Keeps state of edited material from before the save, needed to update study statistics. """
+    if instance.pk:
+        instance._statistics_old = (TrainingMaterials.objects.filter(pk=instance.pk)
+                                    .values(*stats.MATERIAL_FIELDS).first())
+
+
+@receiver(post_save, sender=TrainingMaterials)
+def update_material_statistics(sender, instance, created, **kwargs):
+    """ Moves contribution of edited material to its new state, new materials are counted when linked. """
+    old = instance.__dict__.pop('_statistics_old', None)
+    if not created and old is not None:
+        stats.material_updated(instance.id, old)
+
+
+@receiver(material_state_changed)
+def record_changed_materials_events(sender, user_id, material_ids, field, value, **kwargs):
+    """ Records progress events of materials finished, archived or restored with a queryset update. """
+    events.record(user_id, material_ids, field, value)
+
+
+@receiver(material_state_changed)
+def update_changed_materials_statistics(sender, user_id, material_ids, field, value, **kwargs):
+    """ Updates study statistics of materials finished, archived or restored with a queryset update. """
+    stats.materials_state_changed(user_id, material_ids, field, value)
+
+
+def _link_state(link):
+    return {name: getattr(link, name) for name in stats.STATE_FIELDS}
+
+
+@receiver(pre_save, sender=UserMaterial)
+def remember_link_state(sender, instance, **kwargs):
+    """ Keeps user's state of the material from before the save, needed to update study statistics. """
+    if instance.pk:
+        instance._statistics_old = (UserMaterial.objects.filter(pk=instance.pk)
+                                    .values(*stats.STATE_FIELDS).first())
+
+
+# Connected before add_material_statistics, which removes the remembered state.
+@receiver(post_save, sender=UserMaterial)
+def record_link_events(sender, instance, created, **kwargs):
+    """ Records progress events of user's state of the material changed by saving the link. """
+    old = getattr(instance, '_statistics_old', None)
+    if created or old is None:
+        return
+    for field, value in _link_state(instance).items():
+        if old[field] != value:
+            events.record(instance.user_id_id, [instance.material_id_id], field, value)
+
+
+@receiver(post_save, sender=UserMaterial)
+def add_material_statistics(sender, instance, created, **kwargs):
+    """ Adds material to study statistics of user who got it or moves it to user's new state of the material. """
+    old = instance.__dict__.pop('_statistics_old', None)
+    if created:
+        stats.material_linked(instance.user_id_id, instance.material_id_id, _link_state(instance))
+    elif old is not None:
+        stats.link_updated(instance.user_id_id, instance.material_id_id, old, _link_state(instance))
+
+
+@receiver(pre_delete, sender=UserMaterial)
+def remove_material_statistics(sender, instance, **kwargs):
+    """ Runs before delete, when categories of deleted material are still in the database. """
+    if _batch_deletion.get():
+        return
+    stats.material_linked(instance.user_id_id, instance.material_id_id, _link_state(instance), sign=-1)
+
+
+@receiver(m2m_changed, sender=TrainingMaterials.category.through)
+def update_category_statistics(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Moves materials between statistics of categories, ``reverse`` means instance is a Category. """
+    link = TrainingMaterials.category.through.objects
+    if action == 'pre_clear':
+        if reverse:
+            material_ids = list(link.filter(category_id=instance.id).values_list('trainingmaterials_id', flat=True))
+            stats.categories_changed(material_ids, [instance.id], -1)
+        else:
+            category_ids = list(link.filter(trainingmaterials_id=instance.id).values_list('category_id', flat=True))
+            stats.categories_changed([instance.id], category_ids, -1)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        sign = 1 if action == 'post_add' else -1
+        if reverse:
+            stats.categories_changed(list(pk_set), [instance.id], sign)
+        else:
+            stats.categories_changed([instance.id], list(pk_set), sign)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Platform)
+@receiver(post_save, sender=MaterialType)
+@receiver(post_save, sender=Category)
+def add_to_autocomplete(sender, instance, **kwargs):
+    """ Adds new or renamed object to autocomplete index after the transaction is committed. """
+    index = autocomplete.INDEXES_BY_MODEL[sender]
+    transaction.on_commit(lambda: index.add(instance.pk, instance.name))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Platform)
+@receiver(post_delete, sender=MaterialType)
+@receiver(post_delete, sender=Category)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    """ Removes deleted object from autocomplete index after the transaction is committed. """
+    index = autocomplete.INDEXES_BY_MODEL[sender]
+    pk = instance.pk
+    transaction.on_commit(lambda: index.remove(pk))
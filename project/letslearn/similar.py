@@ -0,0 +1,246 @@
+"""
+"Similar materials" recommendations.
+
+``build_similar_materials`` command turns name, description, categories and author of every training material
+into a TF-IDF vector (rows of a SciPy sparse matrix, normalized, so dot products are cosine similarities),
+multiplies batches of rows by the whole matrix and stores top ``SIMILAR_MATERIALS_TOP_K`` neighbours of every
+material in :model:`letslearn.SimilarMaterial`. Detail view reads them with one query, nothing is computed
+on request.
+
+An incremental build handles materials added since the previous build (ids above
+:model:`letslearn.SimilarityIndex` ``last_material_id``): their neighbours are computed against all materials
+and they are merged into neighbour lists of older materials which they beat. Weights are recomputed from all
+materials on every build, but lists of older materials are recomputed only by a full build (``--full``),
+which also picks up edited materials and materials restored from the archive tier.
+NumPy and SciPy are needed only by the build.
+"""
+import re
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+from .models import SimilarMaterial, SimilarityIndex, TrainingMaterials
+
+# Words of at least two letters, digits and punctuation are dropped.
+TOKEN_RE = re.compile(r'[^\W\d_]{2,}')
+NAME_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+CATEGORY_WEIGHT = 2.0
+AUTHOR_WEIGHT = 1.0
+# Terms used by more than this part of materials don't tell materials apart.
+MAX_DOCUMENT_FREQUENCY = 0.5
+# Neighbours with lower cosine similarity are not worth showing.
+MIN_SCORE = 0.05
+READ_CHUNK_SIZE = 2000
+WRITE_BATCH_SIZE = 1000
+
+
+def is_available():
+    """
+    :return: True if NumPy and SciPy needed by the build are installed.
+    """
+    return np is not None
+
+
+def similar_materials(material_id):
+    """
+    :param material_id: id of TrainingMaterials instance.
+    :return: queryset of precomputed SimilarMaterial instances of the material with ``similar`` material and its
+        author joined, best first.
+    """
+    return (SimilarMaterial.objects
+            .filter(material_id=material_id)
+            .select_related('similar__author')
+            .order_by('rank'))
+
+
+def get_similar(material_id):
+    """
+    Reads precomputed neighbours of the material with one query.
+    :param material_id: id of TrainingMaterials instance.
+    :return: list of SimilarMaterial instances, best first.
+    """
+    return list(similar_materials(material_id))
+
+
+def material_terms(name, description, author_id, category_ids):
+    """
+    :return: dictionary of term -> weighted count, categories and author are terms which can't clash with words.
+    """
+    terms = defaultdict(float)
+    for text, weight in ((name, NAME_WEIGHT), (description, DESCRIPTION_WEIGHT)):
+        for token in TOKEN_RE.findall((text or '').lower()):
+            terms[token] += weight
+    for category_id in category_ids:
+        terms[f'category:{category_id}'] += CATEGORY_WEIGHT
+    terms[f'author:{author_id}'] += AUTHOR_WEIGHT
+    return terms
+
+
+def load_documents():
+    """
+    Reads terms of all materials in chunks.
+    :return: tuple of (array of material ids in ascending order, list of term dictionaries).
+    """
+    categories = defaultdict(list)
+    for material_id, category_id in (TrainingMaterials.category.through.objects
+                                     .values_list('trainingmaterials_id', 'category_id')
+                                     .iterator(chunk_size=READ_CHUNK_SIZE)):
+        categories[material_id].append(category_id)
+    ids, documents = [], []
+    for material_id, name, description, author_id in (TrainingMaterials.objects
+                                                      .order_by('id')
+                                                      .values_list('id', 'name', 'description', 'author_id')
+                                                      .iterator(chunk_size=READ_CHUNK_SIZE)):
+        ids.append(material_id)
+        documents.append(material_terms(name, description, author_id, categories.get(material_id, ())))
+    return np.array(ids, dtype=np.int64), documents
+
+
+def tfidf_matrix(documents):
+    """
+    Builds TF-IDF vectors with sublinear term frequency. Terms of one material or of too many materials get
+    zero weight, rows are L2-normalized.
+    :param documents: list of term dictionaries.
+    :return: CSR matrix, one row per document.
+    """
+    vocabulary = {}
+    indptr, indices, data = [0], [], []
+    for terms in documents:
+        for term, weight in terms.items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            data.append(weight)
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix((np.array(data, dtype=np.float32), np.array(indices, dtype=np.int64), indptr),
+                               shape=(len(documents), len(vocabulary)))
+    count = len(documents)
+    document_frequency = np.bincount(matrix.indices, minlength=len(vocabulary))
+    idf = (np.log((1 + count) / (1 + document_frequency)) + 1).astype(np.float32)
+    idf[(document_frequency < 2) | (document_frequency > max(MAX_DOCUMENT_FREQUENCY * count, 2))] = 0
+    matrix.data = (1 + np.log(matrix.data)) * idf[matrix.indices]
+    matrix.eliminate_zeros()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags(1 / norms) @ matrix).tocsr()
+
+
+def top_neighbours(matrix, rows, top_k):
+    """
+    Computes cosine similarities of a batch of rows with all rows in one sparse product and takes
+    top ``top_k`` of every row, the row itself excluded.
+    :param matrix: normalized CSR matrix from tfidf_matrix.
+    :param rows: array of indexes of rows in the batch.
+    :param top_k: number of neighbours.
+    :return: list of (array of neighbour indexes, array of scores) tuples, best first, one per row of the batch.
+    """
+    scores = (matrix[rows] @ matrix.T).tocsr()
+    result = []
+    for position, row in enumerate(rows):
+        start, end = scores.indptr[position], scores.indptr[position + 1]
+        columns, values = scores.indices[start:end], scores.data[start:end]
+        keep = (columns != row) & (values >= MIN_SCORE)
+        columns, values = columns[keep], values[keep]
+        if len(values) > top_k:
+            best = np.argpartition(-values, top_k)[:top_k]
+            columns, values = columns[best], values[best]
+        # Ties are broken by lower index (older material), so builds are repeatable.
+        order = np.lexsort((columns, -values))
+        result.append((columns[order], values[order]))
+    return result
+
+
+def write_neighbours(neighbours):
+    """
+    Replaces stored neighbours of materials in one transaction. Materials deleted during the build are skipped.
+    :param neighbours: dictionary of material id -> list of (similar material id, score), best first.
+    """
+    referenced = set(neighbours) | {similar_id for pairs in neighbours.values() for similar_id, _ in pairs}
+    existing = set(TrainingMaterials.objects.filter(id__in=referenced).values_list('id', flat=True))
+    rows = []
+    for material_id, pairs in neighbours.items():
+        if material_id not in existing:
+            continue
+        pairs = [(similar_id, score) for similar_id, score in pairs if similar_id in existing]
+        rows.extend(SimilarMaterial(material_id=material_id, similar_id=similar_id, rank=rank, score=score)
+                    for rank, (similar_id, score) in enumerate(pairs))
+    with transaction.atomic():
+        SimilarMaterial.objects.filter(material_id__in=list(neighbours)).delete()
+        SimilarMaterial.objects.bulk_create(rows, batch_size=WRITE_BATCH_SIZE)
+
+
+def merge_into_older(ids, matrix, rows, new_rows, top_k):
+    """
+    Adds new materials to neighbour lists of older materials which they beat.
+    :param ids: array of material ids, index of a row -> material id.
+    :param matrix: normalized CSR matrix from tfidf_matrix.
+    :param rows: array of indexes of new rows in this batch.
+    :param new_rows: set of indexes of all new rows, their lists are computed directly.
+    :param top_k: number of neighbours.
+    :return: number of changed neighbour lists.
+    """
+    scores = (matrix @ matrix[rows].T).tocsr()
+    candidates = {}
+    for row in np.flatnonzero(np.diff(scores.indptr)):
+        if row in new_rows:
+            continue
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        pairs = [(int(ids[rows[column]]), float(value))
+                 for column, value in zip(scores.indices[start:end], scores.data[start:end]) if value >= MIN_SCORE]
+        if pairs:
+            candidates[int(ids[row])] = pairs
+    current = defaultdict(list)
+    material_ids = list(candidates)
+    for start in range(0, len(material_ids), WRITE_BATCH_SIZE):
+        for material_id, similar_id, score in (SimilarMaterial.objects
+                                               .filter(material_id__in=material_ids[start:start + WRITE_BATCH_SIZE])
+                                               .order_by('material_id', 'rank')
+                                               .values_list('material_id', 'similar_id', 'score')):
+            current[material_id].append((similar_id, score))
+    changed = {}
+    for material_id, pairs in candidates.items():
+        merged = dict(current[material_id])
+        merged.update(pairs)
+        best = sorted(merged.items(), key=lambda pair: (-pair[1], pair[0]))[:top_k]
+        if best != current[material_id]:
+            changed[material_id] = best
+    if changed:
+        write_neighbours(changed)
+    return len(changed)
+
+
+def build(top_k, batch_size, full=False, progress=None):
+    """
+    Computes and stores neighbours of all materials (full build) or of materials added since the previous
+    build. Every batch is written in its own transaction.
+    :param top_k: number of neighbours of a material.
+    :param batch_size: number of materials whose similarities are computed with one matrix product.
+    :param full: recompute all neighbour lists, also done when there was no build yet or top_k changed.
+    :param progress: optional callable called with (processed materials, all materials to process).
+    :return: tuple of (True if the build was full, number of materials processed).
+    """
+    ids, documents = load_documents()
+    index = SimilarityIndex.objects.filter(id=1).first()
+    full = full or index is None or index.top_k != top_k
+    if not len(ids):
+        return full, 0
+    matrix = tfidf_matrix(documents)
+    targets = np.arange(len(ids)) if full else np.flatnonzero(ids > index.last_material_id)
+    new_rows = set() if full else set(targets.tolist())
+    for start in range(0, len(targets), batch_size):
+        rows = targets[start:start + batch_size]
+        write_neighbours({int(ids[row]): [(int(ids[column]), float(score)) for column, score in zip(*neighbours)]
+                          for row, neighbours in zip(rows, top_neighbours(matrix, rows, top_k))})
+        if not full:
+            merge_into_older(ids, matrix, rows, new_rows, top_k)
+        if progress:
+            progress(start + len(rows), len(targets))
+    SimilarityIndex.objects.update_or_create(id=1, defaults={'built_at': timezone.now(),
+                                                             'last_material_id': int(ids[-1]), 'top_k': top_k})
+    return full, len(targets)
@@ -18,4 +18,66 @@ function filterFunction() {
       a[i].style.display = "none";
     }
   }
-}
\ No newline at end of file
+}
+
+/* Autocomplete inputs rendered by AutocompleteWidget: suggestions are fetched from the server,
+chosen objects are kept as hidden inputs with their ids. */
+function addAutocompleteChoice(container, id, label) {
+  var selected = container.querySelector(".autocomplete-selected");
+  if (container.dataset.multiple !== "true") {
+    selected.innerHTML = "";
+  }
+  if (selected.querySelector('input[value="' + id + '"]')) {
+    return;
+  }
+  var badge = document.createElement("span");
+  badge.className = "badge bg-secondary me-1";
+  badge.title = "click to remove";
+  badge.textContent = label;
+  var hidden = document.createElement("input");
+  hidden.type = "hidden";
+  hidden.name = container.dataset.name;
+  hidden.value = id;
+  badge.appendChild(hidden);
+  selected.appendChild(badge);
+}
+
+function initAutocomplete(container) {
+  var input = container.querySelector("input[type=text]");
+  var datalist = container.querySelector("datalist");
+  var timer = null;
+  container.querySelector(".autocomplete-selected").addEventListener("click", function (event) {
+    if (event.target.classList.contains("badge")) {
+      event.target.remove();
+    }
+  });
+  input.addEventListener("input", function () {
+    var option = datalist.querySelector('option[value="' + CSS.escape(input.value) + '"]');
+    if (option) {
+      addAutocompleteChoice(container, option.dataset.id, option.value);
+      input.value = "";
+      return;
+    }
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+      if (!input.value) {
+        return;
+      }
+      fetch(container.dataset.url + "?q=" + encodeURIComponent(input.value))
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+          datalist.innerHTML = "";
+          data.results.forEach(function (result) {
+            var option = document.createElement("option");
+            option.value = result.text;
+            option.dataset.id = result.id;
+            datalist.appendChild(option);
+          });
+        });
+    }, 200);
+  });
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+  document.querySelectorAll(".autocomplete").forEach(initAutocomplete);
+});
@@ -0,0 +1,62 @@
+"""
+Fingerprinted and precompressed static files.
+
+``collectstatic`` with :class:`CompressedManifestStaticFilesStorage` copies files to STATIC_ROOT, adds content
+hashes to their names (``app.3f2a9c1b7e4d.js``) and writes ``.gz`` and ``.br`` variants of compressible files
+next to them. Brotli variants are written only if the ``brotli`` package is installed.
+:class:`letslearn.middleware.PrecompressedStaticMiddleware` serves the best variant accepted by the browser.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml', '.ico')
+# Variants smaller than this part of the original are not worth a separate file.
+MIN_COMPRESSION_RATIO = 0.95
+# Content-Encoding -> file suffix, in order of preference.
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+
+def compress(content):
+    """
+    :param content: bytes of a static file.
+    :return: dictionary of Content-Encoding -> compressed bytes, only encodings which make the file smaller.
+    """
+    variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content, quality=11)
+    return {encoding: data for encoding, data in variants.items()
+            if len(data) < len(content) * MIN_COMPRESSION_RATIO}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ Manifest storage which also writes gzip and brotli variants of hashed files. """
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            if not name.endswith(COMPRESSED_EXTENSIONS):
+                continue
+            with self.open(name) as original:
+                content = original.read()
+            for encoding, data in compress(content).items():
+                path = self.path(name) + ENCODINGS[encoding]
+                with open(path, 'wb') as variant:
+                    variant.write(data)
+                os.utime(path, (os.path.getmtime(self.path(name)),) * 2)
+
+    def is_hashed(self, name):
+        """
+        :param name: name of a file in STATIC_ROOT.
+        :return: True if the name contains content hash, so the file never changes.
+        """
+        if not hasattr(self, '_hashed_names'):
+            self._hashed_names = set(self.hashed_files.values())
+        return name in self._hashed_names
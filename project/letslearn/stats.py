@@ -0,0 +1,241 @@
+"""
+Incremental maintenance of :model:`letslearn.StudyStatistics`.
+
+Every change of materials or of users' state of materials is turned into deltas of counters keyed by (user id, category id, platform id),
+totals use (user id, None, None). Deltas of one event are summed in memory and written with one
+``UPDATE ... SET x = x + delta`` per affected row. Changes made without signals (bulk_create, raw SQL)
+are repaired with ``rebuild_statistics`` command.
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum, F, Q, Value
+from django.db.models.functions import Coalesce
+
+from . import archive
+from .models import StudyStatistics, TrainingMaterials, UserMaterial
+
+COUNTERS = ('materials', 'finished', 'archived', 'study_time', 'finished_study_time')
+MATERIAL_FIELDS = ('id', 'platform_id', 'expected_study_time')
+STATE_FIELDS = ('is_finished', 'is_archived')
+
+
+def contribution(material, state):
+    """
+    Computes counters of one material of one user.
+    :param material: dictionary with MATERIAL_FIELDS keys.
+    :param state: dictionary with STATE_FIELDS keys, user's state of the material.
+    :return: Counter with COUNTERS keys.
+    """
+    if state['is_archived']:
+        return Counter(archived=1)
+    study_time = material['expected_study_time'] or 0
+    if state['is_finished']:
+        return Counter(materials=1, finished=1, study_time=study_time, finished_study_time=study_time)
+    return Counter(materials=1, study_time=study_time)
+
+
+def _add(deltas, owners, keys, material, sign):
+    """
+    :param owners: list of (user id, state) tuples.
+    """
+    for user_id, state in owners:
+        values = contribution(material, state)
+        for name in values:
+            values[name] *= sign
+        for category_id, platform_id in keys:
+            deltas[(user_id, category_id, platform_id)].update(values)
+
+
+def _material_keys(material, category_ids):
+    return [(None, None), (None, material['platform_id'])] + [(category_id, None) for category_id in category_ids]
+
+
+def _load(material_ids, user_id=None):
+    """
+    Loads data needed to compute deltas of materials.
+    :param user_id: if given, only links of this user are loaded.
+    :return: tuple of (materials by id, list of (owner id, state) by material id, category ids by material id).
+    """
+    materials = {row['id']: row for row in TrainingMaterials.objects.filter(id__in=material_ids)
+                 .values(*MATERIAL_FIELDS)}
+    links = UserMaterial.objects.filter(material_id__in=material_ids)
+    if user_id is not None:
+        links = links.filter(user_id=user_id)
+    owners = defaultdict(list)
+    for row in links.values('material_id', 'user_id', *STATE_FIELDS):
+        owners[row['material_id']].append((row['user_id'], {name: row[name] for name in STATE_FIELDS}))
+    categories = defaultdict(list)
+    for material_id, category_id in (TrainingMaterials.category.through.objects
+                                     .filter(trainingmaterials_id__in=material_ids)
+                                     .values_list('trainingmaterials_id', 'category_id')):
+        categories[material_id].append(category_id)
+    return materials, owners, categories
+
+
+def apply_deltas(deltas):
+    """
+    Writes summed deltas to StudyStatistics, missing rows are created. When a concurrent transaction creates
+    the same row first, unique constraints reject the second insert and its deltas are added with UPDATE.
+    :param deltas: dictionary of (user id, category id, platform id) -> Counter.
+    """
+    for (user_id, category_id, platform_id), values in deltas.items():
+        values = {name: value for name, value in values.items() if value}
+        if not values:
+            continue
+        rows = StudyStatistics.objects.filter(user_id=user_id, category_id=category_id, platform_id=platform_id)
+        increments = {name: F(name) + value for name, value in values.items()}
+        if rows.update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                StudyStatistics.objects.create(user_id=user_id, category_id=category_id, platform_id=platform_id,
+                                               **values)
+        except IntegrityError:
+            rows.update(**increments)
+
+
+def material_linked(user_id, material_id, state, sign=1):
+    """
+    Adds (sign=1) or removes (sign=-1) material to/from statistics of the user.
+    :param user_id: id of the user who got or lost the material.
+    :param material_id: id of TrainingMaterials instance.
+    :param state: dictionary with STATE_FIELDS keys, user's state of the material.
+    :param sign: 1 when material was linked with the user, -1 when link is about to be deleted.
+    """
+    materials, _, categories = _load([material_id], user_id)
+    if material_id not in materials:
+        return
+    deltas = defaultdict(Counter)
+    material = materials[material_id]
+    _add(deltas, [(user_id, state)], _material_keys(material, categories[material_id]), material, sign)
+    apply_deltas(deltas)
+
+
+def link_updated(user_id, material_id, old_state, new_state):
+    """
+    Moves material's contribution from user's old state of the material to the new one.
+    :param user_id: id of the user.
+    :param material_id: id of TrainingMaterials instance.
+    :param old_state: dictionary with STATE_FIELDS keys, state before the change.
+    :param new_state: dictionary with STATE_FIELDS keys, state after the change.
+    """
+    if old_state == new_state:
+        return
+    materials, _, categories = _load([material_id], user_id)
+    if material_id not in materials:
+        return
+    deltas = defaultdict(Counter)
+    material = materials[material_id]
+    keys = _material_keys(material, categories[material_id])
+    _add(deltas, [(user_id, old_state)], keys, material, -1)
+    _add(deltas, [(user_id, new_state)], keys, material, 1)
+    apply_deltas(deltas)
+
+
+def material_updated(material_id, old):
+    """
+    Moves material's contribution from its old state to the current one for all its owners.
+    :param material_id: id of saved TrainingMaterials instance.
+    :param old: dictionary with MATERIAL_FIELDS keys describing material before the change.
+    """
+    materials, owners, categories = _load([material_id])
+    if material_id not in materials or not owners[material_id]:
+        return
+    deltas = defaultdict(Counter)
+    _add(deltas, owners[material_id], _material_keys(old, categories[material_id]), old, -1)
+    new = materials[material_id]
+    _add(deltas, owners[material_id], _material_keys(new, categories[material_id]), new, 1)
+    apply_deltas(deltas)
+
+
+def materials_state_changed(user_id, material_ids, field, value):
+    """
+    Updates statistics after is_finished or is_archived of user's materials was set with a queryset update.
+    :param user_id: id of the user whose links were changed.
+    :param material_ids: ids of changed materials.
+    :param field: changed field.
+    :param value: new value of the field, all materials had the opposite value before the change.
+    """
+    materials, owners, categories = _load(material_ids, user_id)
+    deltas = defaultdict(Counter)
+    for material_id, material in materials.items():
+        keys = _material_keys(material, categories[material_id])
+        new = owners[material_id]
+        _add(deltas, [(owner_id, {**state, field: not value}) for owner_id, state in new], keys, material, -1)
+        _add(deltas, new, keys, material, 1)
+    apply_deltas(deltas)
+
+
+def materials_deleted(material_ids):
+    """
+    Removes materials about to be deleted from statistics of all their owners, with one load for all of them.
+    :param material_ids: ids of TrainingMaterials instances.
+    """
+    materials, owners, categories = _load(material_ids)
+    deltas = defaultdict(Counter)
+    for material_id, material in materials.items():
+        _add(deltas, owners[material_id], _material_keys(material, categories[material_id]), material, -1)
+    apply_deltas(deltas)
+
+
+def categories_changed(material_ids, category_ids, sign):
+    """
+    Adds (sign=1) or removes (sign=-1) materials to/from statistics of categories.
+    :param material_ids: ids of materials whose categories changed.
+    :param category_ids: ids of added or removed categories.
+    """
+    materials, owners, _ = _load(material_ids)
+    deltas = defaultdict(Counter)
+    keys = [(category_id, None) for category_id in category_ids]
+    for material_id, material in materials.items():
+        _add(deltas, owners[material_id], keys, material, sign)
+    apply_deltas(deltas)
+
+
+def rebuild(user_ids=None):
+    """
+    Recomputes statistics from materials with aggregate queries and links in the archive tier,
+    repairs drift of incremental updates.
+    :param user_ids: ids of users to rebuild, all users if None.
+    :return: number of written rows.
+    """
+    links = UserMaterial.objects.all()
+    rows = StudyStatistics.objects.all()
+    if user_ids is not None:
+        links = links.filter(user_id__in=user_ids)
+        rows = rows.filter(user_id__in=user_ids)
+    active = Q(is_archived=False)
+    finished = active & Q(is_finished=True)
+    study_time = Coalesce('material_id__expected_study_time', Value(0))
+    aggregates = {
+        'materials': Count('id', filter=active),
+        'finished': Count('id', filter=finished),
+        'archived': Count('id', filter=Q(is_archived=True)),
+        'study_time': Coalesce(Sum(study_time, filter=active), Value(0)),
+        'finished_study_time': Coalesce(Sum(study_time, filter=finished), Value(0)),
+    }
+    statistics = []
+    for group, key in (((), lambda row: (None, None)),
+                       (('material_id__platform_id',), lambda row: (None, row['material_id__platform_id'])),
+                       (('material_id__category',), lambda row: (row['material_id__category'], None))):
+        queryset = links
+        if group == ('material_id__category',):
+            queryset = queryset.filter(material_id__category__isnull=False)
+        queryset = queryset.values('user_id', *group).order_by().annotate(**aggregates)
+        for row in queryset.iterator():
+            category_id, platform_id = key(row)
+            statistics.append(StudyStatistics(user_id=row['user_id'], category_id=category_id,
+                                              platform_id=platform_id,
+                                              **{name: row[name] for name in COUNTERS}))
+    # Links in the archive tier are counted only in totals.
+    totals = {row.user_id: row for row in statistics if row.category_id is None and row.platform_id is None}
+    for user_id, count in archive.archived_counts(user_ids).items():
+        if user_id not in totals:
+            totals[user_id] = StudyStatistics(user_id=user_id, category_id=None, platform_id=None)
+            statistics.append(totals[user_id])
+        totals[user_id].archived += count
+    with transaction.atomic():
+        rows.delete()
+        StudyStatistics.objects.bulk_create(statistics, batch_size=1000)
+    return len(statistics)
@@ -1,7 +1,10 @@
 import pytest
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import Client
+from letslearn import events, replicas
+from letslearn.middleware import request_measured
 from letslearn.models import Platform, Category, Author, MaterialType, TrainingMaterials, UserMaterial
 
 @pytest.fixture
@@ -31,7 +34,7 @@ def material_type():
 
 @pytest.fixture
 def material(author, material_type, platform):
-    return TrainingMaterials.objects.create(name='material_name', is_time_limited=False, is_finished=False, author_id=author.id, material_type_id=material_type.id, platform_id=platform.id)
+    return TrainingMaterials.objects.create(name='material_name', is_time_limited=False, author_id=author.id, material_type_id=material_type.id, platform_id=platform.id)
 
 
 @pytest.fixture
@@ -50,3 +53,53 @@ def test_user2():
     user = User.objects.create_user(username='user01', password='rQw_PQssw0rd')
     return user
 
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """ Cached data must not leak between tests, database ids are reused after rollback. """
+    cache.clear()
+    replicas.forget_health()
+    yield
+    cache.clear()
+    replicas.forget_health()
+
+
+@pytest.fixture(autouse=True)
+def clear_progress_events():
+    """ Buffered progress events must not be written to the database of another test. """
+    yield
+    events.buffer.clear()
+
+
+@pytest.fixture(autouse=True)
+def query_budget(request, settings):
+    """
+    Fails the test if a view requested through the test client runs more SQL queries than its budget.
+    Budgets of GET requests are read from QUERY_BUDGETS setting (keyed by URL name).
+    Budgets of requests with any method can be set with marker:
+        @pytest.mark.query_budget(material_list=3) - budget of one view,
+        @pytest.mark.query_budget(3) - budget of every view requested in the test.
+    :return: list of measured requests as (url_name, number of queries, budget) tuples.
+    """
+    get_budgets = dict(getattr(settings, 'QUERY_BUDGETS', {}))
+    budgets = {}
+    default = None
+    marker = request.node.get_closest_marker('query_budget')
+    if marker:
+        default = marker.args[0] if marker.args else None
+        budgets.update(marker.kwargs)
+        get_budgets.update(marker.kwargs)
+    measured = []
+
+    def record(sender, method, url_name, queries, **kwargs):
+        budget = (get_budgets if method == 'GET' else budgets).get(url_name, default)
+        measured.append((url_name, queries, budget))
+
+    request_measured.connect(record, dispatch_uid='query_budget')
+    yield measured
+    request_measured.disconnect(dispatch_uid='query_budget')
+    exceeded = [f'{url_name}: {queries} queries (budget {budget})'
+                for url_name, queries, budget in measured if budget is not None and queries > budget]
+    if exceeded:
+        pytest.fail('Query budget exceeded: ' + ', '.join(exceeded))
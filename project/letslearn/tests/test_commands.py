@@ -0,0 +1,608 @@
+import json
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+import pytest
+from django.contrib.admin import site
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from letslearn import cache as cache_versions, deletion, replicas
+from letslearn.linkcheck import LinkChecker, normalize_url
+from letslearn.models import (TrainingMaterials, UserMaterial, Notification, LinkCheck, Platform, StudyStatistics,
+                              ReplicaHeartbeat, ReplicaHealth, ArchivedLink, ArchivedMaterial, Author, SimilarMaterial,
+                              DataVersion)
+
+
+@pytest.mark.django_db
+def test_explain_queries(test_user, user_material):
+    """
+    Tests explain_queries command.
+    :param test_user: fixture test_user
+    :param user_material: fixture user_material
+    :return: query plan is printed for every explained query.
+    """
+    out = StringIO()
+    call_command('explain_queries', stdout=out)
+    output = out.getvalue()
+    for name in ('material list', 'materials near expiration', 'material detail', 'expiring materials'):
+        assert name in output
+
+
+@pytest.mark.django_db
+def test_explain_queries_without_user():
+    """
+    Tests explain_queries command on empty database.
+    :return: CommandError is raised.
+    """
+    with pytest.raises(CommandError):
+        call_command('explain_queries')
+
+
+@pytest.mark.django_db
+def test_import_materials(tmp_path, test_user, test_user2, author):
+    """
+    Tests import_materials command with CSV and NDJSON input.
+    :param tmp_path: pytest fixture with temporary directory
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :param author: fixture author
+    :return: seven tests:
+        - all CSV records are imported and connected to the user
+        - existing author is reused and missing categories are created
+        - NDJSON records before --offset are skipped
+        - invalid record raises CommandError
+        - record of an author being deleted raises CommandError which says so
+        - invalid date raises CommandError with the resume offset instead of a database error
+        - material in the archive tier is brought back and linked, not inserted again
+    """
+    csv_file = tmp_path / 'materials.csv'
+    csv_file.write_text(
+        'name,description,www,author,platform,material_type,categories,is_time_limited,expiration_date,is_finished\n'
+        f'Course 1,desc,http://a.pl,{author.name},Udemy,video,python;django,true,2030-01-01,false\n'
+        'Course 2,desc,http://b.pl,New author,Udemy,book,python,false,,true\n'
+    )
+    call_command('import_materials', str(csv_file), user=test_user.username, chunk_size=1, stdout=StringIO())
+    materials = TrainingMaterials.objects.for_user(test_user).order_by('name')
+    assert [m.name for m in materials] == ['Course 1', 'Course 2']
+    assert materials[0].author == author
+    assert sorted(c.name for c in materials[0].category.all()) == ['django', 'python']
+    assert materials[1].is_finished and not materials[1].is_time_limited
+
+    ndjson_file = tmp_path / 'materials.ndjson'
+    ndjson_file.write_text('\n'.join(json.dumps({'name': f'Course {i}', 'author': 'A', 'platform': 'P',
+                                                 'material_type': 'T', 'categories': ['go']}) for i in range(3, 6)))
+    call_command('import_materials', str(ndjson_file), user=test_user.username, offset=1, stdout=StringIO())
+    assert set(TrainingMaterials.objects.values_list('name', flat=True)) == {'Course 1', 'Course 2', 'Course 4',
+                                                                             'Course 5'}
+    ndjson_file.write_text(json.dumps({'name': 'No author'}))
+    with pytest.raises(CommandError):
+        call_command('import_materials', str(ndjson_file), user=test_user.username, stdout=StringIO())
+    Author.objects.filter(name='A').update(deleting_at=timezone.now())
+    ndjson_file.write_text(json.dumps({'name': 'Course 6', 'author': 'A', 'platform': 'P', 'material_type': 'T'}))
+    with pytest.raises(CommandError, match='author "A" is being deleted'):
+        call_command('import_materials', str(ndjson_file), user=test_user.username, stdout=StringIO())
+    assert not TrainingMaterials.objects.filter(name='Course 6').exists()
+    ndjson_file.write_text(json.dumps({'name': 'Course 7', 'author': 'B', 'platform': 'P', 'material_type': 'T',
+                                       'expiration_date': '2030-02-30'}))
+    with pytest.raises(CommandError, match='resume with --offset 0'):
+        call_command('import_materials', str(ndjson_file), user=test_user.username, stdout=StringIO())
+
+    course = TrainingMaterials.objects.get(name='Course 2')
+    UserMaterial.objects.filter(material_id=course).update(is_archived=True,
+                                                           archived_at=timezone.now() - timedelta(days=400))
+    call_command('archive_materials', stdout=StringIO())
+    assert ArchivedMaterial.objects.filter(id=course.id).exists()
+    csv_file.write_text('name,www,author,platform,material_type\n'
+                        'Course 2 again,https://www.b.pl/,New author,Udemy,book\n')
+    call_command('import_materials', str(csv_file), user=test_user2.username, stdout=StringIO())
+    restored = TrainingMaterials.objects.for_user(test_user2).values_list('id', 'name')
+    assert list(restored) == [(course.id, 'Course 2')]
+    assert not ArchivedMaterial.objects.exists()
+    assert ArchivedLink.objects.filter(user_id=test_user.id, material_id=course.id).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_asgi(tmp_path, test_user, user_material):
+    """
+    Tests benchmark_asgi command.
+    :param tmp_path: pytest fixture with temporary directory
+    :param test_user: fixture test_user
+    :param user_material: fixture user_material
+    :return: results of every mode are saved without errors.
+    """
+    output = tmp_path / 'results.json'
+    call_command('benchmark_asgi', user=test_user.username, requests=6, concurrency=2, output=str(output),
+                 stdout=StringIO())
+    results = json.loads(output.read_text())['results']
+    assert set(results) == {'wsgi_sync_views', 'asgi_sync_views', 'asgi_async_views'}
+    assert all(result['requests'] == 6 and result['errors'] == 0 for result in results.values())
+
+
+@pytest.mark.django_db
+def test_send_expiration_reminders(test_user, test_user2, author, material_type, platform, mailoutbox):
+    """
+    Tests send_expiration_reminders command.
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :param mailoutbox: pytest-django fixture with sent emails
+    :return: four tests:
+        - digest lists only unfinished, not archived materials expiring within the window
+        - user without expiring materials gets no digest
+        - digest is sent by email
+        - second run on the same day creates no new digests
+    """
+    test_user.email = 'user00@example.com'
+    test_user.save()
+    today = date(2030, 1, 1)
+    for name, days, is_finished, is_archived in (('soon', 3, False, False), ('later', 30, False, False),
+                                                  ('finished', 3, True, False), ('archived', 3, False, True)):
+        material = TrainingMaterials.objects.create(name=name, is_time_limited=True,
+                                                    author_id=author.id, material_type_id=material_type.id,
+                                                    platform_id=platform.id)
+        UserMaterial.objects.create(user_id=test_user, material_id=material,
+                                    expiration_date=today + timedelta(days=days),
+                                    is_finished=is_finished, is_archived=is_archived)
+    call_command('send_expiration_reminders', date=today, batch_size=1, email=True, stdout=StringIO())
+    notification = Notification.objects.get()
+    assert notification.user == test_user
+    assert 'soon' in notification.body
+    assert not any(name in notification.body for name in ('later', 'finished', 'archived'))
+    assert len(mailoutbox) == 1 and mailoutbox[0].to == [test_user.email]
+    call_command('send_expiration_reminders', date=today, stdout=StringIO())
+    assert Notification.objects.count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_generate_data_and_benchmark_views(tmp_path):
+    """
+    Tests generate_data and benchmark_views commands on a small dataset.
+    :param tmp_path: pytest fixture with temporary directory
+    :return: three tests:
+        - requested numbers of users and materials are generated, every material has an owner, a category
+          and a catalog key, data versions of users and reference data are bumped
+        - every benchmarked view answers without errors
+        - results are saved as JSON, revalidated pages are counted as 304
+    """
+    call_command('generate_data', users=3, materials=40, authors=5, platforms=2, categories=4, batch_size=15,
+                 stdout=StringIO())
+    assert User.objects.count() == 3
+    assert TrainingMaterials.objects.count() == 40
+    assert UserMaterial.objects.count() == 40
+    assert not TrainingMaterials.objects.filter(category=None).exists()
+    assert not TrainingMaterials.objects.filter(catalog_key=None).exists()
+    assert DataVersion.objects.filter(version__gt=1).count() == 4
+    output = tmp_path / 'results.json'
+    call_command('benchmark_views', requests=3, concurrency=1, conditional=True, output=str(output),
+                 stdout=StringIO())
+    results = json.loads(output.read_text())['results']
+    assert {'material_list', 'material_details', 'author_list', 'api_materials'} <= set(results)
+    assert all(result['errors'] == 0 for result in results.values())
+    assert results['material_list']['not_modified'] >= 1
+
+
+@pytest.mark.django_db
+def test_deduplicate_materials(test_user, test_user2, author, platform, material_type, category):
+    """
+    Tests deduplicate_materials command.
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :return: five tests:
+        - identical materials with differently spelled addresses are merged into the oldest one
+        - links are moved, user having both copies keeps state of the catalog entry
+        - categories of duplicates are merged
+        - materials on another platform or without address are not merged
+        - statistics are rebuilt and second run changes nothing
+    """
+    other_platform = Platform.objects.create(name='other', www='')
+    materials = [TrainingMaterials.objects.create(name=f'copy {i}', www=www, is_time_limited=False,
+                                                  expected_study_time=10, author=author, platform=material_platform,
+                                                  material_type=material_type)
+                 for i, (www, material_platform) in enumerate((('https://example.com/course', platform),
+                                                               ('http://www.example.com/course/', platform),
+                                                               ('example.com/course#intro', platform),
+                                                               ('example.com/course', other_platform),
+                                                               ('', platform),
+                                                               ('', platform)))]
+    materials[2].category.add(category)
+    UserMaterial.objects.create(user_id=test_user, material_id=materials[0])
+    UserMaterial.objects.create(user_id=test_user, material_id=materials[1], is_finished=True)
+    UserMaterial.objects.create(user_id=test_user2, material_id=materials[2], is_finished=True, comment='notes')
+    out = StringIO()
+    call_command('deduplicate_materials', batch_size=2, stdout=out)
+    assert 'Done, 2 duplicates merged.' in out.getvalue()
+    assert sorted(TrainingMaterials.objects.values_list('id', flat=True)) == sorted(
+        [materials[0].id, materials[3].id, materials[4].id, materials[5].id])
+    links = {link.user_id_id: link for link in UserMaterial.objects.all()}
+    assert len(links) == 2 and all(link.material_id_id == materials[0].id for link in links.values())
+    assert not links[test_user.id].is_finished
+    assert (links[test_user2.id].is_finished, links[test_user2.id].comment) == (True, 'notes')
+    assert list(materials[0].category.all()) == [category]
+    assert StudyStatistics.objects.get(user=test_user, category=None, platform=None).materials == 1
+    assert StudyStatistics.objects.get(user=test_user2, category=category).finished == 1
+    out = StringIO()
+    call_command('deduplicate_materials', stdout=out)
+    assert 'Done, 0 duplicates merged.' in out.getvalue()
+
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica', 'stale_replica'])
+def test_check_replicas(settings):
+    """
+    Tests check_replicas command with one up to date and one stale replica.
+    :param settings: pytest-django fixture with settings
+    :return: four tests:
+        - replica which sees the heartbeat stays in rotation
+        - replica without heartbeat or with old heartbeat is taken out of rotation
+        - marks are stored in the database, web processes see them after REPLICA_HEALTH_REFRESH seconds
+        - replica comes back after a successful check
+    """
+    settings.DATABASE_REPLICAS = ['replica', 'stale_replica']
+    out = StringIO()
+    call_command('check_replicas', stdout=out)
+    assert 'replica: healthy' in out.getvalue()
+    assert 'stale_replica: out of rotation, lag unknown, no heartbeat' in out.getvalue()
+    assert replicas.healthy_replicas() == ['replica']
+    # Web process which hasn't run the command, with an empty cache.
+    replicas.forget_health()
+    cache.clear()
+    assert replicas.healthy_replicas() == ['replica']
+    assert ReplicaHealth.objects.get(alias='stale_replica').error == 'no heartbeat'
+    # Mark written by another process is read after the refresh interval.
+    ReplicaHealth.objects.filter(alias='replica').update(down_until=timezone.now() + timedelta(minutes=1))
+    assert replicas.healthy_replicas() == ['replica']
+    settings.REPLICA_HEALTH_REFRESH = 0
+    replicas.forget_health()
+    assert replicas.healthy_replicas() == []
+    ReplicaHealth.objects.filter(alias='replica').update(down_until=timezone.now() - timedelta(seconds=1))
+    assert replicas.healthy_replicas() == ['replica']
+    ReplicaHeartbeat.objects.using('stale_replica').create(id=1, beat_at=timezone.now() - timedelta(minutes=5))
+    call_command('check_replicas', stdout=StringIO())
+    assert replicas.healthy_replicas() == ['replica']
+    call_command('check_replicas', max_lag=600, stdout=StringIO())
+    assert replicas.healthy_replicas() == ['replica', 'stale_replica']
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for material pages: /ok answers HEAD, /slow too after 0.1 s, /no-head only GET,
+    other paths are missing.
+    """
+    requests = []
+
+    def respond(self):
+        self.requests.append((self.command, self.path))
+        slow = self.path.startswith('/slow')
+        if slow:
+            time.sleep(0.1)
+        if self.path == '/ok' or slow or (self.path == '/no-head' and self.command == 'GET'):
+            status = 200
+        elif self.path == '/no-head':
+            status = 405
+        else:
+            status = 404
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_HEAD = do_GET = respond
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def link_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    StandInHandler.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.django_db
+def test_check_links(link_server, author, platform, material):
+    """
+    Tests check_links command against local HTTP server.
+    :param link_server: fixture with base URL of local server
+    :param author: fixture author
+    :param platform: fixture platform
+    :param material: fixture material
+    :return: every distinct URL is requested once, HEAD falls back to GET, results are stored
+        and recently checked URLs are skipped.
+    """
+    material.www = f'{link_server}/ok'
+    material.save()
+    author.www = f'{link_server}/ok'
+    author.save()
+    platform.www = f'{link_server}/no-head'
+    platform.save()
+    TrainingMaterials.objects.create(name='other', is_time_limited=False, author=author,
+                                     material_type=material.material_type, platform=platform,
+                                     www=f'{link_server}/missing')
+    out = StringIO()
+    call_command('check_links', stdout=out)
+    assert '3 links checked, 1 broken' in out.getvalue()
+    assert sorted(StandInHandler.requests) == [('GET', '/missing'), ('GET', '/no-head'), ('HEAD', '/missing'),
+                                               ('HEAD', '/no-head'), ('HEAD', '/ok')]
+    checks = {check.url: check for check in LinkCheck.objects.all()}
+    assert checks[f'{link_server}/ok'].status_code == 200
+    assert checks[f'{link_server}/no-head'].status_code == 200
+    assert checks[f'{link_server}/missing'].status_code == 404
+    assert not checks[f'{link_server}/missing'].is_alive
+    assert all(check.latency_ms is not None for check in checks.values())
+
+    StandInHandler.requests = []
+    out = StringIO()
+    call_command('check_links', stdout=out)
+    assert '0 links checked' in out.getvalue()
+    assert StandInHandler.requests == []
+    call_command('check_links', max_age=0, stdout=StringIO())
+    assert len(StandInHandler.requests) == 5
+
+
+def test_link_checker_host_limit(link_server):
+    """
+    Tests that URLs waiting for a busy host don't take connections of other hosts.
+    :param link_server: fixture with base URL of local server
+    :return: URL of another host is checked while URLs of the busy host are still waiting.
+    """
+    port = link_server.rsplit(':', 1)[1]
+    busy = [f'http://127.0.0.1:{port}/slow?{i}' for i in range(8)]
+    other = f'http://localhost:{port}/ok'
+    results = LinkChecker(max_connections=3, per_host=1, timeout=5).run(busy + [other])
+    assert all(result.status_code == 200 for result in results)
+    assert StandInHandler.requests.index(('HEAD', '/ok')) < 2
+
+
+def test_link_checker_normalized_urls(link_server):
+    """
+    Tests URLs with non-ASCII characters and different spellings of one address.
+    :param link_server: fixture with base URL of local server
+    :return: three tests:
+        - host is IDNA-encoded, path and query are percent-encoded, default port and fragment are dropped
+        - percent-encoded and raw spelling of the same URL are requested once, both get the result
+        - URL with invalid host is reported without request
+    """
+    assert normalize_url('HTTP://Bücher.example:80/kurs ä?q=a b#part') == \
+        'http://xn--bcher-kva.example/kurs%20%C3%A4?q=a%20b'
+    assert normalize_url('https://example.com:8443/a%20b') == 'https://example.com:8443/a%20b'
+    path = '/za%C5%BC%C3%B3%C5%82%C4%87?q=%C4%85'
+    urls = [f'{link_server}/zażółć?q=ą', f'{link_server}{path}', 'http://a..b/']
+    results = LinkChecker(timeout=5).run(urls)
+    assert [result.url for result in results] == urls
+    assert [result.status_code for result in results] == [404, 404, None]
+    assert results[2].error == 'invalid url'
+    assert StandInHandler.requests == [('HEAD', path), ('GET', path)]
+
+
+@pytest.mark.django_db
+def test_check_links_unreachable(author):
+    """
+    Tests check_links command with URL which refuses connections.
+    :param author: fixture author
+    :return: error is stored without status code.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    url = f'http://127.0.0.1:{server.server_address[1]}/'
+    server.server_close()
+    author.www = url
+    author.save()
+    call_command('check_links', timeout=2, stdout=StringIO())
+    check = LinkCheck.objects.get(url=url)
+    assert check.status_code is None and check.error
+
+
+@pytest.mark.django_db
+# Materials in the archive tier are read from archive tables too, it's not a regular page view.
+@pytest.mark.query_budget(material_details=None)
+def test_archive_materials(client, test_user, test_user2, author, platform, material_type, category):
+    """
+    Tests moving long archived materials to the archive tier and restoring them.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :return: seven tests:
+        - links archived before the cutoff are moved, recently archived and active ones stay
+        - material goes to the archive with its categories only when all its links were moved
+        - archived materials are counted in statistics, also after a rebuild, and exported
+        - detail view shows material in the archive tier read-only, without moving it
+        - archive and finish actions leave it in the archive tier
+        - restore action brings material back from the archive and unarchives it
+        - second run moves nothing
+    """
+    long_ago = timezone.now() - timedelta(days=400)
+    materials = [TrainingMaterials.objects.create(name=f'material {i}', www=f'https://example.com/{i}',
+                                                  is_time_limited=False, expected_study_time=5, author=author,
+                                                  platform=platform, material_type=material_type)
+                 for i in range(3)]
+    materials[0].category.add(category)
+    for user, material, archived_at in ((test_user, materials[0], long_ago), (test_user2, materials[0], long_ago),
+                                        (test_user, materials[1], long_ago), (test_user2, materials[1], None),
+                                        (test_user, materials[2], timezone.now())):
+        UserMaterial.objects.create(user_id=user, material_id=material, is_archived=archived_at is not None,
+                                    archived_at=archived_at, comment=f'{user.username} notes')
+    out = StringIO()
+    call_command('archive_materials', days=180, batch_size=2, stdout=out)
+    assert 'Done, 3 links and 1 materials moved to the archive.' in out.getvalue()
+    assert sorted(TrainingMaterials.objects.values_list('id', flat=True)) == [materials[1].id, materials[2].id]
+    assert UserMaterial.objects.count() == 2
+    assert ArchivedMaterial.objects.get().category_ids == [category.id]
+    assert ArchivedLink.objects.filter(user_id=test_user.id).count() == 2
+    assert not TrainingMaterials.category.through.objects.exists()
+    client.force_login(test_user)
+    assert client.get('/statistics/').context['total'].archived == 3
+    call_command('rebuild_statistics', stdout=StringIO())
+    assert client.get('/statistics/').context['total'].archived == 3
+    assert StudyStatistics.objects.get(user=test_user2, category=None, platform=None).archived == 1
+    content = b''.join(client.get('/materials/export/', {'format': 'ndjson'}).streaming_content)
+    rows = {row['name']: row for row in map(json.loads, content.decode().splitlines())}
+    assert set(rows) == {'material 0', 'material 1', 'material 2'}
+    assert rows['material 0']['categories'] == category.name
+    assert rows['material 0']['comment'] == f'{test_user.username} notes'
+    response = client.get(f'/materials/{materials[0].id}/')
+    assert response.context['material'].is_archived and response.context['in_archive_tier']
+    assert response.context['material'].comment == f'{test_user.username} notes'
+    assert response.context['category_names'] == [category.name]
+    assert 'check as finished' not in response.content.decode()
+    for action in ('archive', 'finished'):
+        client.post(f'/materials/{materials[0].id}/', {action: action})
+    assert ArchivedMaterial.objects.filter(id=materials[0].id).exists()
+    assert ArchivedLink.objects.filter(user_id=test_user.id, material_id=materials[0].id).exists()
+    response = client.post(f'/materials/{materials[0].id}/', {'restore': 'restore'})
+    assert not response.context['material'].is_archived
+    assert list(response.context['material'].category.all()) == [category]
+    assert not ArchivedMaterial.objects.exists()
+    assert ArchivedLink.objects.filter(user_id=test_user2.id, material_id=materials[0].id).exists()
+    response = client.post(f'/materials/{materials[1].id}/', {'restore': 'restore'})
+    assert not response.context['material'].is_archived
+    assert not ArchivedLink.objects.filter(user_id=test_user.id).exists()
+    total = StudyStatistics.objects.get(user=test_user, category=None, platform=None)
+    assert (total.materials, total.archived) == (2, 1)
+    out = StringIO()
+    call_command('archive_materials', stdout=out)
+    assert 'Done, 0 links and 0 materials moved to the archive.' in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_delete_pending(admin_client, client, test_user, test_user2, author, platform, material_type, category):
+    """
+    Tests background deletion of an author marked for deletion in the admin.
+    :param admin_client: pytest-django fixture with client logged in as superuser
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :return: eight tests:
+        - deletion in the admin only marks the author, the author is hidden and its name stays taken
+        - confirmation page counts materials of all selected authors with one query
+        - user without delete permission is told which permission is missing
+        - command deletes materials in batches and reports progress
+        - links, category links and archived materials of the author are deleted, other materials stay
+        - study statistics follow deleted materials
+        - second run has nothing to delete
+        - statistics and data versions of a batch are updated once, not for every deleted link
+    """
+    other_author = Author.objects.create(name='other author')
+    materials = [TrainingMaterials.objects.create(name=f'material {i}', www=f'https://example.com/{i}',
+                                                  is_time_limited=False, expected_study_time=5,
+                                                  author=other_author if i == 3 else author, platform=platform,
+                                                  material_type=material_type)
+                 for i in range(4)]
+    long_ago = timezone.now() - timedelta(days=400)
+    for material in materials:
+        material.category.add(category)
+        UserMaterial.objects.create(user_id=test_user, material_id=material, is_archived=material == materials[1],
+                                    archived_at=long_ago if material == materials[1] else None)
+    UserMaterial.objects.create(user_id=test_user2, material_id=materials[0], is_archived=True, archived_at=long_ago)
+    call_command('archive_materials', stdout=StringIO())
+    assert ArchivedMaterial.objects.filter(id=materials[1].id).exists()
+    response = admin_client.get(f'/admin/letslearn/author/{author.id}/delete/')
+    assert 'with 2 training materials, deleted in the background' in response.content.decode()
+    with CaptureQueriesContext(connection) as queries:
+        response = admin_client.post('/admin/letslearn/author/', {'action': 'delete_selected',
+                                                                  '_selected_action': [author.id, other_author.id]})
+    assert 'with 1 training materials, deleted in the background' in response.content.decode()
+    assert sum('letslearn_trainingmaterials' in query['sql'] for query in queries.captured_queries) == 1
+    request = RequestFactory().get('/')
+    request.user = test_user
+    assert site._registry[Author].get_deleted_objects([author], request)[2] == {'author'}
+    response = admin_client.post(f'/admin/letslearn/author/{author.id}/delete/', {'post': 'yes'})
+    assert response.status_code == 302
+    assert list(Author.objects.all()) == [other_author]
+    assert Author.all_objects.get(id=author.id).deleting_at is not None
+    assert TrainingMaterials.objects.count() == 3
+    client.force_login(test_user)
+    assert 'is being deleted' in client.post('/author/create/', {'name': author.name}).content.decode()
+    out = StringIO()
+    call_command('delete_pending', batch_size=1, stdout=out)
+    output = out.getvalue()
+    assert f'author "{author.name}": 2/3 materials deleted' in output
+    assert 'Done, 1 authors and platforms deleted.' in output
+    assert not Author.all_objects.filter(id=author.id).exists()
+    assert list(TrainingMaterials.objects.all()) == [materials[3]]
+    assert list(UserMaterial.objects.values_list('material_id', flat=True)) == [materials[3].id]
+    assert TrainingMaterials.category.through.objects.count() == 1
+    assert not ArchivedMaterial.objects.exists() and not ArchivedLink.objects.exists()
+    assert StudyStatistics.objects.get(user=test_user, category=None, platform=None).materials == 1
+    assert not StudyStatistics.objects.get(user=test_user2, category=None, platform=None).archived
+    out = StringIO()
+    call_command('delete_pending', stdout=out)
+    assert 'Done, 0 authors and platforms deleted.' in out.getvalue()
+    UserMaterial.objects.create(user_id=test_user2, material_id=materials[3])
+    versions = cache_versions.get_version(test_user.id), cache_versions.get_version(test_user2.id)
+    with CaptureQueriesContext(connection) as queries:
+        assert deletion.delete_batch(other_author, 10) == 1
+    assert sum(query['sql'].startswith('SELECT') and 'letslearn_trainingmaterials_category' in query['sql']
+               for query in queries.captured_queries) == 1
+    assert sum('UPDATE "letslearn_dataversion"' in query['sql'] for query in queries.captured_queries) == 1
+    assert cache_versions.get_version(test_user.id) > versions[0]
+    assert cache_versions.get_version(test_user2.id) > versions[1]
+    assert not StudyStatistics.objects.filter(materials__gt=0).exists()
+
+
+@pytest.mark.django_db
+def test_build_similar_materials(client, test_user, author, platform, material_type, category):
+    """
+    Tests precomputed similar materials.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :return: five tests:
+        - full build stores neighbours ranked by similarity, materials with nothing in common get none
+        - common category and author alone don't make materials similar
+        - incremental build processes only new materials and adds them to lists of older ones
+        - detail page shows similar materials
+        - similar materials of a deleted material are deleted
+    """
+    pytest.importorskip('scipy')
+    names = ['python django web', 'python django rest', 'python flask web', 'cooking pasta italian',
+             'cooking pizza italian', 'gardening roses']
+    materials = []
+    for i, name in enumerate(names):
+        material = TrainingMaterials.objects.create(name=name, description='', www=f'https://example.com/{i}',
+                                                    is_time_limited=False, expected_study_time=5, author=author,
+                                                    platform=platform, material_type=material_type)
+        material.category.add(category)
+        materials.append(material)
+    out = StringIO()
+    call_command('build_similar_materials', top_k=2, stdout=out)
+    assert 'Done, full build, 6 materials processed.' in out.getvalue()
+
+    def neighbours(material):
+        return list(SimilarMaterial.objects.filter(material=material).order_by('rank').values_list('similar_id',
+                                                                                                   flat=True))
+
+    assert neighbours(materials[0]) == [materials[1].id, materials[2].id]
+    assert neighbours(materials[3]) == [materials[4].id]
+    assert neighbours(materials[5]) == []
+    scores = list(SimilarMaterial.objects.filter(material=materials[1]).order_by('rank').values_list('score',
+                                                                                                     flat=True))
+    assert scores == sorted(scores, reverse=True) and 0 < scores[-1] <= scores[0] <= 1
+
+    new_material = TrainingMaterials.objects.create(name='django web tutorial', description='',
+                                                    www='https://example.com/new', is_time_limited=False,
+                                                    expected_study_time=5, author=author, platform=platform,
+                                                    material_type=material_type)
+    out = StringIO()
+    call_command('build_similar_materials', top_k=2, stdout=out)
+    assert 'Done, incremental build, 1 materials processed.' in out.getvalue()
+    assert neighbours(new_material)[0] == materials[0].id
+    assert new_material.id in neighbours(materials[0])
+    assert neighbours(materials[3]) == [materials[4].id]
+
+    UserMaterial.objects.create(user_id=test_user, material_id=materials[3])
+    client.force_login(test_user)
+    response = client.get(reverse('material_details', args=[materials[3].id]))
+    assert [item.similar for item in response.context['similar']] == [materials[4]]
+    assert f'href="{materials[4].www}"' in response.content.decode()
+    materials[4].delete()
+    assert neighbours(materials[3]) == []
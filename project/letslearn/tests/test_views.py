@@ -1,9 +1,32 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
 import random
+from collections import Counter
+from datetime import date, timedelta
+from unittest import mock
 
 import pytest
+from asgiref.sync import iscoroutinefunction
 from faker import Faker
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache as django_cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections
+from django.db.models import QuerySet
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from letslearn.models import TrainingMaterials, UserMaterial, Category, Platform, Author
+from django.utils import timezone
+from letslearn import events, replicas, stats
+from letslearn.staticfiles import brotli
+from letslearn.cache import get_stats
+from letslearn.models import (TrainingMaterials, UserMaterial, Category, Platform, Author, StudyStatistics,
+                              ProgressEvent)
 
 faker = Faker()
 
@@ -352,18 +375,14 @@ def test_create_material(client, test_user, author, material_type, platform, cat
         - New object in UserMaterial model with material exists.
     """
     new_name = faker.sentence(3)
-    expiration_date = faker.date()
     new_material = TrainingMaterials.objects.create(name= new_name,
                         description= faker.sentence(),
                         www= faker.url(),
                         is_time_limited= faker.boolean(),
-                        expiration_date= expiration_date,
-                        is_finished= faker.boolean(),
                         expected_study_time= random.randint(1,100),
                         author_id= author.id,
                         material_type_id= material_type.id,
-                        platform_id= platform.id,
-                        is_archived= faker.boolean())
+                        platform_id= platform.id)
     new_material.category.set([category.id])
     new_material_from_db = TrainingMaterials.objects.get(name=new_name)
     assert new_material_from_db
@@ -371,4 +390,786 @@ def test_create_material(client, test_user, author, material_type, platform, cat
 
 # >>> response = c.get("/redirect_me/", follow=True)
 # >>> response.redirect_chain
-# [('http://testserver/next/', 302), ('http://testserver/final/', 302)]
\ No newline at end of file
+# [('http://testserver/next/', 302), ('http://testserver/final/', 302)]
+
+@pytest.mark.django_db
+def test_material_list_filters_and_paginates(client, test_user, author, material_type, platform):
+    """
+    Tests training material list view with archived, time limited and paginated materials.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :return: four tests:
+        - archived material is not listed
+        - only material close to expiration date is in materials_near_end
+        - first page has requested size and cursor to the next page
+        - next page contains remaining materials
+    """
+    client.force_login(test_user)
+    materials = []
+    for i in range(12):
+        material = TrainingMaterials.objects.create(name=f'material_{i}', is_time_limited=i == 0,
+                                                    author_id=author.id, material_type_id=material_type.id,
+                                                    platform_id=platform.id)
+        UserMaterial.objects.create(user_id=test_user, material_id=material,
+                                    expiration_date=date.today() + timedelta(days=3), is_archived=i == 11)
+        materials.append(material)
+    response = client.get('/materials/list/', {'page_size': 10})
+    assert response.status_code == 200
+    assert [m.material_id for m in response.context['materials_near_end']] == [materials[0]]
+    assert [m.material_id for m in response.context['materials']] == materials[:10]
+    next_cursor = response.context['next_cursor']
+    assert next_cursor is not None
+    response2 = client.get('/materials/list/', {'page_size': 10, 'after': next_cursor})
+    assert [m.material_id for m in response2.context['materials']] == [materials[10]]
+    assert response2.context['next_cursor'] is None
+
+
+@pytest.mark.django_db
+def test_material_search(client, test_user, test_user2, author, material_type, platform):
+    """
+    Tests full-text search of training materials.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :return: three tests:
+        - material matching by name is found, other user's material is not
+        - material is found by renamed author's name
+        - deleted material is removed from results
+    """
+    client.force_login(test_user)
+    material = TrainingMaterials.objects.create(name='Django deployment', description='gunicorn and nginx',
+                                                is_time_limited=False, author_id=author.id,
+                                                material_type_id=material_type.id, platform_id=platform.id)
+    UserMaterial.objects.create(user_id=test_user, material_id=material)
+    other = TrainingMaterials.objects.create(name='Django basics', description='views',
+                                             is_time_limited=False, author_id=author.id,
+                                             material_type_id=material_type.id, platform_id=platform.id)
+    UserMaterial.objects.create(user_id=test_user2, material_id=other)
+    response = client.get('/materials/search/', {'q': 'djan'})
+    assert response.status_code == 200
+    assert response.context['materials'] == [material]
+    author.name = 'Guido'
+    author.save()
+    response = client.get('/materials/search/', {'q': 'guido'})
+    assert response.context['materials'] == [material]
+    material.delete()
+    response = client.get('/materials/search/', {'q': 'django'})
+    assert response.context['materials'] == []
+
+
+@pytest.mark.django_db
+def test_material_list_cache(client, test_user, material, user_material, category):
+    """
+    Tests per-user cache of training materials' list.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param material: fixture material
+    :param user_material: fixture user_material
+    :param category: fixture category
+    :return: four tests:
+        - first request misses the cache, second one hits it
+        - saving a material invalidates its owner's list
+        - changing material's categories invalidates the list
+        - hit and miss counts are reported
+    """
+    client.force_login(test_user)
+    assert client.get('/materials/list/')['X-Cache'] == 'MISS'
+    assert client.get('/materials/list/')['X-Cache'] == 'HIT'
+    material.name = 'renamed material'
+    material.save()
+    response = client.get('/materials/list/')
+    assert response['X-Cache'] == 'MISS'
+    assert 'renamed material' in response.content.decode()
+    material.category.add(category)
+    assert client.get('/materials/list/')['X-Cache'] == 'MISS'
+    assert get_stats('material_list') == {'hits': 1, 'misses': 3}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('export_format', ['csv', 'ndjson'])
+def test_material_export(client, test_user, test_user2, material, user_material, category, export_format):
+    """
+    Tests streaming export of training materials.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param material: fixture material
+    :param user_material: fixture user_material
+    :param category: fixture category
+    :param export_format: parameter with exported format
+    :return: three tests:
+        - response is streamed
+        - archived material of logged user is exported with its categories
+        - other user gets no rows
+    """
+    user_material.is_archived = True
+    user_material.save()
+    material.category.add(category)
+    client.force_login(test_user)
+    response = client.get('/materials/export/', {'format': export_format})
+    assert response.streaming
+    content = b''.join(response.streaming_content).decode()
+    if export_format == 'csv':
+        rows = list(csv.DictReader(io.StringIO(content)))
+    else:
+        rows = [json.loads(line) for line in content.splitlines()]
+    assert len(rows) == 1
+    assert rows[0]['name'] == material.name
+    assert rows[0]['categories'] == category.name
+    assert str(rows[0]['is_archived']) == 'True'
+    client.force_login(test_user2)
+    content = b''.join(client.get('/materials/export/', {'format': export_format}).streaming_content)
+    assert len(content.decode().splitlines()) == (1 if export_format == 'csv' else 0)
+
+
+@pytest.mark.django_db
+def test_material_api_conditional_get(client, test_user, material, user_material, category):
+    """
+    Tests JSON API of training materials with field selection and conditional GET.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param material: fixture material
+    :param user_material: fixture user_material
+    :param category: fixture category
+    :return: four tests:
+        - only requested fields are returned
+        - request with matching ETag gets 304 without material queries
+        - changed material gives new ETag
+        - unknown field gives 400
+    """
+    material.category.add(category)
+    client.force_login(test_user)
+    response = client.get('/api/materials/', {'fields': 'name,author,categories'})
+    assert response.status_code == 200
+    assert response.json() == {'results': [{'name': material.name, 'author': material.author.name,
+                                            'categories': [category.name]}],
+                               'next_cursor': None}
+    etag = response['ETag']
+    assert response['Last-Modified']
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/api/materials/', {'fields': 'name,author,categories'}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert [query['sql'] for query in queries.captured_queries if 'letslearn_' in query['sql']] == [
+        query['sql'] for query in queries.captured_queries if 'letslearn_dataversion' in query['sql']]
+    user_material.is_finished = True
+    user_material.save()
+    response = client.get('/api/materials/', {'fields': 'name,author,categories'}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert client.get('/api/materials/', {'fields': 'password'}).status_code == 400
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('resource', ['authors', 'platforms', 'categories'])
+def test_reference_data_api(client, test_user, author, platform, category, resource):
+    """
+    Tests JSON API of authors, platforms and categories.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param resource: parameter with API resource name
+    :return: two tests:
+        - logged out user gets 403
+        - logged user gets list with one object
+    """
+    assert client.get(f'/api/{resource}/').status_code == 403
+    client.force_login(test_user)
+    response = client.get(f'/api/{resource}/')
+    assert response.status_code == 200
+    assert len(response.json()['results']) == 1
+
+
+@pytest.mark.django_db
+def test_api_etag_survives_cache_reset(client, test_user, author):
+    """
+    Tests that data versions behind API ETags are not kept in the cache.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param author: fixture author
+    :return: two tests:
+        - ETag taken before a change doesn't match after the cache is cleared (restart, eviction)
+        - unchanged data keeps its ETag after the cache is cleared
+    """
+    client.force_login(test_user)
+    old_etag = client.get('/api/authors/')['ETag']
+    Author.objects.create(name='new author')
+    etag = client.get('/api/authors/')['ETag']
+    django_cache.clear()
+    response = client.get('/api/authors/', HTTP_IF_NONE_MATCH=old_etag)
+    assert response.status_code == 200 and len(response.json()['results']) == 2
+    django_cache.clear()
+    assert client.get('/api/authors/', HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_views(client, test_user, test_user2, material, user_material, author, platform):
+    """
+    Tests async versions of list and detail views.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :return: four tests:
+        - logged out user is redirected to login page
+        - material list and details are rendered for the owner
+        - other user's material renders 'page_404.html'
+        - author and platform views are rendered
+    """
+    assert client.get('/async/materials/list/').status_code == 302
+    client.force_login(test_user)
+    response = client.get('/async/materials/list/')
+    assert response.status_code == 200
+    assert [m.material_id for m in response.context['materials']] == [material]
+    response = client.get(f'/async/materials/{material.id}/')
+    assert response.context['material'] == material
+    for path in ('/async/author/list/', f'/async/author/{author.id}/', '/async/platform/list/',
+                 f'/async/platform/{platform.id}/'):
+        assert client.get(path).status_code == 200
+    assert client.get('/async/author/0/').status_code == 404
+    client.force_login(test_user2)
+    assert client.get(f'/async/materials/{material.id}/').context['material'] == ''
+
+
+@pytest.mark.django_db(transaction=True)
+def test_middleware_async_mode(test_user, material, user_material, settings, caplog):
+    """
+    Tests that letslearn middleware doesn't force the ASGI handler into sync mode.
+    :param test_user: fixture test_user
+    :param material: fixture material
+    :param user_material: fixture user_material
+    :param settings: pytest-django fixture with settings
+    :param caplog: pytest fixture capturing logs
+    :return: two tests:
+        - no middleware is adapted between sync and async mode
+        - queries of an async view run in sync_to_async threads are measured
+    """
+    settings.DEBUG = True
+    with caplog.at_level(logging.DEBUG, logger='django.request'):
+        handler = ASGIHandler()
+    assert not [record.message for record in caplog.records if 'adapted for middleware' in record.message]
+    assert iscoroutinefunction(handler._middleware_chain)
+    client = AsyncClient()
+    client.force_login(test_user)
+    response = asyncio.run(client.get(f'/async/materials/{material.id}/'))
+    assert response.status_code == 200
+    assert int(response['X-Query-Count']) > 0
+
+
+@pytest.mark.django_db
+def test_material_list_by_category(client, test_user, test_user2, author, material_type, platform,
+                                   django_assert_num_queries):
+    """
+    Tests training materials grouped by category and category summary in the sidebar.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :return: five tests:
+        - categories have numbers of all, finished and expiring materials
+        - links of other users to the same materials are not counted
+        - materials of every category are loaded with a fixed number of queries
+        - category without user's materials is not listed
+        - summary is shown on other pages
+    """
+    client.force_login(test_user)
+    python, django, empty = (Category.objects.create(name=name) for name in ('python', 'django', 'empty'))
+    for i in range(4):
+        material = TrainingMaterials.objects.create(name=f'material_{i}', is_time_limited=i == 0,
+                                                    author_id=author.id, material_type_id=material_type.id,
+                                                    platform_id=platform.id)
+        material.category.set([python] if i % 2 else [python, django])
+        UserMaterial.objects.create(user_id=test_user, material_id=material, expiration_date=date.today(),
+                                    is_finished=i == 1)
+        UserMaterial.objects.create(user_id=test_user2, material_id=material, is_finished=True)
+    client.get('/category/list/')
+    with django_assert_num_queries(5):
+        response = client.get('/category/materials/')
+    categories = {category.name: category for category in response.context['object_list']}
+    assert set(categories) == {'python', 'django'}
+    assert (categories['python'].total, categories['python'].finished, categories['python'].expiring) == (4, 1, 1)
+    assert [m.name for m in categories['django'].user_materials] == ['material_0', 'material_2']
+    response = client.get('/category/list/')
+    assert {'id': python.id, 'name': 'python', 'total': 4, 'finished': 1, 'expiring': 1} in \
+        response.context['category_summary']
+
+
+@pytest.mark.django_db
+@pytest.mark.query_budget(category_list=5)
+def test_query_stats_headers(client, test_user, query_budget):
+    """
+    Tests query statistics middleware and query budget fixture.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param query_budget: fixture with measured requests
+    :return: two tests:
+        - response has query count and Server-Timing headers
+        - request is measured under its URL name
+    """
+    client.force_login(test_user)
+    response = client.get('/category/list/')
+    assert int(response['X-Query-Count']) > 0
+    assert 'db;dur=' in response['Server-Timing']
+    assert query_budget == [('category_list', int(response['X-Query-Count']), 5)]
+
+
+@pytest.mark.django_db
+def test_material_detail_actions(client, test_user, test_user2, material, user_material):
+    """
+    Tests finishing, archiving and restoring training material from detail view.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :param material: fixture material
+    :param user_material: fixture user_material
+    :return: four tests:
+        - other user can't change the material
+        - owner finishes the material, other columns of the link stay untouched
+        - archived material is removed from the list and user is redirected
+        - restored material is back on the list
+    """
+    client.force_login(test_user2)
+    response = client.post(f'/materials/{material.id}/', {'finished': 'check as finished'})
+    assert response.context['material'] == ''
+    assert not UserMaterial.objects.get(id=user_material.id).is_finished
+    client.force_login(test_user)
+    UserMaterial.objects.filter(id=user_material.id).update(comment='changed meanwhile')
+    response = client.post(f'/materials/{material.id}/', {'finished': 'check as finished'})
+    assert response.context['material'].is_finished
+    assert response.context['material'].comment == 'changed meanwhile'
+    assert client.get('/materials/list/').context['materials'] == [user_material]
+    response = client.post(f'/materials/{material.id}/', {'archive': 'archive'})
+    assert response.status_code == 302
+    assert client.get('/materials/list/').context['materials'] == []
+    client.post(f'/materials/{material.id}/', {'restore': 'restore'})
+    assert client.get('/materials/list/').context['materials'] == [user_material]
+
+
+@pytest.mark.django_db
+def test_material_bulk_action(client, test_user, test_user2, author, material_type, platform):
+    """
+    Tests bulk finishing and archiving of training materials.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :return: three tests:
+        - every id gets its result, other user's material is not found and not changed
+        - archived materials disappear from cached list
+        - invalid action is rejected
+    """
+    client.force_login(test_user)
+    own, other = [], []
+    for owner, materials in ((test_user, own), (test_user, own), (test_user2, other)):
+        material = TrainingMaterials.objects.create(name='material', is_time_limited=False,
+                                                    author_id=author.id, material_type_id=material_type.id,
+                                                    platform_id=platform.id)
+        UserMaterial.objects.create(user_id=owner, material_id=material)
+        materials.append(material.id)
+    UserMaterial.objects.filter(material_id=own[1]).update(is_finished=True)
+    response = client.post('/materials/bulk/', {'action': 'finished', 'material_ids': own + other},
+                           HTTP_ACCEPT='application/json')
+    assert response.json()['results'] == {str(own[0]): 'changed', str(own[1]): 'unchanged',
+                                          str(other[0]): 'not_found'}
+    assert not UserMaterial.objects.get(material_id=other[0]).is_finished
+    assert len(client.get('/materials/list/').context['materials']) == 2
+    response = client.post('/materials/bulk/', {'action': 'archive', 'material_ids': own})
+    assert response.status_code == 302
+    assert client.get('/materials/list/').context['materials'] == []
+    response = client.post('/materials/bulk/', {'action': 'delete', 'material_ids': own},
+                           HTTP_ACCEPT='application/json')
+    assert response.status_code == 400
+
+
+def statistics_snapshot(user):
+    return {(row.category_id, row.platform_id): (row.materials, row.finished, row.archived, row.study_time,
+                                                 row.finished_study_time)
+            for row in StudyStatistics.objects.filter(user=user)
+            if row.materials or row.archived}
+
+
+@pytest.mark.django_db
+def test_study_statistics(client, test_user, author, material_type, platform, category):
+    """
+    Tests incremental updates of study statistics.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param category: fixture category
+    :return: four tests:
+        - statistics follow creating, finishing, archiving, re-categorizing and deleting materials
+        - incremental statistics equal rebuilt ones
+        - statistics view reads totals and breakdowns
+    """
+    client.force_login(test_user)
+    other_platform = Platform.objects.create(name='other', www='')
+    materials = []
+    for hours in (5, 10, 20):
+        material = TrainingMaterials.objects.create(name='material', is_time_limited=False,
+                                                    expected_study_time=hours, author_id=author.id,
+                                                    material_type_id=material_type.id, platform_id=platform.id)
+        material.category.add(category)
+        UserMaterial.objects.create(user_id=test_user, material_id=material)
+        materials.append(material)
+    client.post('/materials/bulk/', {'action': 'finished', 'material_ids': [materials[0].id, materials[1].id]})
+    client.post(f'/materials/{materials[1].id}/', {'archive': 'archive'})
+    materials[2].platform = other_platform
+    materials[2].expected_study_time = 30
+    materials[2].save()
+    materials[0].category.clear()
+    category.trainingmaterials_set.add(materials[0])
+    materials[0].category.remove(category)
+    expected = {
+        (None, None): (2, 1, 1, 35, 5),
+        (None, platform.id): (1, 1, 1, 5, 5),
+        (None, other_platform.id): (1, 0, 0, 30, 0),
+        (category.id, None): (1, 0, 1, 30, 0),
+    }
+    assert statistics_snapshot(test_user) == expected
+    stats.rebuild([test_user.id])
+    assert statistics_snapshot(test_user) == expected
+    response = client.get('/statistics/')
+    assert response.context['total'].study_time == 35
+    assert [row.platform for row in response.context['platforms']] == [other_platform, platform]
+    materials[2].delete()
+    assert statistics_snapshot(test_user)[(None, None)] == (1, 1, 1, 5, 5)
+
+
+@pytest.mark.django_db
+def test_statistics_concurrent_first_write(test_user, category):
+    """
+    Tests first write of a statistics row which a concurrent transaction creates in the meantime.
+    :param test_user: fixture test_user
+    :param category: fixture category
+    :return: deltas are added to the row created by the other transaction instead of failing on the constraint.
+    """
+    StudyStatistics.objects.create(user=test_user, category=category, materials=1)
+    update = QuerySet.update
+    calls = []
+
+    def update_after_concurrent_insert(queryset, **kwargs):
+        # The first UPDATE runs before the other transaction's row is visible.
+        calls.append(kwargs)
+        return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+    with mock.patch.object(QuerySet, 'update', update_after_concurrent_insert):
+        stats.apply_deltas({(test_user.id, category.id, None): Counter(materials=1, study_time=5)})
+    row = StudyStatistics.objects.get(user=test_user, category=category, platform=None)
+    assert (row.materials, row.study_time, len(calls)) == (2, 5, 2)
+
+
+@pytest.mark.django_db
+def test_autocomplete(client, test_user, author, django_capture_on_commit_callbacks):
+    """
+    Tests autocomplete endpoints backed by in-process prefix index.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param author: fixture author
+    :return: four tests:
+        - names are matched by case insensitive prefix, ordered by name
+        - created and renamed authors are added to the index incrementally
+        - deleted author disappears
+        - unknown kind gives 404
+    """
+    client.force_login(test_user)
+    with django_capture_on_commit_callbacks(execute=True):
+        second = Author.objects.create(name='Surname Second')
+    response = client.get('/autocomplete/author/', {'q': 'SUR'})
+    assert response.json()['results'] == [{'id': author.id, 'text': 'surname'},
+                                          {'id': second.id, 'text': 'Surname Second'}]
+    with django_capture_on_commit_callbacks(execute=True):
+        second.name = 'Another'
+        second.save()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/autocomplete/author/', {'q': 'an'})
+    assert response.json()['results'] == [{'id': second.id, 'text': 'Another'}]
+    assert not any('letslearn_author' in query['sql'] for query in queries.captured_queries)
+    with django_capture_on_commit_callbacks(execute=True):
+        second.delete()
+    assert client.get('/autocomplete/author/', {'q': 'an'}).json()['results'] == []
+    assert client.get('/autocomplete/book/', {'q': 'an'}).status_code == 404
+
+
+@pytest.mark.django_db
+def test_create_material_with_autocomplete_form(client, test_user, author, material_type, platform, category):
+    """
+    Tests material form with autocomplete widgets.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :return: three tests:
+        - form doesn't render <select> with all authors
+        - material is created from ids sent by autocomplete inputs
+        - material is connected to logged user
+    """
+    client.force_login(test_user)
+    response = client.get('/materials/create/')
+    assert '<select' not in response.content.decode()
+    assert 'autocomplete/author/' in response.content.decode()
+    response = client.post('/materials/create/', {
+        'name': 'new material', 'description': 'desc', 'www': 'http://example.com', 'author': author.id,
+        'platform': platform.id, 'material_type': material_type.id, 'category': [category.id],
+        'expiration_date': '2030-01-01', 'is_time_limited': 'on', 'comment': 'comment', 'expected_study_time': 5})
+    assert response.status_code == 302
+    material = TrainingMaterials.objects.get(name='new material')
+    assert list(material.category.all()) == [category]
+    assert UserMaterial.objects.filter(user_id=test_user, material_id=material).exists()
+
+
+@pytest.mark.django_db
+def test_create_material_shared_catalog(client, test_user, test_user2, author, material_type, platform, category,
+                                        settings):
+    """
+    Tests creating the same training material by two users in shared catalog mode.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :return: five tests:
+        - material with differently spelled address is stored once
+        - user linked with the catalog entry is told that its name, description and categories were kept
+        - every user has their own state of the material
+        - user adding material they already have gets a message
+        - with catalog mode off every user gets a separate copy
+    """
+    data = {'name': 'course', 'description': 'desc', 'author': author.id, 'platform': platform.id,
+            'material_type': material_type.id, 'category': [category.id], 'expected_study_time': 5}
+    client.force_login(test_user)
+    client.post('/materials/create/', {**data, 'www': 'https://www.Example.com/course/', 'is_finished': 'on'})
+    client.force_login(test_user2)
+    response = client.post('/materials/create/', {**data, 'name': 'my course', 'www': 'example.com/course',
+                                                   'comment': 'my notes'}, follow=True)
+    assert 'already in the catalog as course' in response.content.decode()
+    material = TrainingMaterials.objects.get()
+    assert material.name == 'course'
+    assert UserMaterial.objects.get(user_id=test_user, material_id=material).is_finished
+    link = UserMaterial.objects.get(user_id=test_user2, material_id=material)
+    assert (link.is_finished, link.comment) == (False, 'my notes')
+    response = client.get(f'/materials/{material.id}/')
+    assert (response.context['material'].is_finished, response.context['material'].comment) == (False, 'my notes')
+    response = client.post('/materials/create/', {**data, 'www': 'http://example.com/course'}, follow=True)
+    assert 'already on your list' in response.content.decode()
+    assert UserMaterial.objects.count() == 2
+    settings.SHARED_MATERIAL_CATALOG = False
+    client.post('/materials/create/', {**data, 'www': 'example.com/course'})
+    assert TrainingMaterials.objects.count() == 2
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_replica_routing(client, test_user, material, user_material, settings):
+    """
+    Tests reading list and detail views from a replica.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param material: fixture material
+    :param user_material: fixture user_material
+    :return: five tests:
+        - detail view reads the material from the replica
+        - cached sidebar is built on the primary, where data versions are read
+        - writes go to the primary
+        - after a write the user reads from the primary until the sticky window ends
+        - views not listed in REPLICA_READ_VIEWS (cached and ETagged pages) read from the primary
+    """
+    settings.DATABASE_REPLICAS = ['replica']
+    replicas.healthy_replicas()  # health is read once per REPLICA_HEALTH_REFRESH, not by every request
+    client.force_login(test_user)
+
+    def material_queries(alias, path, data=None, method='get'):
+        with CaptureQueriesContext(connections[alias]) as queries:
+            response = getattr(client, method)(path, data)
+        return response, [query['sql'] for query in queries.captured_queries if 'letslearn_' in query['sql']]
+
+    with CaptureQueriesContext(connections['default']) as primary:
+        response, replica = material_queries('replica', f'/materials/{material.id}/')
+    assert response.context['material'] == material
+    assert replica and not any('GROUP BY' in sql for sql in replica)
+    # Data versions and the category summary cached under them are read from the primary.
+    assert all('letslearn_dataversion' in query['sql'] or 'GROUP BY' in query['sql']
+               for query in primary.captured_queries if 'letslearn_' in query['sql'])
+    response, replica = material_queries('replica', f'/materials/{material.id}/', {'finished': 'on'}, 'post')
+    assert not any(sql.startswith('UPDATE') for sql in replica)
+    assert UserMaterial.objects.using('default').get(id=user_material.id).is_finished
+    response, replica = material_queries('replica', f'/materials/{material.id}/')
+    assert response.context['material'].is_finished and not replica
+    session = client.session
+    session['_letslearn_primary_until'] = 0
+    session.save()
+    response, replica = material_queries('replica', '/category/materials/')
+    assert response.status_code == 200 and replica
+    response, replica = material_queries('replica', '/materials/list/')
+    assert response.status_code == 200 and not replica
+    response, replica = material_queries('replica', '/author/list/')
+    assert response.status_code == 200 and not replica
+    response, replica = material_queries('replica', '/statistics/')
+    assert response.status_code == 200 and not replica
+
+
+@pytest.mark.django_db
+def test_precompressed_static_files(client, tmp_path, settings):
+    """
+    Tests collecting fingerprinted, precompressed static files and serving them.
+    :param client: fixture client
+    :param tmp_path: pytest fixture with temporary directory
+    :param settings: pytest-django fixture with settings
+    :return: four tests:
+        - collected file name contains content hash and has gzip and brotli variants
+        - brotli or gzip variant is served according to Accept-Encoding
+        - hashed file is cached as immutable, unhashed one only briefly
+        - missing file and path outside STATIC_ROOT are not served
+    """
+    settings.STATIC_ROOT = tmp_path
+    settings.STORAGES = {**settings.STORAGES,
+                         'staticfiles': {'BACKEND': 'letslearn.staticfiles.CompressedManifestStaticFilesStorage'}}
+    call_command('collectstatic', interactive=False, verbosity=0)
+    hashed_name = staticfiles_storage.stored_name('app.js')
+    assert hashed_name != 'app.js'
+    assert (tmp_path / f'{hashed_name}.gz').exists()
+    original = (tmp_path / 'app.js').read_bytes()
+    response = client.get(f'/static/{hashed_name}', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+    content = b''.join(response.streaming_content)
+    if (tmp_path / f'{hashed_name}.br').exists():
+        assert response['Content-Encoding'] == 'br'
+        content = brotli.decompress(content)
+    assert content == original
+    assert response['Content-Type'] == 'text/javascript'
+    assert response['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert response['Vary'] == 'Accept-Encoding'
+    response = client.get(f'/static/{hashed_name}', HTTP_ACCEPT_ENCODING='gzip;q=1, br;q=0')
+    assert response['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(b''.join(response.streaming_content)) == original
+    response = client.get('/static/app.js')
+    assert 'Content-Encoding' not in response
+    assert response['Cache-Control'] == 'public, max-age=60'
+    assert client.get('/static/missing.js').status_code == 404
+    assert client.get('/static/../manage.py').status_code == 404
+
+
+@pytest.mark.django_db
+def test_html_page_conditional_get(client, test_user, test_user2, material, user_material, author, settings):
+    """
+    Tests versioned ETags and compression of HTML pages.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :param material: fixture material
+    :param user_material: fixture user_material
+    :param author: fixture author
+    :param settings: pytest-django fixture with settings
+    :return: five tests:
+        - request with matching ETag gets 304 before the view runs, without letslearn queries
+        - page is revalidated on every visit and sent gzipped, other pages aren't compressed
+        - change of user's materials or of reference data gives new ETag
+        - page with pending messages is always rendered
+        - ETag differs between users, it doesn't depend on the CSRF cookie
+    """
+    client.force_login(test_user)
+    urls = [reverse(name) for name in ('material_list', 'author_list', 'platform_list', 'category_list')]
+    etags = {}
+    for url in urls:
+        response = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        assert response.status_code == 200
+        assert response['Content-Encoding'] == 'gzip'
+        assert b'<html' in gzip.decompress(response.content).lower()
+        assert response['Cache-Control'] == 'private, no-cache'
+        etags[url] = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+        assert response.status_code == 304
+        assert [query['sql'] for query in queries.captured_queries if 'letslearn_' in query['sql']] == [
+            query['sql'] for query in queries.captured_queries if 'letslearn_dataversion' in query['sql']]
+    assert not client.get('/author/create/', HTTP_ACCEPT_ENCODING='gzip').has_header('Content-Encoding')
+    user_material.is_finished = True
+    user_material.save()
+    assert client.get(urls[0], HTTP_IF_NONE_MATCH=etags[urls[0]]).status_code == 200
+    author.name = 'Renamed'
+    author.save()
+    response = client.get(urls[1], HTTP_IF_NONE_MATCH=etags[urls[1]])
+    assert response.status_code == 200 and b'Renamed' in response.content
+    etag = response['ETag']
+    client.post('/materials/bulk/', {'action': 'delete', 'material_ids': [material.id]})
+    response = client.get(urls[1], HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200 and b'Choose an action' in response.content
+    assert client.get(urls[1], HTTP_IF_NONE_MATCH=etag).status_code == 304
+    client.cookies[settings.CSRF_COOKIE_NAME] = 'other'
+    assert client.get(urls[1], HTTP_IF_NONE_MATCH=etag).status_code == 304
+    client.force_login(test_user2)
+    assert client.get(urls[1], HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_html_page_etag_survives_cache_reset(client, test_user, author):
+    """
+    Tests that ETags of HTML pages follow changes made outside of the web process.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param author: fixture author
+    :return: two tests:
+        - ETag taken before an insert doesn't match after the cache is cleared
+        - ETag taken before a change made by a management command doesn't match
+    """
+    client.force_login(test_user)
+    url = reverse('author_list')
+    old_etag = client.get(url)['ETag']
+    Author.objects.create(name='Inserted')
+    django_cache.clear()
+    response = client.get(url, HTTP_IF_NONE_MATCH=old_etag)
+    assert response.status_code == 200 and b'Inserted' in response.content
+    etag = response['ETag']
+    Author.objects.filter(name='Inserted').update(deleting_at=timezone.now())
+    call_command('delete_pending', stdout=io.StringIO())
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200 and b'Inserted' not in response.content
+
+
+@pytest.mark.django_db
+def test_progress_timeline(client, test_user, test_user2, material, user_material, settings,
+                           django_capture_on_commit_callbacks):
+    """
+    Tests buffered progress events and the timeline view.
+    :param client: fixture client
+    :param test_user: fixture test_user
+    :param test_user2: fixture test_user2
+    :param material: fixture material
+    :param user_material: fixture user_material
+    :param settings: pytest-django fixture with settings
+    :param django_capture_on_commit_callbacks: pytest-django fixture running on_commit callbacks
+    :return: seven tests:
+        - state changes are buffered, not written in the request
+        - timeline writes the buffer and shows events of the range, newest first
+        - events of other users and outside of the range are not shown
+        - dates at the ends of the date range are clamped instead of overflowing
+        - full buffer and old buffer are written with bulk_create
+        - saving the link records its changed state
+        - failed write doesn't fail the request and keeps the events for the next flush
+    """
+    client.force_login(test_user)
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post(f'/materials/{material.id}/', {'finished': 'check as finished'})
+        client.post(f'/materials/{material.id}/', {'archive': 'archive'})
+        client.post(f'/materials/{material.id}/', {'restore': 'restore'})
+    assert not ProgressEvent.objects.exists()
+    ProgressEvent.objects.create(user=test_user, material_id=material.id, kind=ProgressEvent.FINISHED,
+                                 created_at=timezone.now() - timedelta(days=60))
+    ProgressEvent.objects.create(user=test_user2, material_id=material.id, kind=ProgressEvent.ARCHIVED,
+                                 created_at=timezone.now())
+    response = client.get(reverse('progress_timeline'))
+    assert [event.kind for event in response.context['events']] == ['restored', 'archived', 'finished']
+    assert response.context['events'][0].material == material
+    response = client.get(reverse('progress_timeline'), {'from': str(date.today() - timedelta(days=90)),
+                                                          'to': str(date.today() - timedelta(days=30))})
+    assert len(response.context['events']) == 1
+    for params in ({'to': '9999-12-31'}, {'from': '0001-01-01', 'to': '0001-01-01'}, {'from': '9999-12-31'}):
+        response = client.get(reverse('progress_timeline'), params)
+        assert response.status_code == 200 and response.context['date_from'] <= response.context['date_to']
+    settings.PROGRESS_EVENT_BUFFER_SIZE = 2
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post('/materials/bulk/', {'action': 'unfinished', 'material_ids': [material.id]})
+        assert ProgressEvent.objects.count() == 5
+        client.post('/materials/bulk/', {'action': 'finished', 'material_ids': [material.id]})
+    assert ProgressEvent.objects.count() == 7
+    settings.PROGRESS_EVENT_BUFFER_SIZE = 100
+    settings.PROGRESS_EVENT_FLUSH_SECONDS = 0
+    with django_capture_on_commit_callbacks(execute=True):
+        link = UserMaterial.objects.get(id=user_material.id)
+        link.is_finished = False
+        link.save()
+    assert ProgressEvent.objects.filter(kind=ProgressEvent.UNFINISHED).count() == 2
+    with mock.patch.object(ProgressEvent.objects, 'bulk_create', side_effect=DatabaseError('down')):
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post('/materials/bulk/', {'action': 'finished', 'material_ids': [material.id]})
+        assert response.status_code == 302
+        assert events.flush() == 0
+    assert [event.kind for event in events.buffer.events] == [ProgressEvent.FINISHED]
+    assert events.flush() == 1
+    assert ProgressEvent.objects.filter(kind=ProgressEvent.FINISHED).count() == 4
@@ -1,9 +1,13 @@
 from django.urls import path
 
+from .async_views import AsyncMaterialListView, AsyncMaterialDetailView, AsyncPlatformListView, \
+    AsyncPlatformDetailView, AsyncAuthorListView, AsyncAuthorDetailView
+from .api import MaterialApiView, AuthorApiView, PlatformApiView, CategoryApiView
 from .views import IndexView, MaterialListView, MaterialDetailView, PlatformCreateView, PlatformListView, \
     PlatformDetailView, MaterialCreateView, CategoryListView, CategoryCreateView, MaterialCategoryListView, \
     AuthorListView, AuthorDetailView, AuthorCreateView, SignUpView, LogInView, LogOutView, ProfileView, \
-    PlatformUpdateView, AuthorUpdateView
+    PlatformUpdateView, AuthorUpdateView, MaterialSearchView, \
+    MaterialExportView, MaterialBulkActionView, StudyStatisticsView, ProgressTimelineView, AutocompleteView
 
 urlpatterns = [
     path('', IndexView.as_view(), name='index'),
@@ -12,11 +16,16 @@ urlpatterns = [
     path('accounts/profile/', ProfileView.as_view(), name='login_profile'),
     path('accounts/logout/', LogOutView.as_view(), name='account_logout'),
     path('materials/list/', MaterialListView.as_view(), name='material_list'),
+    path('materials/search/', MaterialSearchView.as_view(), name='material_search'),
+    path('materials/bulk/', MaterialBulkActionView.as_view(), name='material_bulk_action'),
+    path('materials/export/', MaterialExportView.as_view(), name='material_export'),
     path('materials/<int:pk>/', MaterialDetailView.as_view(), name='material_details'),
     path('materials/create/', MaterialCreateView.as_view(), name='material_create'),
+    path('statistics/', StudyStatisticsView.as_view(), name='statistics'),
+    path('timeline/', ProgressTimelineView.as_view(), name='progress_timeline'),
     path('category/list/', CategoryListView.as_view(), name='category_list'),
     # path('categ/<int:platform_id>/', PlatformDetailView.as_view(), name='platform_details'),
-    # path('category/materials/', MaterialCategoryListView.as_view(), name='material_list_by_category'),
+    path('category/materials/', MaterialCategoryListView.as_view(), name='material_list_by_category'),
     path('category/create/', CategoryCreateView.as_view(), name='category_create'),
     path('platform/list/', PlatformListView.as_view(), name='platform_list'),
     path('platform/<int:pk>/', PlatformDetailView.as_view(), name='platform_details'),
@@ -26,4 +35,15 @@ urlpatterns = [
     path('author/<int:pk>/', AuthorDetailView.as_view(), name='author_details'),
     path('author/create/', AuthorCreateView.as_view(), name='author_create'),
     path('author/update/<int:pk>/', AuthorUpdateView.as_view(), name='author_update'),
+    path('async/materials/list/', AsyncMaterialListView.as_view(), name='async_material_list'),
+    path('async/materials/<int:pk>/', AsyncMaterialDetailView.as_view(), name='async_material_details'),
+    path('async/platform/list/', AsyncPlatformListView.as_view(), name='async_platform_list'),
+    path('async/platform/<int:pk>/', AsyncPlatformDetailView.as_view(), name='async_platform_details'),
+    path('async/author/list/', AsyncAuthorListView.as_view(), name='async_author_list'),
+    path('async/author/<int:pk>/', AsyncAuthorDetailView.as_view(), name='async_author_details'),
+    path('autocomplete/<str:kind>/', AutocompleteView.as_view(), name='autocomplete'),
+    path('api/materials/', MaterialApiView.as_view(), name='api_materials'),
+    path('api/authors/', AuthorApiView.as_view(), name='api_authors'),
+    path('api/platforms/', PlatformApiView.as_view(), name='api_platforms'),
+    path('api/categories/', CategoryApiView.as_view(), name='api_categories'),
 ]
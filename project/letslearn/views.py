@@ -1,19 +1,107 @@
-from datetime import date, timedelta
+import csv
+import hashlib
+import itertools
+import json
+from datetime import date, datetime, time, timedelta
 
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView, LogoutView
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Count, Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse, JsonResponse, Http404
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
 from django.views.generic import ListView, CreateView,  UpdateView
 
 #from .forms import PlatformForm
-from .models import UserMaterial, TrainingMaterials, Platform, Category, Author
+from .autocomplete import INDEXES
+from .forms import TrainingMaterialsForm
+from .models import UserMaterial, TrainingMaterials, Platform, Category, Author, StudyStatistics, ProgressEvent
+from . import archive, cache, events, similar
+from .cache import get_or_build
+from .catalog import add_material
+from .search import search_materials
+from .signals import material_state_changed
 from django.core.paginator import Paginator
 from django.contrib.auth import authenticate, login, logout
 
+MATERIAL_PAGE_SIZES = (10, 25, 50, 100)
+DEFAULT_MATERIAL_PAGE_SIZE = 25
+EXPIRATION_WARNING_DAYS = 14
+EXPORT_CHUNK_SIZE = 2000
+TIMELINE_DAYS = 30
+MAX_TIMELINE_EVENTS = 500
+# POST parameter -> (changed field, new value)
+MATERIAL_ACTIONS = {
+    'finished': ('is_finished', True),
+    'unfinished': ('is_finished', False),
+    'archive': ('is_archived', True),
+    'restore': ('is_archived', False),
+}
+MAX_BULK_MATERIALS = 1000
+EXPORT_FIELDS = ('name', 'description', 'www', 'author', 'platform', 'material_type', 'categories',
+                 'is_time_limited', 'expiration_date', 'is_finished', 'comment', 'expected_study_time',
+                 'is_archived')
+
+
+def get_page_size(request):
+    """
+    Reads requested page size from GET parameters.
+    :param request: get request
+    :return: page size from MATERIAL_PAGE_SIZES, DEFAULT_MATERIAL_PAGE_SIZE if missing or not allowed.
+    """
+    try:
+        page_size = int(request.GET.get('page_size', DEFAULT_MATERIAL_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_MATERIAL_PAGE_SIZE
+    return page_size if page_size in MATERIAL_PAGE_SIZES else DEFAULT_MATERIAL_PAGE_SIZE
+
+
+def get_cursor(request):
+    """
+    Reads keyset pagination cursor from GET parameters.
+    :param request: get request
+    :return: id of the last row on the previous page or None for the first page.
+    """
+    try:
+        return int(request.GET['after'])
+    except (KeyError, ValueError):
+        return None
+
+
+def page_etag(request, *args, **kwargs):
+    """
+    Computes ETag of an HTML page from the user's data version and the global reference data version, so
+    unchanged pages are answered with 304 before the view runs. Versions are kept in the database, changes made
+    by other processes and commands change the ETag too. Pages depend also on the day (expiring materials),
+    the last login (it rotates CSRF token put in forms) and query string. Secrets aren't part of the ETag.
+    :param request: get request.
+    :return: weak ETag (pages are sent compressed or not), None if the page has to be rendered because
+        it shows pending messages.
+    """
+    if len(messages.get_messages(request)):
+        return None
+    versions = cache.get_versions(request.user.id)
+    key = ':'.join(str(part) for part in (
+        request.resolver_match.url_name, request.user.id, versions.user, versions.reference,
+        date.today(), request.user.last_login, request.GET.urlencode()))
+    return f'W/"{hashlib.md5(key.encode()).hexdigest()}"'
+
+
+# Conditional GET of HTML pages, browsers revalidate them on every visit. Only these list pages are compressed,
+# forms and pages reflecting user's input are sent uncompressed (BREACH).
+versioned_page = [gzip_page, cache_control(private=True, no_cache=True), condition(etag_func=page_etag)]
+
 
 class IndexView(View):
     """ View to check whether user is logged in or log out. """
@@ -23,6 +111,46 @@ class IndexView(View):
         return render(request, 'index.html', context)
 
 
+def get_user_material(user, pk):
+    """
+    Loads training material with its author, platform, type and categories if it belongs to the user.
+    :param user: logged user.
+    :param pk: pk of requested Training Material instance.
+    :return: TrainingMaterials instance or None if the user doesn't have such material.
+    """
+    return (TrainingMaterials.objects
+            .for_user(user)
+            .filter(id=pk)
+            .select_related('author', 'platform', 'material_type')
+            .prefetch_related('category')
+            .first())
+
+
+def change_material_state(user, material_ids, action):
+    """
+    Sets is_finished or is_archived of user's materials with a conditional UPDATE of UserMaterial, rows which
+    already have requested value are not touched. Sends material_state_changed signal for changed materials.
+    :param user: logged user, materials of other users are never changed.
+    :param material_ids: ids of TrainingMaterials instances.
+    :param action: one of MATERIAL_ACTIONS.
+    :return: tuple of (ids of changed materials, ids of user's materials which already had requested value).
+    """
+    field, value = MATERIAL_ACTIONS[action]
+    extra = {'archived_at': timezone.now() if value else None} if field == 'is_archived' else {}
+    with transaction.atomic():
+        links = UserMaterial.objects.filter(user_id=user, material_id__in=material_ids)
+        owned = list(links.select_for_update().values_list('material_id', field))
+        changed = [material_id for material_id, current in owned if current != value]
+        unchanged = [material_id for material_id, current in owned if current == value]
+        if changed:
+            links.filter(material_id__in=changed).exclude(**{field: value}).update(**{field: value}, **extra)
+    if changed:
+        material_state_changed.send(sender=UserMaterial, user_id=user.id, material_ids=changed, field=field,
+                                    value=value)
+    return changed, unchanged
+
+
+@method_decorator(versioned_page, name='get')
 class MaterialListView(LoginRequiredMixin, View):
     """
     Display a training materials' list.
@@ -40,22 +168,48 @@ class MaterialListView(LoginRequiredMixin, View):
     def get(self, request):
         """
         Prepares data for context in MaterialListView.
+        Filtering is done in the database and materials are paginated with a keyset (cursor):
+        ``after`` is the id of the last UserMaterial shown on the previous page and ``page_size``
+        is one of MATERIAL_PAGE_SIZES.
         :return:
             Instances of UserMaterial model connected to logged user.
             Training materials can't have atribute is_archived = True.
         """
-        all_materials = UserMaterial.objects.filter(user_id=self.request.user)
-        materials = [material for material in all_materials if material.material_id.is_archived is False]
-        materials_near_end = [material for material in materials
-                              if material.material_id.is_time_limited is True
-                              # and (material.material_id.expiration_date - date.today()).days <= 14
-                              ]
-        exp_date = date.today() + timedelta(days=14)
-        categories = Category.objects.all()
-        return render(request, 'material_list.html',
-                      {'materials': materials,
+        page_size = get_page_size(request)
+        after = get_cursor(request)
+        exp_date = date.today() + timedelta(days=EXPIRATION_WARNING_DAYS)
+
+        def build_page():
+            active_materials = (UserMaterial.objects
+                                .filter(user_id=self.request.user, is_archived=False)
+                                .select_related('material_id')
+                                .order_by('id'))
+            materials_near_end = list(active_materials.filter(material_id__is_time_limited=True,
+                                                              expiration_date__lte=exp_date))
+            page = active_materials
+            if after is not None:
+                page = page.filter(id__gt=after)
+            materials = list(page[:page_size + 1])
+            next_cursor = None
+            if len(materials) > page_size:
+                materials = materials[:page_size]
+                next_cursor = materials[-1].id
+            context = {'materials': materials,
+                       'materials_near_end': materials_near_end,
                        'exp_date': exp_date,
-                       'categories': categories})#, 'materials_near_end': materials_near_end})
+                       'page_size': page_size,
+                       'page_sizes': MATERIAL_PAGE_SIZES,
+                       'is_first_page': after is None,
+                       'next_cursor': next_cursor}
+            context['fragment'] = render_to_string('material_list_fragment.html', context)
+            return context
+
+        context, from_cache = get_or_build('material_list', request.user.id, (exp_date, after, page_size),
+                                           build_page)
+        categories = Category.objects.all()
+        response = render(request, 'material_list.html', {**context, 'categories': categories})
+        response['X-Cache'] = 'HIT' if from_cache else 'MISS'
+        return response
 
 #       return UserMaterial.objects.filter(Q(user_id=self.request.user) & Q(is_archived=False))
 # def planlist(request):
@@ -70,6 +224,108 @@ class MaterialListView(LoginRequiredMixin, View):
 #         return HttpResponse(template.render(context, request))
 
 
+class MaterialSearchView(LoginRequiredMixin, View):
+    """
+    Display training materials of logged user matching searched text.
+
+    **Context**
+
+    ``TrainingMaterials``
+        Instances of TrainingMaterials model connected to logged user, best matches first.
+
+    **Template:**
+
+    :template: 'material_search.html'
+    """
+    def get(self, request):
+        """
+        Searches materials by name, description, author and platform name.
+        :param request: get request with ``q`` (searched text), ``page`` and ``page_size`` parameters.
+        :return: render "material_search.html" template with one page of results.
+        """
+        query = request.GET.get('q', '').strip()
+        page_size = get_page_size(request)
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        materials, has_next = search_materials(request.user, query, page_size, page)
+        return render(request, 'material_search.html',
+                      {'materials': materials,
+                       'query': query,
+                       'page': page,
+                       'page_size': page_size,
+                       'previous_page': page - 1 if page > 1 else None,
+                       'next_page': page + 1 if has_next else None})
+
+
+class Echo:
+    """ File-like object which returns written value instead of storing it, used to stream CSV rows. """
+    def write(self, value):
+        return value
+
+
+class MaterialExportView(LoginRequiredMixin, View):
+    """
+    Streams all training materials of logged user, archived ones included, as CSV or NDJSON.
+    Materials in the archive tier follow the others.
+    Rows are written while they are read from the database, so memory use doesn't depend on number of materials.
+    Exported columns are the same as accepted by ``import_materials`` command.
+    """
+    def get(self, request):
+        """
+        :param request: get request with optional ``format`` parameter: ``csv`` (default) or ``ndjson``.
+        :return: StreamingHttpResponse with exported materials as attachment.
+        """
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in ('csv', 'ndjson'):
+            export_format = 'csv'
+        materials = (TrainingMaterials.objects
+                     .for_user(request.user)
+                     .select_related('author', 'platform', 'material_type')
+                     .prefetch_related('category')
+                     .order_by('id')
+                     .iterator(chunk_size=EXPORT_CHUNK_SIZE))
+        materials = itertools.chain(((material, None) for material in materials),
+                                    archive.archived_materials(request.user))
+        if export_format == 'csv':
+            writer = csv.writer(Echo())
+            rows = itertools.chain([writer.writerow(EXPORT_FIELDS)],
+                                   (writer.writerow(export_row(*material).values()) for material in materials))
+            content_type = 'text/csv'
+        else:
+            rows = (json.dumps(export_row(*material)) + '\n' for material in materials)
+            content_type = 'application/x-ndjson'
+        response = StreamingHttpResponse(rows, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="materials.{export_format}"'
+        return response
+
+
+def export_row(material, categories=None):
+    """
+    Converts training material to exported record.
+    :param material: TrainingMaterials instance from ``for_user`` queryset with related objects loaded.
+    :param categories: names of material's categories, read from the material if not given.
+    :return: dictionary with EXPORT_FIELDS keys.
+    """
+    return {
+        'name': material.name,
+        'description': material.description,
+        'www': material.www,
+        'author': material.author.name,
+        'platform': material.platform.name,
+        'material_type': material.material_type.name,
+        'categories': ';'.join(categories if categories is not None
+                               else (category.name for category in material.category.all())),
+        'is_time_limited': material.is_time_limited,
+        'expiration_date': str(material.expiration_date),
+        'is_finished': material.is_finished,
+        'comment': material.comment,
+        'expected_study_time': material.expected_study_time,
+        'is_archived': material.is_archived,
+    }
+
+
 class MaterialDetailView(LoginRequiredMixin, View):
     """
     Display an individual training material.
@@ -79,6 +335,9 @@ class MaterialDetailView(LoginRequiredMixin, View):
     ``TrainingMaterials``
         Instance of TrainingMaterials model connected to logged user.
 
+    ``similar``
+        List of precomputed :model:`letslearn.SimilarMaterial` of the material, best first.
+
     **Template:**
 
     :template: 'material_details.html' if instance is connected to logged user
@@ -86,60 +345,223 @@ class MaterialDetailView(LoginRequiredMixin, View):
     """
     def get(self, request, pk):
         """
-        Prepares context for MaterialDetailView.
+        Prepares context for MaterialDetailView. Material in the archive tier is shown read-only, only
+        the restore action brings it back.
         :param request: get request
         :param pk: pk of requested Training Material instance
         :return: context for MaterialDetailView
         """
-        material_owner = UserMaterial.objects.get(material_id = pk)
-        if material_owner.user_id == self.request.user:
-            material = TrainingMaterials.objects.get(id=pk)
-                # material = get_object_or_404(TrainingMaterials, id=pk)
-            return render(request, 'material_details.html', {'material': material})
-        else:
+        material = get_user_material(request.user, pk)
+        if material is not None:
+            return render(request, 'material_details.html',
+                          {'material': material, 'similar': similar.get_similar(pk)})
+        archived = archive.archived_material(request.user, pk)
+        if archived is None:
             return render(request, 'page_404.html', {'material': ''})
+        material, category_names = archived
+        return render(request, 'material_details.html', {'material': material, 'in_archive_tier': True,
+                                                         'category_names': category_names, 'similar': []})
 
     def post(self, request, pk):
         """
-        Changes parameters is_finished and is_archived of TrainingMaterials instance.
+        Changes parameters is_finished and is_archived of logged user's TrainingMaterials instance.
+        Restore action brings the material back from the archive tier first, other actions don't change
+        materials in the archive tier. Every action is a conditional UPDATE of one column of user's UserMaterial,
+        so concurrent requests don't overwrite each other's changes.
         :param request: post request
         :param pk: pk of requested Training Material instance
         :return: Saves parameters in the database and render "material_details.html" template.
         """
-        material = get_object_or_404(TrainingMaterials, id=pk)
-        if 'finished' in request.POST:
-            material.is_finished = True
-        elif 'unfinished' in request.POST:
-            material.is_finished = False
-        if 'archive' in request.POST:
-            material.is_archived = True
-            material.save()
+        action = next((action for action in MATERIAL_ACTIONS if action in request.POST), None)
+        if action == 'restore':
+            archive.restore(request.user, pk)
+        if action is not None:
+            change_material_state(request.user, [pk], action)
+        if action == 'archive':
+            return redirect('material_list')
+        return self.get(request, pk)
+
+
+class MaterialBulkActionView(LoginRequiredMixin, View):
+    """
+    Finishes, unfinishes, archives or restores many training materials of logged user with one UPDATE.
+    Cached lists of the user are invalidated once for the whole batch.
+    """
+    def post(self, request):
+        """
+        :param request: post request with ``action`` (one of MATERIAL_ACTIONS) and ``material_ids`` (list).
+        :return: JSON with result of every id ("changed", "unchanged" or "not_found") if JSON was requested
+            (Accept: application/json), otherwise redirect to "material_list" with a summary message.
+        """
+        action = request.POST.get('action')
+        try:
+            material_ids = sorted({int(material_id) for material_id in request.POST.getlist('material_ids')})
+        except ValueError:
+            material_ids = None
+        wants_json = 'application/json' in request.headers.get('Accept', '')
+        if action not in MATERIAL_ACTIONS or not material_ids or len(material_ids) > MAX_BULK_MATERIALS:
+            error = (f'Choose an action ({", ".join(MATERIAL_ACTIONS)}) '
+                     f'and from 1 to {MAX_BULK_MATERIALS} training materials.')
+            if wants_json:
+                return JsonResponse({'error': error}, status=400)
+            messages.error(request, error)
             return redirect('material_list')
-        elif 'restore' in request.POST:
-            material.is_archived = False
+        changed, unchanged = change_material_state(request.user, material_ids, action)
+        results = {material_id: 'not_found' for material_id in material_ids}
+        results.update({material_id: 'changed' for material_id in changed})
+        results.update({material_id: 'unchanged' for material_id in unchanged})
+        if wants_json:
+            return JsonResponse({'action': action, 'results': results})
+        messages.success(request, f'{action.capitalize()}: {len(changed)} training materials changed, '
+                                  f'{len(unchanged)} already up to date, '
+                                  f'{len(material_ids) - len(changed) - len(unchanged)} not found.')
+        return redirect('material_list')
+
+
+class StudyStatisticsView(LoginRequiredMixin, View):
+    """
+    Display study statistics of logged user: total expected study time, finished and unfinished materials,
+    with breakdowns by category and platform.
+
+    **Context**
+
+    ``StudyStatistics``
+        Precomputed instances of StudyStatistics model connected to logged user.
+
+    **Template:**
+
+    :template: 'statistics.html'
+    """
+    def get(self, request):
+        """
+        Reads statistics from StudyStatistics table, nothing is aggregated on request. Materials
+        in the archive tier are counted in archived ones of the total.
+        :param request: get request
+        :return: render "statistics.html" template.
+        """
+        rows = (StudyStatistics.objects
+                .filter(user=request.user)
+                .select_related('category', 'platform'))
+        total = None
+        categories, platforms = [], []
+        for row in rows:
+            if row.category_id:
+                categories.append(row)
+            elif row.platform_id:
+                platforms.append(row)
+            else:
+                total = row
+        return render(request, 'statistics.html',
+                      {'total': total,
+                       'categories': sorted(categories, key=lambda row: row.category.name),
+                       'platforms': sorted(platforms, key=lambda row: row.platform.name)})
+
+
+def parse_day(value):
+    """
+    :param value: date in YYYY-MM-DD format.
+    :return: date or None if the value is missing or invalid. Dates are clamped to TIMELINE_DAYS (and a day for
+        time zones) from date.min and date.max, so the default range and range ends can be computed.
+    """
+    try:
+        day = parse_date(value or '')
+    except ValueError:
+        return None
+    if day is None:
+        return None
+    margin = timedelta(days=TIMELINE_DAYS + 1)
+    return min(max(day, date.min + margin), date.max - margin)
+
 
-        material.save()
-        return render(request, "material_details.html", {"material": material})
+class ProgressTimelineView(LoginRequiredMixin, View):
+    """
+    Display progress events of logged user (materials finished, archived and restored) from a range of dates,
+    newest first.
+
+    **Context**
+
+    ``events``
+        Instances of ProgressEvent model connected to logged user, with ``material`` attribute: TrainingMaterials
+        instance or None if the material is in the archive tier or deleted.
+
+    ``date_from``, ``date_to``
+        First and last shown day.
+
+    **Template:**
+
+    :template: 'timeline.html'
+    """
+    def get(self, request):
+        """
+        Reads events with one range query on (user, created_at) index and their materials with one more query.
+        Events buffered by this process are written first.
+        :param request: get request with optional ``from`` and ``to`` dates (YYYY-MM-DD), last TIMELINE_DAYS
+            days by default.
+        :return: render "timeline.html" template.
+        """
+        events.flush()
+        date_to = parse_day(request.GET.get('to')) or timezone.localdate()
+        date_from = parse_day(request.GET.get('from')) or date_to - timedelta(days=TIMELINE_DAYS - 1)
+        date_from, date_to = min(date_from, date_to), max(date_from, date_to)
+        start = timezone.make_aware(datetime.combine(date_from, time.min))
+        end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        progress = list(ProgressEvent.objects
+                        .filter(user=request.user, created_at__gte=start, created_at__lt=end)
+                        .order_by('-created_at', '-id')[:MAX_TIMELINE_EVENTS + 1])
+        truncated = len(progress) > MAX_TIMELINE_EVENTS
+        progress = progress[:MAX_TIMELINE_EVENTS]
+        materials = TrainingMaterials.objects.in_bulk({event.material_id for event in progress})
+        for event in progress:
+            event.material = materials.get(event.material_id)
+        return render(request, 'timeline.html', {'events': progress, 'truncated': truncated,
+                                                 'date_from': date_from, 'date_to': date_to})
 
 
 class MaterialCreateView(LoginRequiredMixin, CreateView):
     """ Creates new TrainingMaterials model instance and redirect to "material_list.html" template. """
     model = TrainingMaterials
-    fields = '__all__'
+    form_class = TrainingMaterialsForm
 
     def form_valid(self, form):
         """
         Saves information from the form and adds new record in UserMaterial model.
-        :param form: form with all fields from TrainignMaterials instance.
+        In shared catalog mode identical material already in the catalog is linked instead of saving a copy,
+        the user is told that name, description and categories of the catalog entry were kept.
+        :param form: form with all fields from TrainignMaterials instance and user's state of the material.
         :return:
-        New instance of TrainingMaterials model is saved in database. Corresponding record is added to UserMaterial model.
-        Render "material_list.html" template.
+        Instance of TrainingMaterials model from the catalog or a new one. Corresponding record with user's state
+        is added to UserMaterial model. Render "material_list.html" template.
         """
-        self.object = form.save()
-        UserMaterial.objects.create(material_id=self.object, user_id=self.request.user)
+        material = form.save(commit=False)
+        link, created = add_material(self.request.user, material, form.cleaned_data['category'],
+                                     **form.get_state())
+        self.object = link.material_id
+        if not created:
+            messages.info(self.request, f'{self.object} is already on your list.')
+        elif self.object.pk != material.pk:
+            messages.info(self.request, f'The same material is already in the catalog as {self.object}, it was added '
+                                        f'to your list with its name, description and categories. '
+                                        f'Keep your notes in the comment.')
         return redirect(f"/materials/list/")
 
 
+class AutocompleteView(LoginRequiredMixin, View):
+    """ Suggests authors, platforms, material types or categories whose names start with typed text. """
+    def get(self, request, kind):
+        """
+        Searches in-process prefix index, the database is queried only when the index has to be reloaded.
+        :param request: get request with ``q`` parameter (typed text).
+        :param kind: one of ``author``, ``platform``, ``material_type``, ``category``.
+        :return: JSON with list of matching objects' ids and names.
+        """
+        if kind not in INDEXES:
+            raise Http404(f'Unknown autocomplete: {kind}.')
+        query = request.GET.get('q', '').strip()
+        results = INDEXES[kind].search(query) if query else []
+        return JsonResponse({'results': [{'id': pk, 'text': name} for pk, name in results]})
+
+
+@method_decorator(versioned_page, name='get')
 class CategoryListView(LoginRequiredMixin, ListView):
     """ Display a list of categories. """
     template_name = 'category_list.html'
@@ -152,10 +574,85 @@ class CategoryCreateView(LoginRequiredMixin, CreateView):
     fields = '__all__'
 
 
-class MaterialCategoryListView(ListView):
-    pass
+def categories_with_counts(user, exp_date):
+    """
+    Counts user's not archived materials in categories with one aggregate query. Rows are the user's links
+    (UserMaterial) grouped by category, so the query doesn't read links of other users of the shared catalog.
+    :param user: owner of counted materials.
+    :param exp_date: materials expiring on this day or earlier are counted as expiring.
+    :return: list of Category instances with at least one user's material, ordered by name, with ``total``,
+        ``finished`` and ``expiring`` attributes.
+    """
+    rows = (UserMaterial.objects
+            .filter(user_id=user, is_archived=False, material_id__category__isnull=False)
+            .values('material_id__category', 'material_id__category__name')
+            .annotate(total=Count('id'),
+                      finished=Count('id', filter=Q(is_finished=True)),
+                      expiring=Count('id', filter=Q(material_id__is_time_limited=True,
+                                                    expiration_date__lte=exp_date)))
+            .order_by('material_id__category__name'))
+    categories = []
+    for row in rows:
+        category = Category(id=row['material_id__category'], name=row['material_id__category__name'])
+        category.total, category.finished, category.expiring = row['total'], row['finished'], row['expiring']
+        categories.append(category)
+    return categories
+
+
+def category_summary(user):
+    """
+    Returns cached numbers of user's materials in categories, shown in the sidebar on every page.
+    :param user: logged user.
+    :return: list of dictionaries with ``id``, ``name``, ``total``, ``finished`` and ``expiring`` keys.
+    """
+    exp_date = date.today() + timedelta(days=EXPIRATION_WARNING_DAYS)
+    summary, _ = get_or_build(
+        'category_summary', user.id, (exp_date,),
+        lambda: [{'id': category.id, 'name': category.name, 'total': category.total,
+                  'finished': category.finished, 'expiring': category.expiring}
+                 for category in categories_with_counts(user, exp_date)])
+    return summary
+
+
+class MaterialCategoryListView(LoginRequiredMixin, ListView):
+    """
+    Display training materials of logged user grouped by category.
 
+    **Context**
+
+    ``Category``
+        Instances of Category model with numbers of user's materials (total, finished, expiring)
+        and list of these materials in ``user_materials`` attribute.
+        Training materials can't have atribute is_archived = True.
 
+    **Template:**
+
+    :template: 'material_by_category.html'
+    """
+    template_name = 'material_by_category.html'
+
+    def get_queryset(self):
+        """
+        Counts and loads materials of all categories with two queries, independent of number of categories.
+        :return: list of categories with at least one material of logged user.
+        """
+        exp_date = date.today() + timedelta(days=EXPIRATION_WARNING_DAYS)
+        materials = (TrainingMaterials.objects
+                     .for_user(self.request.user)
+                     .filter(is_archived=False)
+                     .order_by('name'))
+        categories = categories_with_counts(self.request.user, exp_date)
+        prefetch_related_objects(categories,
+                                 Prefetch('trainingmaterials_set', queryset=materials, to_attr='user_materials'))
+        return categories
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['exp_date'] = date.today() + timedelta(days=EXPIRATION_WARNING_DAYS)
+        return context
+
+
+@method_decorator(versioned_page, name='get')
 class PlatformListView(LoginRequiredMixin, ListView):
     """ Displays a list of platforms. """
     template_name = 'platform_list.html'
@@ -181,6 +678,7 @@ class PlatformCreateView(LoginRequiredMixin, CreateView):
     fields = '__all__'
 
 
+@method_decorator(versioned_page, name='get')
 class AuthorListView(LoginRequiredMixin, ListView):
     """ Displays a list of authors."""
     template_name = 'author_list.html'